@@ -1,17 +1,17 @@
 # -*- mode: python ; coding: utf-8 -*-
 
 import os
+import sys
 from PyInstaller.building.build_main import Analysis
 from PyInstaller.building.build_main import PYZ, EXE
 
-def collect_folder(src_folder, target_folder):
-    datas = []
-    for root, _, files in os.walk(src_folder):
-        for f in files:
-            full_path = os.path.join(root, f)
-            rel_path = os.path.relpath(root, src_folder)
-            datas.append((full_path, os.path.join(target_folder, rel_path)))
-    return datas
+# Assets ship as one packed, memory-mapped bundle instead of loose files
+sys.path.insert(0, SPECPATH)
+from src.utils.assets import pack, BUNDLE_NAME
+
+bundle = os.path.join(workpath, BUNDLE_NAME)
+os.makedirs(workpath, exist_ok=True)
+pack(os.path.join(SPECPATH, "src", "assets"), bundle)
 
 
 a = Analysis(
@@ -21,7 +21,8 @@ a = Analysis(
     datas=[
         ('icon.ico', '.'),
         ('config.ini', '.'),
-    ] + collect_folder("src/assets", "src/assets"),
+        (bundle, '.'),
+    ],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,88 @@
+"""A local stand-in for the Discord IPC socket, for the presence case.
+
+Speaks the same framing as Discord (op and length as two little endian
+int32s, then a JSON payload) on $XDG_RUNTIME_DIR/discord-ipc-0, which is
+where pypresence looks for it. Every command is acknowledged and recorded.
+"""
+import json
+import os
+import socket
+import struct
+import threading
+
+FRAME = struct.Struct("<ii")
+OP_HANDSHAKE, OP_FRAME, OP_CLOSE = 0, 1, 2
+
+
+class FakeDiscord:
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, "discord-ipc-0")
+        self.handshakes = 0
+        self.activities: list[dict] = []
+        self.received = threading.Condition()
+        self._server: socket.socket = None
+        self._thread: threading.Thread = None
+
+    def start(self) -> "FakeDiscord":
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server.bind(self.path)
+        self._server.listen()
+        self._thread = threading.Thread(target=self._serve, name="fake-discord", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def wait_for(self, activities: int, timeout: float) -> bool:
+        """Wait until this many activities arrived"""
+        with self.received:
+            return self.received.wait_for(lambda: len(self.activities) >= activities, timeout)
+
+    def _serve(self) -> None:
+        while True:
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._talk, args=(connection,), daemon=True).start()
+
+    def _talk(self, connection: socket.socket) -> None:
+        with connection:
+            while True:
+                header = self._read(connection, FRAME.size)
+                if header is None:
+                    return
+                op, length = FRAME.unpack(header)
+                payload = json.loads(self._read(connection, length) or b"{}")
+                if op == OP_HANDSHAKE:
+                    self.handshakes += 1
+                    self._send(connection, {"cmd": "DISPATCH", "evt": "READY", "data": {}})
+                elif op == OP_FRAME:
+                    with self.received:
+                        if payload.get("cmd") == "SET_ACTIVITY":
+                            self.activities.append(payload["args"].get("activity") or {})
+                        self.received.notify_all()
+                    self._send(connection, {"cmd": payload.get("cmd"), "nonce": payload.get("nonce"),
+                                            "evt": None, "data": {}})
+                elif op == OP_CLOSE:
+                    return
+
+    @staticmethod
+    def _read(connection: socket.socket, size: int) -> bytes:
+        data = b""
+        while len(data) < size:
+            chunk = connection.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    @staticmethod
+    def _send(connection: socket.socket, payload: dict) -> None:
+        data = json.dumps(payload).encode()
+        connection.sendall(FRAME.pack(OP_FRAME, len(data)) + data)
@@ -0,0 +1,124 @@
+"""Run the benchmark suite headless and compare it against a baseline.
+
+    python benchmarks/run.py --save-baseline       record this machine's baseline
+    python benchmarks/run.py                       run everything against it
+    python benchmarks/run.py --quick -k canvas --no-baseline
+                                                   smaller sizes, only canvas cases
+    python benchmarks/run.py --output results.json --baseline other.json
+
+Exits with 1 when any median is slower than the baseline by more than the
+tolerance, so it can gate a release build, and with 2 when the baseline is
+missing or unreadable: a gate that has nothing to compare to must not pass.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT_DIR, "benchmarks", "baseline.json")
+DEFAULT_TOLERANCE = 0.25
+
+sys.path.insert(0, ROOT_DIR)
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Names of results whose median regressed past tolerance"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference and result["median_ms"] > reference["median_ms"] * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def print_table(results: dict, baseline: dict, regressions: list[str]) -> None:
+    print(f"{'benchmark':<36}{'median ms':>12}{'baseline':>12}{'change':>10}")
+    for name, result in results.items():
+        reference = baseline.get(name)
+        line = f"{name:<36}{result['median_ms']:>12.2f}"
+        if reference:
+            change = result["median_ms"] / reference["median_ms"] - 1
+            line += f"{reference['median_ms']:>12.2f}{change:>+10.0%}"
+        if name in regressions:
+            line += "  REGRESSION"
+        print(line)
+
+
+def main(argv: list[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Tordie benchmark suite")
+    parser.add_argument("-k", "--filter", action="append", default=[],
+                        help="only run cases whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="skip the largest sizes")
+    parser.add_argument("--output", help="write the results as JSON here")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown of a median, 0.25 being 25%%")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="write the results to the baseline file")
+    parser.add_argument("--no-baseline", action="store_true",
+                        help="only print the results, without comparing them")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if not args.save_baseline and not args.no_baseline:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)["results"]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Cannot read the baseline {args.baseline}: {e!r}\n"
+                  f"Record one with --save-baseline, or pass --no-baseline", file=sys.stderr)
+            return 2
+
+    from PySide6.QtWidgets import QApplication
+    from PySide6 import __version__ as pyside_version
+    import src.utils.logger as logger
+    from benchmarks.suite import CASES
+
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    logger.init(False)
+
+    results = {}
+    for name, function in CASES.items():
+        if args.filter and not any(f in name for f in args.filter):
+            continue
+        print(f"Running {name}...", file=sys.stderr)
+        for key, result in function(args.quick).items():
+            results[key] = result.to_json()
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pyside": pyside_version,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "quick": args.quick,
+        },
+        "results": results,
+    }
+
+    regressions = compare(results, baseline, args.tolerance)
+    print_table(results, baseline, regressions)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) regressed by more than "
+              f"{args.tolerance:.0%}: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,347 @@
+"""Benchmark cases. Each returns {name: Result} for the sizes it covers."""
+from typing import Callable
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import Qt, QModelIndex
+
+from src.document.store import DocumentStore
+from src.document.fileformat import DocumentFile, EXTENSION
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GROUP_SIZE = 100
+
+CASES: dict[str, Callable] = {}
+
+
+class Result:
+    def __init__(self, samples: list[float], **extra):
+        self.samples = samples
+        self.extra = extra
+
+    def to_json(self) -> dict:
+        return {
+            "median_ms": statistics.median(self.samples) * 1000,
+            "min_ms": min(self.samples) * 1000,
+            "max_ms": max(self.samples) * 1000,
+            "runs": len(self.samples),
+            **self.extra,
+        }
+
+
+def case(name: str):
+    def register(function: Callable) -> Callable:
+        CASES[name] = function
+        return function
+    return register
+
+
+def measure(function: Callable, repeat: int, setup: Callable = None) -> list[float]:
+    """Wall times of repeat calls; setup runs untimed before each one"""
+    samples = []
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        function() if setup is None else function(state)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def flush_events() -> None:
+    app = QApplication.instance()
+    app.sendPostedEvents()
+    app.processEvents()
+
+
+def make_document(count: int, groups: bool = True, seed: int = 0) -> DocumentStore:
+    """count points, in groups of GROUP_SIZE when groups is set"""
+    rng = np.random.default_rng(seed)
+    document = DocumentStore(count + count // GROUP_SIZE + 1)
+    coords = np.zeros((count, 4))
+    coords[:, :2] = rng.uniform(0, 800, (count, 2))
+    if not groups:
+        document.add_many("point", [f"P{i}" for i in range(count)], coords)
+        return document
+    for start in range(0, count, GROUP_SIZE):
+        stop = min(start + GROUP_SIZE, count)
+        group = document.add("group", f"Group {start // GROUP_SIZE}")
+        document.add_many("point", [f"P{i}" for i in range(start, stop)], coords[start:stop], group)
+    return document
+
+
+def sizes(quick: bool, full: list[int], small: list[int]) -> list[int]:
+    return small if quick else full
+
+
+# Outliner
+
+@case("outliner")
+def outliner(quick: bool) -> dict[str, Result]:
+    from src.frames.controller import OutlinerFrame
+    from src.frames.controller.outliner_model import VisibleRole
+
+    results = {}
+    for count in sizes(quick, [1_000, 10_000, 100_000], [1_000, 10_000]):
+        document = make_document(count)
+        frames = []
+
+        def build():
+            frame = OutlinerFrame(document=document)
+            frame.resize(300, 600)
+            frame.show()
+            flush_events()
+            frames.append(frame)
+
+        results[f"outliner.build.{count}"] = Result(measure(build, 3), objects=count)
+        frame = frames[-1]
+        model = frame.model
+
+        # Drag the first group to the end of the root and back, through the
+        # same mime round trip a view drop goes through
+        def reorder():
+            for _ in range(2):
+                source = model.index(0, 0)
+                data = model.mimeData([source])
+                model.dropMimeData(data, Qt.MoveAction, model.rowCount(), 0, QModelIndex())
+                flush_events()
+
+        results[f"outliner.reorder.{count}"] = Result(measure(reorder, 5), moves=2)
+
+        rows = min(model.rowCount(), 100)
+
+        def toggle():
+            for row in range(rows):
+                index = model.index(row, 0)
+                model.setData(index, not model.data(index, VisibleRole), VisibleRole)
+            flush_events()
+
+        results[f"outliner.visibility.{count}"] = Result(measure(toggle, 5), toggles=rows)
+
+        # Typing a query one key at a time; clearing it in between is not timed
+        keys = ["p", "p1", "p12", "p123", "p1234"]
+
+        def clear():
+            frame.search_box.clear()
+            flush_events()
+
+        def search(_):
+            for text in keys:
+                frame.search_box.setText(text)
+                flush_events()
+
+        results[f"outliner.search.{count}"] = Result(
+            [sample / len(keys) for sample in measure(search, 5, setup=clear)],
+            objects=count)
+        clear()
+        for frame in frames:
+            frame.close()
+            frame.deleteLater()
+        flush_events()
+    return results
+
+
+# Canvas
+
+@case("canvas")
+def canvas(quick: bool) -> dict[str, Result]:
+    from src.frames.canvas import CanvasFrame, PAGE_RECT
+
+    results = {}
+    for count in sizes(quick, [1_000, 10_000, 100_000], [1_000, 10_000]):
+        document = make_document(count, groups=False)
+        view = CanvasFrame(document=document)
+        view.resize(1024, 768)
+        view.show()
+        flush_events()
+        for zoom in (0.25, 1.0, 4.0):
+            view.resetTransform()
+            view.scale(zoom, zoom)
+            view.centerOn(PAGE_RECT.center())
+            # First paint builds the spatial index and caches
+            view.viewport().grab()
+            results[f"canvas.paint.{count}.x{zoom:g}"] = Result(
+                measure(lambda: view.viewport().grab(), 5), objects=count, zoom=zoom)
+            # Every tile rendered from scratch, as after opening a document
+            results[f"canvas.tiles.{count}.x{zoom:g}"] = Result(
+                measure(lambda _: view.viewport().grab(), 3, setup=view.tiles.clear),
+                objects=count, zoom=zoom)
+        view.tiles.shutdown()
+        view.close()
+        view.deleteLater()
+        flush_events()
+    return results
+
+
+# Snapping
+
+@case("snapping")
+def snapping(quick: bool) -> dict[str, Result]:
+    from src.document.spatial import SpatialIndex
+    from src.document.snapping import SnapEngine
+
+    results = {}
+    for count in sizes(quick, [10_000, 100_000], [10_000]):
+        rng = np.random.default_rng(0)
+        document = DocumentStore(count)
+        start = rng.uniform(0, 20_000, (count, 2))
+        document.add_many("line", [f"L{i}" for i in range(count)],
+                          np.column_stack([start, start + rng.normal(0, 60, (count, 2))]))
+        engine = SnapEngine(document, SpatialIndex(document))
+        results[f"snapping.build.{count}"] = Result(measure(engine.build, 3), segments=count)
+
+        # A wandering cursor, as the Pen tool sees it; the first pass finds
+        # the intersections of every region it crosses
+        path = 10_000 + np.cumsum(rng.normal(0, 3, (1000, 2)), axis=0)
+
+        def moves():
+            for x, y in path:
+                engine.snap(x, y, 8.0)
+
+        for name, samples in (("cold", measure(moves, 1)), ("warm", measure(moves, 3))):
+            results[f"snapping.move.{name}.{count}"] = Result(
+                [sample / len(path) for sample in samples], segments=count)
+    return results
+
+
+# Discord presence
+
+def open_fds() -> int:
+    return len(os.listdir("/proc/self/fd")) if os.path.isdir("/proc/self/fd") else 0
+
+
+@case("presence")
+def presence(quick: bool) -> dict[str, Result]:
+    """Against a fake IPC socket: retries while Discord is away, then coalescing"""
+    if not hasattr(socket, "AF_UNIX"):
+        return {}
+    from benchmarks.fake_discord import FakeDiscord
+    from src.utils.discord import PresenceWorker, _pypresence_client
+
+    interval = 0.2
+    attempts = []
+
+    def client(client_id: str):
+        attempts.append(time.perf_counter())
+        return _pypresence_client(client_id)
+
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ["XDG_RUNTIME_DIR"] = directory
+        fake = FakeDiscord(directory)
+        worker = PresenceWorker("0", client, interval=interval, backoff_start=0.02,
+                                backoff_max=0.1)
+        try:
+            # Nothing listening: every attempt fails and must not leave its loop open
+            worker.start()
+            worker.update(details="Starting")
+            time.sleep(0.2)
+            fds = open_fds()
+            time.sleep(0.5 if quick else 1.5)
+            leaked = open_fds() - fds
+            failed = len(attempts)
+
+            start = time.perf_counter()
+            fake.start()
+            if not fake.wait_for(1, 5.0):
+                raise RuntimeError("presence never reached the fake Discord")
+            connect = time.perf_counter() - start
+
+            # A burst of updates from the GUI thread, most of them replaced before sending
+            samples = []
+            burst = time.perf_counter()
+            for i in range(1000):
+                t = time.perf_counter()
+                worker.update(details=f"{i} objects")
+                samples.append(time.perf_counter() - t)
+            fake.wait_for(2, 5.0)
+            time.sleep(max(0.0, burst + 3 * interval - time.perf_counter()))
+        finally:
+            worker.stop(timeout=2.0)
+            fake.stop()
+            if runtime_dir is None:
+                del os.environ["XDG_RUNTIME_DIR"]
+            else:
+                os.environ["XDG_RUNTIME_DIR"] = runtime_dir
+    if leaked > 0:
+        raise RuntimeError(f"{leaked} descriptors leaked over {failed} failed connects")
+    return {
+        "presence.connect": Result([connect], failed_attempts=failed, leaked_fds=leaked,
+                                   handshakes=fake.handshakes),
+        "presence.update": Result(samples, updates=len(samples),
+                                  sent=len(fake.activities) - 1,
+                                  last=fake.activities[-1].get("details")),
+    }
+
+
+# File I/O
+
+@case("io")
+def io(quick: bool) -> dict[str, Result]:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for count in sizes(quick, [100_000, 1_000_000], [100_000]):
+            document = make_document(count)
+            path = os.path.join(directory, f"bench{count}{EXTENSION}")
+
+            def save():
+                file = DocumentFile(document)
+                file.save(path)
+
+            samples = measure(save, 3)
+            size = os.path.getsize(path)
+            results[f"io.save.{count}"] = Result(
+                samples, objects=count, bytes=size,
+                mb_per_s=size / 2 ** 20 / statistics.median(samples))
+
+            def open_and_touch():
+                opened = DocumentStore()
+                DocumentFile(opened).open(path)
+                # Opening is lazy; reading a column is what a first paint does
+                float(opened.coords[:, 0].sum())
+
+            samples = measure(open_and_touch, 3)
+            results[f"io.open.{count}"] = Result(
+                samples, objects=count, bytes=size,
+                mb_per_s=size / 2 ** 20 / statistics.median(samples))
+    return results
+
+
+# Application
+
+@case("app")
+def app(quick: bool) -> dict[str, Result]:
+    from src.frames.main import MainWindow
+
+    def construct():
+        window = MainWindow()
+        window.show()
+        flush_events()
+        window.close()
+        window.deleteLater()
+        flush_events()
+
+    results = {"app.main_window": Result(measure(construct, 3))}
+
+    # Cold start in a fresh interpreter, as reported by --startup-profile
+    samples = []
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen")
+    with tempfile.TemporaryDirectory() as directory:
+        report = os.path.join(directory, "startup.json")
+        for _ in range(2 if quick else 5):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, os.path.join(ROOT_DIR, "main.py"),
+                            f"--startup-profile={report}"],
+                           cwd=ROOT_DIR, env=env, check=True, capture_output=True)
+            wall = time.perf_counter() - start
+            with open(report) as f:
+                samples.append(json.load(f)["total_ms"] / 1000)
+        results["app.startup"] = Result(samples, process_ms=wall * 1000)
+    return results
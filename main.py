@@ -11,9 +11,17 @@ d888888P  .88888.   888888ba  888888ba  dP  88888888b    .d8888P
 """
 
 from src import main
+import multiprocessing
 import sys
 
 if __name__ == "__main__":
-   sys.argv += ['-platform', 'windows:darkmode=2']
+   # Script workers are spawned from the frozen executable too
+   multiprocessing.freeze_support()
+   if sys.argv[1:2] == ['batch']:
+      # Headless, so no platform arguments and no window
+      from src.batch import main as batch_main
+      sys.exit(batch_main(sys.argv[2:]))
+   if sys.platform == 'win32':
+      sys.argv += ['-platform', 'windows:darkmode=2']
    app = main()
    sys.exit(app.exec())
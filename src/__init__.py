@@ -1,63 +1,137 @@
-import configparser
-from PySide6.QtWidgets import QApplication, QWidget
-from PySide6.QtCore import QTimer
-from PySide6.QtGui import QKeySequence, QShortcut
 import sys
 
-from src.utils.fonts import load_fonts
-import src.utils.logger as logger
-from src.utils.discord import discord_setup
-from src.utils.os import resource_path
-from src.frames.splash import SplashScreen
-from src.frames.main import MainWindow
+from src.utils.startup import profile
 
+PROFILE_FLAG = "--startup-profile"
 
-def _debug_setup(window: QWidget):
-    pass
 
+def _debug_setup(window):
+    """Performance HUD in the footer and a histogram panel under View"""
+    from PySide6.QtCore import Qt
+    from src.frames.performance import PerformanceHUD, PerformancePanel, instrument
+
+    instrument(window)
+    window.footer.add_widget(PerformanceHUD(window.footer))
+    panel = PerformancePanel(window)
+    window.addDockWidget(Qt.RightDockWidgetArea, panel)
+    panel.hide()
+    window.view_menu.addSeparator()
+    window.view_menu.addAction(panel.toggleViewAction())
 
-def main():
-    config = configparser.ConfigParser()
-    config.read(resource_path('config.ini'))
-    DEBUG = config.getboolean('app', 'debug')
 
-    logger.init(DEBUG)
-    logger.loading(
-        f"Initializing {config.get('app', 'name')} V{config.get('app', 'version')}...")
-    if DEBUG:
-        logger.warn("Debug mode is active")
+def _profile_target(argv: list[str]):
+    """None when not profiling, "" to print the profile, or a JSON path"""
+    for arg in argv:
+        if arg == PROFILE_FLAG:
+            return ""
+        if arg.startswith(PROFILE_FLAG + "="):
+            return arg.split("=", 1)[1]
+    return None
 
-    app = QApplication(sys.argv)
-    splash = SplashScreen()
-    splash.show()
 
-    # Connecting discord
-    discord_cleanup = None
+def main():
+    target = _profile_target(sys.argv)
+    if target is not None:
+        profile.enable()
+        sys.argv = [arg for arg in sys.argv if not arg.startswith(PROFILE_FLAG)]
+
+    # Qt and the editor are imported here rather than at package import so
+    # that script workers and the profiler don't pay for them up front
+    with profile.phase("config"):
+        import os
+        from src.utils.config import config
+        import src.utils.logger as logger
+        DEBUG = config.getboolean('app', 'debug')
+
+        log_directory = config.get('log', 'directory', fallback='') or \
+            os.path.join(os.path.expanduser('~'), '.tordie', 'logs')
+        logger.init(DEBUG, log_directory, config.get('log', 'level', fallback='info'),
+                    trace_spans=config.getboolean('log', 'trace_spans', fallback=False))
+        logger.loading("Initializing %s V%s...", config.get('app', 'name'),
+                       config.get('app', 'version'))
+        if DEBUG:
+            logger.warn("Debug mode is active")
+
+    with profile.phase("qt"):
+        from PySide6.QtWidgets import QApplication
+        from PySide6.QtCore import QTimer
+        app = QApplication(sys.argv)
+
+    # One stylesheet and palette for every widget, the splash included
+    with profile.phase("theme"):
+        from src.utils.theme import theme
+        name = config.get('theme', 'name', fallback='system')
+        try:
+            theme.apply(name)
+        except ValueError:
+            logger.warn("Unknown theme %r, using the system theme", name)
+            theme.apply("system")
+
+    # Fonts and icons are decoded on a thread while the splash is up
+    with profile.phase("preload"):
+        from src.utils.assets import assets
+        from src.utils.preload import Preloader
+        icons = [(name, 16, 90 if name.endswith("_tab.svg") else 0)
+                 for name in assets.names("src/assets/icons/")]
+        preloader = Preloader(["Bahnschrift.ttf"], icons, app.devicePixelRatio()).start()
+        # The splash is drawn with the bundled font
+        preloader.fonts_ready.wait(1.0)
+
+    with profile.phase("splash"):
+        from src.frames.splash import SplashScreen
+        splash = SplashScreen()
+        splash.show()
+        app.processEvents()
+
+    with profile.phase("window"):
+        from src.frames.main import MainWindow
+        preloader.install()
+        window = MainWindow()
+        if DEBUG:
+            _debug_setup(window)
+
+        # Production sessions can still collect the counters, without the HUD
+        metrics_path = config.get('metrics', 'dump', fallback='')
+        if metrics_path:
+            from src.frames.performance import instrument
+            from src.utils.metrics import metrics
+            if not DEBUG:
+                instrument(window)
+            app.aboutToQuit.connect(lambda: metrics.dump(metrics_path))
+
+    with profile.phase("show"):
+        window.show()
+        splash.close()
+        app.processEvents()
+    logger.info("QApplication initialized")
+
+    if target is not None:
+        profile.disable()
+        profile.write(target)
+        QTimer.singleShot(0, app.quit)
+        sys.exit(app.exec())
+
+    # Connecting discord once the window is up; the worker thread only ever
+    # sends the latest activity, so polling it here costs nothing
+    presence_timer = QTimer(app)
 
     def setup_discord_async():
-        global discord_cleanup
-        discord_cleanup = discord_setup(DEBUG)
+        from src.utils.discord import discord_setup, UPDATE_INTERVAL
+        presence = discord_setup(DEBUG)
+        if presence is not None:
+            presence_timer.timeout.connect(
+                lambda: presence.update(**window.presence_activity()))
+            presence_timer.start(int(UPDATE_INTERVAL * 1000))
 
     QTimer.singleShot(500, setup_discord_async)
 
-    # Setting up custom fonts
-    load_fonts(["Bahnschrift.ttf"])
-
     def cleanup():
+        from src.utils.discord import discord_cleanup
         logger.info("Attempting cleanup")
-        if discord_cleanup:
-            discord_cleanup()
+        presence_timer.stop()
+        discord_cleanup()
         logger.info("Clean up finished")
 
-    # Setting up main window
-    window = MainWindow()
-
-    if DEBUG:
-        _debug_setup(window)
-
     app.aboutToQuit.connect(cleanup)
-
-    QTimer.singleShot(1000, lambda: (logger.info(
-        "QApplication initialized"), splash.close(), window.show()))
     sys.exit(app.exec())
     return app
@@ -0,0 +1,206 @@
+"""Headless batch processing: open, run scripts, export.
+
+    python main.py batch drawings/*.tordie --script tidy.py --format png --format pdf -o out
+    python main.py batch @jobs.txt --jobs 8 --json
+
+Each document is one job. Jobs are spread over a pool of processes, none of
+which creates a window; a line with the timings of each job is printed as it
+finishes. Modifiers are not evaluated: they are not saved with documents, so
+a job never has any. Exits with 0 when every job succeeded, 1 when any failed and 2 on
+bad arguments.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from src.render.export import FORMATS
+
+EXIT_OK, EXIT_FAILED, EXIT_USAGE = 0, 1, 2
+SCRIPT_TIMEOUT = 300.0
+
+
+class Job:
+    def __init__(self, document: str, scripts: list[tuple[str, str]], formats: list[str],
+                 output: str, scale: float, save: bool, timeout: float, workers: int):
+        self.document = document
+        # Name and source of each script, read once by the parent
+        self.scripts = scripts
+        self.formats = formats
+        self.output = output
+        self.scale = scale
+        self.save = save
+        self.timeout = timeout
+        self.workers = workers
+
+
+_app = None
+
+
+def _init_worker() -> None:
+    """Qt without a display, once per process"""
+    global _app
+    os.environ["QT_QPA_PLATFORM"] = "offscreen"
+    from PySide6.QtGui import QGuiApplication
+    import src.utils.logger as logger
+    _app = QGuiApplication.instance() or QGuiApplication(["tordie-batch"])
+    logger.init(False)
+
+
+def _run_scripts(document, scripts: list[tuple[str, str]], timeout: float) -> None:
+    """Run scripts one after another, pumping events for the runner's poll timer"""
+    from src.scripting.runner import ScriptRunner, DONE
+    runner = ScriptRunner(document, workers=1)
+    finished = {}
+    runner.job_finished.connect(lambda job, status, message: finished.update(
+        {job: (status, message)}))
+    try:
+        for name, source in scripts:
+            job = runner.run(source, name, timeout)
+            while job not in finished:
+                _app.processEvents()
+                time.sleep(0.005)
+            status, message = finished[job]
+            if status != DONE:
+                raise RuntimeError(f"script {name} {status}: {message}")
+    finally:
+        runner.shutdown()
+
+
+def run_job(job: Job) -> dict:
+    """Process one document; never raises, failures are in the result"""
+    if _app is None:
+        _init_worker()
+    from src.document.store import DocumentStore
+    from src.document.parametric import ParametricEngine
+    from src.document.fileformat import DocumentFile
+    from src.render.export import Exporter
+
+    result = {"document": job.document, "ok": False, "outputs": [], "timings": {}}
+    timings = result["timings"]
+    started = time.perf_counter()
+
+    def phase(name: str, begin: float) -> float:
+        now = time.perf_counter()
+        timings[name] = round((now - begin) * 1000, 1)
+        return now
+
+    document = DocumentStore()
+    ParametricEngine(document)
+    try:
+        mark = time.perf_counter()
+        file = DocumentFile(document)
+        file.open(job.document)
+        mark = phase("open", mark)
+
+        if job.scripts:
+            _run_scripts(document, job.scripts, job.timeout)
+            mark = phase("scripts", mark)
+
+        stem = os.path.splitext(os.path.basename(job.document))[0]
+        for extension in job.formats:
+            path = os.path.join(job.output, stem + extension)
+            Exporter(document, path, scale=job.scale, workers=job.workers).run()
+            result["outputs"].append(path)
+        mark = phase("export", mark)
+
+        if job.save:
+            file.save()
+            phase("save", mark)
+        result["ok"] = True
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["timings"]["total"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+def _format(result: dict) -> str:
+    timings = "  ".join(f"{name} {ms:.0f} ms" for name, ms in result["timings"].items())
+    status = "ok" if result["ok"] else f"FAILED ({result['error']})"
+    return f"{result['document']}: {status}  {timings}"
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="tordie batch", fromfile_prefix_chars="@",
+        description="Open documents, run scripts on them and export them "
+                    "without a window. @file reads arguments from a file, one per line.")
+    parser.add_argument("documents", nargs="+", help="documents to process")
+    parser.add_argument("-s", "--script", action="append", default=[],
+                        help="script to run on every document, in the order given")
+    parser.add_argument("-f", "--format", action="append", default=[],
+                        choices=[f[1:] for f in FORMATS], help="export format, repeatable")
+    parser.add_argument("-o", "--output", default=".", help="directory for exports")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="pixels (PNG) or points (SVG, PDF) per unit")
+    parser.add_argument("--save", action="store_true", help="write each document back")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="documents processed at once")
+    parser.add_argument("--timeout", type=float, default=SCRIPT_TIMEOUT,
+                        help="seconds each script may run")
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = None) -> int:
+    try:
+        args = parse_args(sys.argv[1:] if argv is None else argv)
+    except SystemExit as e:
+        return EXIT_USAGE if e.code else EXIT_OK
+
+    scripts = []
+    for path in args.script:
+        try:
+            with open(path, encoding="utf-8") as f:
+                scripts.append((os.path.basename(path), f.read()))
+        except OSError as e:
+            print(f"Cannot read script {path}: {e}", file=sys.stderr)
+            return EXIT_USAGE
+    os.makedirs(args.output, exist_ok=True)
+
+    processes = max(1, min(args.jobs, len(args.documents)))
+    # Processes share the CPUs; each gets its slice for tiled exports
+    threads = max(1, (os.cpu_count() or 1) // processes)
+    jobs = [Job(path, scripts, [f".{f}" for f in args.format], args.output, args.scale,
+                args.save, args.timeout, threads) for path in args.documents]
+
+    started = time.perf_counter()
+    failed = 0
+
+    def report(result: dict) -> None:
+        nonlocal failed
+        failed += not result["ok"]
+        print(json.dumps(result) if args.json else _format(result), flush=True)
+
+    try:
+        if processes == 1:
+            for job in jobs:
+                report(run_job(job))
+        else:
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(processes, mp_context=context,
+                                     initializer=_init_worker) as pool:
+                futures = {pool.submit(run_job, job): job for job in jobs}
+                for future in as_completed(futures):
+                    try:
+                        report(future.result())
+                    except Exception as e:
+                        # The worker process itself died
+                        report({"document": futures[future].document, "ok": False,
+                                "error": f"{type(e).__name__}: {e}", "outputs": [],
+                                "timings": {}})
+    except KeyboardInterrupt:
+        print("Interrupted", file=sys.stderr)
+        return EXIT_FAILED
+
+    elapsed = time.perf_counter() - started
+    print(f"{len(jobs) - failed}/{len(jobs)} documents processed in {elapsed:.1f} s "
+          f"with {processes} process(es)", file=sys.stderr)
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
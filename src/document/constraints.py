@@ -0,0 +1,595 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+import os
+import time
+import numpy as np
+
+from src.document.store import DocumentStore, KIND_IDS, FLAG_ALIVE
+import src.utils.logger as logger
+
+COINCIDENT, DISTANCE, TANGENT, ANGLE = range(4)
+CONSTRAINT_KINDS = ["coincident", "distance", "tangent", "angle"]
+
+# A constraint is met once its residual is within this many units
+TOLERANCE = 1e-6
+MAX_ITERATIONS = 50
+CGLS_ITERATIONS = 40
+CGLS_TOLERANCE = 1e-3
+INITIAL_DAMPING = 1e-3
+MAX_DAMPING = 1e10
+# Small clusters are solved together, up to this many constraints at a time
+BATCH_CONSTRAINTS = 2048
+PARALLEL_MIN = 2
+
+_POINT, _LINE, _CIRCLE = KIND_IDS["point"], KIND_IDS["line"], KIND_IDS["circle"]
+# Which sub-points of a kind can be referenced: a point, both line ends, a centre
+_SUB_POINTS = {_POINT: 1, _LINE: 2, _CIRCLE: 1}
+
+
+def _matvec(rows, cols, vals, v, m):
+    return np.bincount(rows, vals * v[cols], minlength=m)
+
+
+def _rmatvec(rows, cols, vals, u, n):
+    return np.bincount(cols, vals * u[rows], minlength=n)
+
+
+def cgls(rows: np.ndarray, cols: np.ndarray, vals: np.ndarray, b: np.ndarray, n: int,
+         damping=0.0, iterations: int = CGLS_ITERATIONS,
+         tolerance: float = CGLS_TOLERANCE) -> np.ndarray:
+    """Least squares x minimizing |Jx - b|^2 + sum(damping x^2) for a COO matrix J.
+
+    damping is a scalar or one weight per variable. Starting from zero, the
+    result has the smallest norm among equally good solutions, which is what
+    an under-constrained sketch wants: nothing moves further than it has to.
+    """
+    m = len(b)
+    x = np.zeros(n)
+    r = b.copy()
+    s = _rmatvec(rows, cols, vals, r, n)
+    p = s.copy()
+    gamma = s @ s
+    stop = tolerance * tolerance * gamma
+    for _ in range(iterations):
+        if gamma <= stop or gamma == 0:
+            break
+        q = _matvec(rows, cols, vals, p, m)
+        delta = q @ q + np.sum(damping * p * p)
+        if delta <= 0:
+            break
+        alpha = gamma / delta
+        x += alpha * p
+        r -= alpha * q
+        s = _rmatvec(rows, cols, vals, r, n) - damping * x
+        gamma, previous = s @ s, gamma
+        p = s + (gamma / previous) * p
+    return x
+
+
+class System:
+    """Constraints over a local copy of the coordinates of the objects they use.
+
+    Coordinates are the flattened (k, 4) rows of the objects, so coordinate
+    4i + c is column c of the i-th object. Coincident points share one
+    variable instead of adding equations, which removes most of the rows and
+    unknowns of a typical sketch; var_map gives the variable of every
+    coordinate.
+    """
+
+    def __init__(self, kinds, a, a_sub, b, b_sub, values, objects: np.ndarray,
+                 merge: bool = True):
+        a = np.searchsorted(objects, a)
+        b = np.searchsorted(objects, b)
+        a_sub = a_sub.astype(np.int64)
+        b_sub = b_sub.astype(np.int64)
+        size = 4 * len(objects)
+        labels = np.arange(size)
+        if merge:
+            same = kinds == COINCIDENT
+            first = np.concatenate([4 * a[same] + 2 * a_sub[same], 4 * a[same] + 2 * a_sub[same] + 1])
+            second = np.concatenate([4 * b[same] + 2 * b_sub[same], 4 * b[same] + 2 * b_sub[same] + 1])
+            # Connected components of the coincidences by label propagation;
+            # chains of coincident points are short, so this settles quickly
+            while len(first):
+                low = np.minimum(labels[first], labels[second])
+                before = labels.copy()
+                np.minimum.at(labels, first, low)
+                np.minimum.at(labels, second, low)
+                labels = labels[labels]
+                if np.array_equal(labels, before):
+                    break
+            keep = ~same
+            kinds, a, b, a_sub, b_sub, values = (
+                kinds[keep], a[keep], b[keep], a_sub[keep], b_sub[keep], values[keep])
+        variables, self.var_map = np.unique(labels, return_inverse=True)
+        self.n = len(variables)
+        self.kinds, self.a, self.b = kinds, a, b
+        self.a_sub, self.b_sub, self.values = a_sub, b_sub, values
+        counts = np.where(kinds == COINCIDENT, 2, 1)
+        self.first_row = np.concatenate([[0], np.cumsum(counts)[:-1]]).astype(np.int64)
+        self.rows = int(counts.sum())
+
+    def reduce(self, x: np.ndarray, fixed: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Variables from coordinates, and which of them may move.
+
+        A shared variable starts from a fixed coordinate when it has one, so
+        a dragged point pulls everything coincident with it along.
+        """
+        z = np.empty(self.n)
+        z[self.var_map[::-1]] = x[::-1]
+        z[self.var_map[fixed]] = x[fixed]
+        free = np.ones(self.n, bool)
+        free[self.var_map[fixed]] = False
+        return z, free
+
+    def expand(self, z: np.ndarray) -> np.ndarray:
+        return z[self.var_map]
+
+    def evaluate(self, z: np.ndarray):
+        """Residuals and the COO Jacobian (rows, cols, vals) over the variables z"""
+        X = self.expand(z).reshape(-1, 4)
+        r = np.zeros(self.rows)
+        rows, cols, vals = [], [], []
+
+        def add(row, var, val):
+            rows.append(row)
+            cols.append(var)
+            vals.append(val)
+
+        for kind, function in ((COINCIDENT, self._coincident), (DISTANCE, self._distance),
+                               (TANGENT, self._tangent), (ANGLE, self._angle)):
+            index = np.flatnonzero(self.kinds == kind)
+            if len(index):
+                function(X, index, r, add)
+        if not rows:
+            empty = np.zeros(0, np.int64)
+            return r, (empty, empty, np.zeros(0))
+        return r, (np.concatenate(rows), self.var_map[np.concatenate(cols)],
+                   np.concatenate(vals))
+
+    def _point(self, X, objects, subs):
+        """Coordinates and variable indices of referenced points"""
+        column = 2 * subs
+        x = X[objects, column]
+        y = X[objects, column + 1]
+        vx = 4 * objects + column
+        return x, y, vx, vx + 1
+
+    def _coincident(self, X, index, r, add):
+        xa, ya, ia, ja = self._point(X, self.a[index], self.a_sub[index])
+        xb, yb, ib, jb = self._point(X, self.b[index], self.b_sub[index])
+        row = self.first_row[index]
+        r[row] = xa - xb
+        r[row + 1] = ya - yb
+        ones = np.ones(len(index))
+        add(row, ia, ones)
+        add(row, ib, -ones)
+        add(row + 1, ja, ones)
+        add(row + 1, jb, -ones)
+
+    def _distance(self, X, index, r, add):
+        xa, ya, ia, ja = self._point(X, self.a[index], self.a_sub[index])
+        xb, yb, ib, jb = self._point(X, self.b[index], self.b_sub[index])
+        dx, dy = xa - xb, ya - yb
+        length = np.maximum(np.hypot(dx, dy), 1e-12)
+        row = self.first_row[index]
+        r[row] = length - self.values[index]
+        add(row, ia, dx / length)
+        add(row, ja, dy / length)
+        add(row, ib, -dx / length)
+        add(row, jb, -dy / length)
+
+    def _tangent(self, X, index, r, add):
+        # Signed distance from the centre to the line equals the radius
+        line, circle = self.a[index], self.b[index]
+        x1, y1, x2, y2 = X[line].T
+        cx, cy, radius = X[circle, 0], X[circle, 1], X[circle, 2]
+        ux, uy, wx, wy = x2 - x1, y2 - y1, cx - x1, cy - y1
+        cross = ux * wy - uy * wx
+        length = np.maximum(np.hypot(ux, uy), 1e-12)
+        side = np.where(cross < 0, -1.0, 1.0)
+        row = self.first_row[index]
+        r[row] = cross / length - side * radius
+
+        # d(cross / length) = d cross / length - cross d length / length^2
+        k = cross / length ** 3
+        base_l, base_c = 4 * line, 4 * circle
+        add(row, base_l, (uy - wy) / length + k * ux)
+        add(row, base_l + 1, (wx - ux) / length + k * uy)
+        add(row, base_l + 2, wy / length - k * ux)
+        add(row, base_l + 3, -wx / length - k * uy)
+        add(row, base_c, -uy / length)
+        add(row, base_c + 1, ux / length)
+        add(row, base_c + 2, -side)
+
+    def _angle(self, X, index, r, add):
+        first, second = self.a[index], self.b[index]
+        ux, uy = X[first, 2] - X[first, 0], X[first, 3] - X[first, 1]
+        vx, vy = X[second, 2] - X[second, 0], X[second, 3] - X[second, 1]
+        cross = ux * vy - uy * vx
+        dot = ux * vx + uy * vy
+        norm = np.maximum(cross * cross + dot * dot, 1e-24)
+        error = np.angle(np.exp(1j * (np.arctan2(cross, dot) - self.values[index])))
+        # Radians are weighted by the line lengths to be comparable with distances
+        lu2 = np.maximum(ux * ux + uy * uy, 1e-24)
+        lv2 = np.maximum(vx * vx + vy * vy, 1e-24)
+        weight = (lu2 * lv2) ** 0.25
+        row = self.first_row[index]
+        r[row] = weight * error
+
+        # d(weight error) = weight d angle + error d weight, with
+        # d angle = (dot d cross - cross d dot) / norm and d weight / d ux = weight ux / (2 lu2)
+        half = 0.5 * weight * error
+        d_ux = weight * (dot * vy - cross * vx) / norm + half * ux / lu2
+        d_uy = weight * (-dot * vx - cross * vy) / norm + half * uy / lu2
+        d_vx = weight * (-dot * uy - cross * ux) / norm + half * vx / lv2
+        d_vy = weight * (dot * ux - cross * uy) / norm + half * vy / lv2
+        base_u, base_v = 4 * first, 4 * second
+        for offset, value in ((0, -d_ux), (1, -d_uy), (2, d_ux), (3, d_uy)):
+            add(row, base_u + offset, value)
+        for offset, value in ((0, -d_vx), (1, -d_vy), (2, d_vx), (3, d_vy)):
+            add(row, base_v + offset, value)
+
+
+def levenberg_marquardt(system: System, z: np.ndarray, free: np.ndarray,
+                        tolerance: float = TOLERANCE,
+                        iterations: int = MAX_ITERATIONS) -> tuple[np.ndarray, int, float]:
+    """Solve from z, warm-started, moving only free variables.
+
+    Each step is an inexact CGLS solve with the columns scaled to unit norm,
+    damped in proportion to them as in Marquardt's scaling. Returns the
+    solution, the iterations taken and the largest residual.
+    """
+    n = len(z)
+    r, (rows, cols, vals) = system.evaluate(z)
+    if not len(r) or not free[cols].any():
+        return z, 0, float(np.abs(r).max()) if len(r) else 0.0
+    cost = r @ r
+    damping = INITIAL_DAMPING
+    iteration = 0
+    while iteration < iterations and np.abs(r).max() > tolerance:
+        iteration += 1
+        keep = free[cols]
+        rows_k, cols_k, vals_k = rows[keep], cols[keep], vals[keep]
+        norms = np.sqrt(np.bincount(cols_k, vals_k * vals_k, minlength=n))
+        scale = np.divide(1.0, norms, out=np.zeros(n), where=norms > 0)
+        step = scale * cgls(rows_k, cols_k, vals_k * scale[cols_k], -r, n,
+                            damping * (norms > 0))
+        trial = z + step
+        trial_r, trial_jacobian = system.evaluate(trial)
+        trial_cost = trial_r @ trial_r
+        if trial_cost < cost:
+            z, r, cost = trial, trial_r, trial_cost
+            rows, cols, vals = trial_jacobian
+            damping = max(damping / 3, 1e-12)
+        else:
+            damping *= 4
+            if damping > MAX_DAMPING:
+                break
+    return z, iteration, float(np.abs(r).max())
+
+
+class SolveStats:
+    def __init__(self):
+        self.solves = 0
+        self.clusters = 0
+        self.iterations = 0
+        self.residual = 0.0
+        self.last = 0.0
+
+
+class ConstraintSystem:
+    """Geometric constraints between document objects, kept satisfied as they are edited.
+
+    Constraints join objects into clusters (union-find over the objects they
+    reference). An edit marks the clusters of the edited objects dirty, and
+    solve() re-solves only those, holding the edited objects where the edit
+    put them and starting from the current coordinates. Each cluster is a
+    sparse nonlinear least squares problem solved by Levenberg-Marquardt,
+    with CGLS on the COO Jacobian for every step. Small clusters are batched
+    together, and batches run on a thread pool.
+    """
+
+    def __init__(self, document: DocumentStore, workers: int = None):
+        self.document = document
+        self.schedule: Callable[[], None] = None
+        self.workers = workers or os.cpu_count() or 1
+        self.stats = SolveStats()
+        self.count = 0
+        self._allocate(256)
+        self._roots: dict[int, int] = None
+        self._clusters: dict[int, np.ndarray] = None
+        self._dirty: set[int] = set()
+        # Coordinates the user edited since the last solve, held in place
+        self._fixed: dict[int, np.ndarray] = {}
+        self._before: dict[int, np.ndarray] = {}
+        self._listeners: list[Callable] = []
+        self._pool: ThreadPoolExecutor = None
+        self._applying = False
+        document.subscribe(self._on_document_event)
+
+    def _allocate(self, capacity: int) -> None:
+        def grow(old, dtype):
+            new = np.zeros(capacity, dtype)
+            if old is not None:
+                new[:self.count] = old[:self.count]
+            return new
+        get = lambda name: getattr(self, name, None)
+        self.kinds = grow(get("kinds"), np.int8)
+        self.a = grow(get("a"), np.int32)
+        self.b = grow(get("b"), np.int32)
+        self.a_sub = grow(get("a_sub"), np.int8)
+        self.b_sub = grow(get("b_sub"), np.int8)
+        self.values = grow(get("values"), np.float64)
+        self.alive = grow(get("alive"), bool)
+
+    def subscribe(self, listener: Callable) -> None:
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, event: str, *args) -> None:
+        for listener in self._listeners:
+            listener(event, *args)
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.alive[:self.count]))
+
+    def ids(self) -> np.ndarray:
+        return np.flatnonzero(self.alive[:self.count])
+
+    # Structure
+
+    def add(self, kind: int, a: int, b: int, value: float = 0.0,
+            a_sub: int = 0, b_sub: int = 0) -> int:
+        """Add a constraint and return its id; raises ValueError on unsuitable objects"""
+        document = self.document
+        for oid in (a, b):
+            if not document.is_alive(oid):
+                raise ValueError(f"Object {oid} does not exist")
+        if a == b:
+            raise ValueError("A constraint needs two different objects")
+        ka, kb = int(document.kinds[a]), int(document.kinds[b])
+        if kind in (COINCIDENT, DISTANCE):
+            for k, sub, oid in ((ka, a_sub, a), (kb, b_sub, b)):
+                if not 0 <= sub < _SUB_POINTS.get(k, 0):
+                    raise ValueError(f"{document.name_of(oid)!r} has no point {sub}")
+        elif kind == TANGENT:
+            if (ka, kb) == (_CIRCLE, _LINE):
+                a, b, ka, kb = b, a, kb, ka
+            if (ka, kb) != (_LINE, _CIRCLE):
+                raise ValueError("Tangency is between a line and a circle")
+        elif kind == ANGLE:
+            if ka != _LINE or kb != _LINE:
+                raise ValueError("Angles are between two lines")
+        else:
+            raise ValueError(f"Unknown constraint kind {kind}")
+
+        if self.count == len(self.kinds):
+            self._allocate(2 * len(self.kinds))
+        cid = self.count
+        self.count += 1
+        self.kinds[cid], self.a[cid], self.b[cid] = kind, a, b
+        self.a_sub[cid], self.b_sub[cid] = a_sub, b_sub
+        self.values[cid] = value
+        self.alive[cid] = True
+        self._roots = None
+        self._mark([a, b])
+        self._notify("added", cid)
+        return cid
+
+    def remove(self, cid: int) -> None:
+        self.alive[cid] = False
+        self._roots = None
+        self._notify("removed", cid)
+
+    def set_value(self, cid: int, value: float) -> None:
+        self.values[cid] = value
+        self._mark([int(self.a[cid])])
+        self._notify("changed", cid)
+
+    def clear(self) -> None:
+        self.count = 0
+        self.alive[:] = False
+        self._roots = None
+        self._dirty.clear()
+        self._fixed.clear()
+        self._before.clear()
+        self._notify("cleared")
+
+    def active(self) -> np.ndarray:
+        """Constraints whose objects both still exist"""
+        ids = self.ids()
+        flags = self.document.flags
+        keep = (flags[self.a[ids]] & FLAG_ALIVE).astype(bool) & \
+               (flags[self.b[ids]] & FLAG_ALIVE).astype(bool)
+        return ids[keep]
+
+    def roots(self) -> dict[int, int]:
+        """Cluster root of every constrained object, by union-find"""
+        if self._roots is None:
+            parent: dict[int, int] = {}
+
+            def find(oid: int) -> int:
+                root = parent.setdefault(oid, oid)
+                while root != parent[root]:
+                    # Path halving
+                    parent[root] = parent[parent[root]]
+                    root = parent[root]
+                return root
+
+            ids = self.active()
+            for a, b in zip(self.a[ids].tolist(), self.b[ids].tolist()):
+                ra, rb = find(a), find(b)
+                if ra != rb:
+                    parent[max(ra, rb)] = min(ra, rb)
+            self._roots = {oid: find(oid) for oid in parent}
+            self._clusters = None
+        return self._roots
+
+    def clusters(self) -> dict[int, np.ndarray]:
+        """Constraint ids of each cluster, by root object"""
+        roots = self.roots()
+        if self._clusters is not None:
+            return self._clusters
+        ids = self.active()
+        if not len(ids):
+            self._clusters = {}
+            return self._clusters
+        labels = np.array([roots[a] for a in self.a[ids].tolist()], np.int64)
+        order = np.argsort(labels, kind="stable")
+        labels, ids = labels[order], ids[order]
+        starts = np.flatnonzero(np.diff(labels)) + 1
+        self._clusters = {int(group_labels[0]): group for group_labels, group in
+                          zip(np.split(labels, starts), np.split(ids, starts))}
+        return self._clusters
+
+    # Dirty tracking
+
+    @property
+    def dirty(self) -> set[int]:
+        roots = self.roots()
+        return {roots[oid] for oid in self._dirty if oid in roots}
+
+    def _mark(self, oids) -> None:
+        self._dirty.update(oids)
+        if self.schedule is not None:
+            self.schedule()
+
+    def _on_document_event(self, event: str, *args) -> None:
+        if event in ("begin_change", "changed"):
+            ids, what = args
+            if what != "coords" or self._applying or not self.count:
+                return
+            roots = self.roots()
+            edited = [oid for oid in np.asarray(ids).tolist() if oid in roots]
+            if not edited:
+                return
+            coords = self.document.coords
+            if event == "begin_change":
+                for oid in edited:
+                    self._before[oid] = coords[oid].copy()
+                return
+            for oid in edited:
+                before = self._before.pop(oid, None)
+                moved = coords[oid] != before if before is not None else np.ones(4, bool)
+                # Edited coordinates stay where the edit put them
+                self._fixed[oid] = self._fixed.get(oid, np.zeros(4, bool)) | moved
+            self._mark(edited)
+        elif event in ("end_insert", "end_remove"):
+            # Removing or reviving an object switches its constraints off or on
+            if self.count:
+                self._roots = None
+                self._mark(np.asarray(args[0]).tolist())
+        elif event == "reset":
+            self.clear()
+
+    # Solving
+
+    def solve(self) -> int:
+        """Re-solve the dirty clusters; returns how many were solved"""
+        if not self._dirty:
+            return 0
+        with logger.span("constraints.solve"):
+            return self._solve()
+
+    def _solve(self) -> int:
+        start = time.perf_counter()
+        roots = self.roots()
+        dirty = {roots[oid] for oid in self._dirty if oid in roots}
+        held = sorted(self._fixed)
+        fixed = (np.array(held, np.int64),
+                 np.array([self._fixed[oid] for oid in held], bool).reshape(-1, 4))
+        self._dirty.clear()
+        self._fixed.clear()
+        clusters = self.clusters()
+        groups = [clusters[root] for root in dirty if root in clusters]
+        if not groups:
+            return 0
+
+        # Big clusters alone, small ones packed together
+        groups.sort(key=len, reverse=True)
+        batches, current, size = [], [], 0
+        for group in groups:
+            if len(group) >= BATCH_CONSTRAINTS:
+                batches.append(group)
+                continue
+            current.append(group)
+            size += len(group)
+            if size >= BATCH_CONSTRAINTS:
+                batches.append(np.concatenate(current))
+                current, size = [], 0
+        if current:
+            batches.append(np.concatenate(current))
+
+        coords = self.document.coords
+        if len(batches) >= PARALLEL_MIN and self.workers > 1:
+            results = list(self._executor().map(lambda c: self._solve_batch(c, coords, fixed),
+                                                batches))
+        else:
+            results = [self._solve_batch(c, coords, fixed) for c in batches]
+
+        moved = [(objects, rows) for objects, rows, _, _ in results if len(objects)]
+        if moved:
+            self._applying = True
+            try:
+                self.document.set_coords(np.concatenate([o for o, _ in moved]),
+                                         np.concatenate([r for _, r in moved]))
+            finally:
+                self._applying = False
+
+        stats = self.stats
+        stats.solves += 1
+        stats.clusters = len(groups)
+        stats.iterations = max(result[2] for result in results)
+        stats.residual = max(result[3] for result in results)
+        stats.last = time.perf_counter() - start
+        if stats.residual > 1e3 * TOLERANCE:
+            logger.warn("Constraints not met, largest residual %.3g", stats.residual)
+        self._notify("solved", len(groups))
+        return len(groups)
+
+    def _solve_batch(self, ids: np.ndarray, coords: np.ndarray,
+                     fixed: tuple[np.ndarray, np.ndarray]):
+        """Objects moved by solving constraints ids, their new rows, iterations and residual"""
+        objects = np.unique(np.concatenate([self.a[ids], self.b[ids]])).astype(np.int64)
+        system = System(self.kinds[ids], self.a[ids], self.a_sub[ids], self.b[ids],
+                        self.b_sub[ids], self.values[ids], objects)
+        before = coords[objects].copy()
+        fixed_ids, fixed_masks = fixed
+        position = np.searchsorted(fixed_ids, objects).clip(max=max(len(fixed_ids) - 1, 0))
+        mask = np.zeros((len(objects), 4), bool)
+        if len(fixed_ids):
+            found = fixed_ids[position] == objects
+            mask[found] = fixed_masks[position[found]]
+        held = np.flatnonzero(mask.ravel())
+        z, free = system.reduce(before.ravel(), held)
+        z, iterations, residual = levenberg_marquardt(system, z, free)
+        after = system.expand(z).reshape(-1, 4)
+        # Columns no constraint uses keep their value
+        after = np.where(np.isfinite(after), after, before)
+        changed = (after != before).any(axis=1)
+        return objects[changed], after[changed], iterations, residual
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="constraints")
+        return self._pool
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def residuals(self, ids: np.ndarray = None) -> np.ndarray:
+        """Largest residual of each constraint at the current coordinates"""
+        ids = self.ids() if ids is None else np.asarray(ids)
+        if not len(ids):
+            return np.zeros(0)
+        objects = np.unique(np.concatenate([self.a[ids], self.b[ids]])).astype(np.int64)
+        system = System(self.kinds[ids], self.a[ids], self.a_sub[ids], self.b[ids],
+                        self.b_sub[ids], self.values[ids], objects, merge=False)
+        r, _ = system.evaluate(self.document.coords[objects].ravel())
+        return np.maximum.reduceat(np.abs(r), system.first_row)
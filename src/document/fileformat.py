@@ -0,0 +1,399 @@
+from array import array
+import json
+import os
+import struct
+import numpy as np
+
+from src.document.store import DocumentStore, NameTable, COLUMNS, GROUP, ROOT, FLAG_ALIVE
+import src.utils.logger as logger
+
+# File layout, all integers little endian:
+#
+#   header     one page: magic, version, object count, row capacity, rows per
+#              chunk, offset and length of the table of contents
+#   columns    one page aligned region per store column, `capacity` rows long
+#              and split into chunks of CHUNK_ROWS rows that are rewritten
+#              independently
+#   blobs      names, expressions and the child arrays of every group
+#   toc        (name, offset, length) per column and blob
+#
+# Columns have spare capacity so appending objects rarely needs a full rewrite.
+# Blobs that change are appended after the old ones, which are left as garbage
+# until the next full rewrite.
+
+EXTENSION = ".tordie"
+MAGIC = b"TORDIE6\0"
+FORMAT_VERSION = 1
+PAGE = 4096
+BLOB_ALIGN = 64
+CHUNK_ROWS = 1 << 16
+HEADER = struct.Struct("<8sIIQQQQQ")
+TOC_ENTRY = struct.Struct("<32sQQ")
+# Rewrite the whole file once garbage makes up this much of it
+GARBAGE_FRACTION = 0.5
+
+COLUMN_DTYPES = {
+    "_kind": np.dtype("<u1"),
+    "_flags": np.dtype("<u1"),
+    "_coords": np.dtype(("<f8", (4,))),
+    "_parent": np.dtype("<i4"),
+    "_row": np.dtype("<i4"),
+    "_name": np.dtype("<i4"),
+}
+# Every file has these next to the columns, even when empty
+BLOBS = ["names.offsets", "names.data", "expressions", "tree.groups", "tree.offsets",
+         "tree.children"]
+
+
+class DocumentFormatError(ValueError):
+    pass
+
+
+def _align(f, alignment: int) -> int:
+    offset = f.seek(0, os.SEEK_END)
+    padded = -offset % alignment + offset
+    if padded != offset:
+        f.write(bytes(padded - offset))
+    return padded
+
+
+def _capacity(count: int) -> int:
+    """Rows to reserve for count objects, a quarter spare, in whole chunks"""
+    rows = count + count // 4 + 1
+    return -(-rows // CHUNK_ROWS) * CHUNK_ROWS
+
+
+class ChildIndex:
+    """Child arrays of every group as stored in a file (CSR layout)"""
+
+    def __init__(self, groups: np.ndarray, offsets: np.ndarray, children: np.ndarray):
+        self.groups = groups
+        self.offsets = offsets
+        self.children = children
+
+    def _slot(self, oid: int) -> int:
+        slot = int(np.searchsorted(self.groups, oid))
+        return slot if slot < len(self.groups) and self.groups[slot] == oid else -1
+
+    def count(self, oid: int) -> int:
+        slot = self._slot(oid)
+        return 0 if slot < 0 else int(self.offsets[slot + 1] - self.offsets[slot])
+
+    def peek(self, oid: int) -> np.ndarray:
+        slot = self._slot(oid)
+        if slot < 0:
+            return self.children[:0]
+        return self.children[self.offsets[slot]:self.offsets[slot + 1]]
+
+    def load(self, oid: int) -> array:
+        children = array("i")
+        children.frombytes(self.peek(oid).tobytes())
+        return children
+
+    def detach(self) -> None:
+        """Copy the arrays out of the mapped file"""
+        self.groups = np.array(self.groups)
+        self.offsets = np.array(self.offsets)
+        self.children = np.array(self.children)
+
+
+class DocumentFile:
+    """Reads and writes a DocumentStore in the native chunked format.
+
+    Opening maps the file copy-on-write and hands the mapped columns straight
+    to the store, so nothing is read until it is used and child arrays are
+    only materialized when a group is first expanded. The file listens to the
+    store and marks which column chunks edits touched; saving back to the
+    same file rewrites just those chunks.
+    """
+
+    def __init__(self, document: DocumentStore):
+        self.document = document
+        self.path: str = None
+        self.modified = False
+        self._layout: dict[str, tuple[int, int]] = {}
+        self._capacity = 0
+        self._size = 0
+        self._garbage = 0
+        self._names_saved = 0
+        self._tree_dirty = True
+        self._expressions_dirty = True
+        self._dirty = {attr: np.zeros(0, bool) for attr in COLUMNS}
+        self._pending_parents: list[int] = []
+        document.subscribe(self._on_document_event)
+
+    # Change tracking
+
+    def _mark(self, attrs, ids) -> None:
+        chunks = np.unique(np.asarray(ids, np.int64) // CHUNK_ROWS)
+        if not len(chunks):
+            return
+        for attr in attrs:
+            dirty = self._dirty[attr]
+            if chunks[-1] >= len(dirty):
+                dirty = self._dirty[attr] = np.concatenate(
+                    [dirty, np.zeros(int(chunks[-1]) + 1 - len(dirty), bool)])
+            dirty[chunks] = True
+        self.modified = True
+
+    def _mark_rows(self, parents) -> None:
+        """Rows of every child of parents, as removing or moving renumbers siblings"""
+        document = self.document
+        for parent in parents:
+            if document.is_materialized(parent) and (parent == ROOT or document.is_alive(parent)):
+                self._mark(["_row"], np.frombuffer(document.children(parent), np.int32))
+
+    def _on_document_event(self, event: str, *args) -> None:
+        if event == "end_insert":
+            self._mark(COLUMNS, args[0])
+            self._tree_dirty = True
+        elif event == "begin_remove":
+            self._pending_parents.append(args[0])
+        elif event == "end_remove":
+            self._mark(["_flags"], args[0])
+            self._mark_rows(self._pending_parents)
+            self._pending_parents.clear()
+            self._tree_dirty = True
+        elif event == "begin_move":
+            self._pending_parents += [args[0], args[3]]
+        elif event == "end_move":
+            self._mark(["_parent"], args[0])
+            self._mark_rows(self._pending_parents)
+            self._pending_parents.clear()
+            self._tree_dirty = True
+        elif event == "changed":
+            ids, what = args
+            if what == "coords":
+                self._mark(["_coords"], ids)
+            elif what == "flags":
+                self._mark(["_flags"], ids)
+            elif what == "name":
+                self._mark(["_name"], ids)
+            elif what == "expression":
+                self._expressions_dirty = True
+                self.modified = True
+        elif event == "reset":
+            self.modified = True
+            # Anything loaded by open() sets the layout again right after this
+            self._layout = {}
+
+    def _clean(self) -> None:
+        self.modified = False
+        self._names_saved = len(self.document.names)
+        self._tree_dirty = False
+        self._expressions_dirty = False
+        for attr in COLUMNS:
+            self._dirty[attr][:] = False
+
+    # Commands
+
+    def new(self) -> None:
+        self.document.clear()
+        self.path = None
+        self._layout = {}
+        self.modified = False
+
+    def open(self, path: str) -> None:
+        """Map a document file and load it into the store"""
+        try:
+            data = np.memmap(path, np.uint8, "c")
+        except ValueError:
+            raise DocumentFormatError(f"{path} is empty") from None
+        if len(data) < HEADER.size:
+            raise DocumentFormatError(f"{path} is not a document file")
+        magic, version, _, count, capacity, chunk_rows, toc_offset, toc_count = \
+            HEADER.unpack(data[:HEADER.size].tobytes())
+        if magic != MAGIC:
+            raise DocumentFormatError(f"{path} is not a document file")
+        if version > FORMAT_VERSION:
+            raise DocumentFormatError(f"{path} needs a newer version (format {version})")
+        if chunk_rows != CHUNK_ROWS or count > capacity:
+            raise DocumentFormatError(f"{path} has an unsupported layout")
+
+        if toc_offset + toc_count * TOC_ENTRY.size > len(data):
+            raise DocumentFormatError(f"{path} is truncated or damaged")
+        toc = {}
+        raw = data[toc_offset:toc_offset + toc_count * TOC_ENTRY.size].tobytes()
+        for i in range(toc_count):
+            name, offset, length = TOC_ENTRY.unpack_from(raw, i * TOC_ENTRY.size)
+            toc[name.rstrip(b"\0").decode()] = (offset, length)
+        missing = [name for name in [*COLUMNS, *BLOBS] if name not in toc]
+        if missing or any(offset + length > len(data) for offset, length in toc.values()) or \
+                any(toc[attr][1] != capacity * COLUMN_DTYPES[attr].itemsize for attr in COLUMNS):
+            raise DocumentFormatError(f"{path} is truncated or damaged")
+
+        def blob(name: str, dtype=np.uint8) -> np.ndarray:
+            offset, length = toc[name]
+            return data[offset:offset + length].view(dtype)
+
+        columns = {}
+        for attr in COLUMNS:
+            dtype = COLUMN_DTYPES[attr]
+            columns[attr] = blob(attr, dtype.base).reshape((capacity,) + dtype.shape)
+        try:
+            names = NameTable(blob("names.offsets", "<u8"), blob("names.data"))
+            expressions = {int(oid): tuple(value) for oid, value in
+                           json.loads(blob("expressions").tobytes() or b"{}").items()}
+            tree = ChildIndex(blob("tree.groups", "<i4"), blob("tree.offsets", "<i8"),
+                              blob("tree.children", "<i4"))
+        except (ValueError, TypeError, AttributeError) as e:
+            # Blob lengths that do not fit their type, or expressions that are not JSON
+            raise DocumentFormatError(f"{path} is truncated or damaged") from e
+
+        self.document.load(count, columns, names, expressions, tree)
+        self.path = path
+        self._layout = toc
+        self._capacity = capacity
+        self._size = len(data)
+        self._garbage = 0
+        self._clean()
+        logger.info("Opened %s: %d objects", path, count)
+
+    def save(self, path: str = None) -> None:
+        """Write the document, only rewriting changed chunks when saving in place"""
+        path = path or self.path
+        document = self.document
+        incremental = (
+            self._layout and path == self.path and os.path.exists(path)
+            and document.count <= self._capacity
+            and self._garbage < GARBAGE_FRACTION * self._size
+        )
+        if incremental:
+            self._save_chunks(path)
+        else:
+            self._save_full(path)
+        self.path = path
+        self._clean()
+
+    # Writing
+
+    def _save_full(self, path: str) -> None:
+        document = self.document
+        count = document.count
+        capacity = _capacity(count)
+        layout = {}
+        temp = path + ".partial"
+        with open(temp, "wb") as f:
+            f.write(bytes(PAGE))
+            for attr in COLUMNS:
+                offset = _align(f, PAGE)
+                column = getattr(document, attr)
+                for start in range(0, count, CHUNK_ROWS):
+                    chunk = column[start:min(count, start + CHUNK_ROWS)]
+                    f.write(memoryview(np.ascontiguousarray(chunk)))
+                length = capacity * COLUMN_DTYPES[attr].itemsize
+                # The spare rows are left as a hole, so they take no disk space
+                f.seek(offset + length)
+                f.truncate()
+                layout[attr] = (offset, length)
+            layout.update(self._write_blobs(f, names=True, expressions=True, tree=True))
+            self._write_toc(f, layout, count, capacity)
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        self._replace(temp, path)
+        self._layout = layout
+        self._capacity = capacity
+        self._size = size
+        self._garbage = 0
+        logger.info("Saved %s: %d objects, %.1f MiB", path, count, size / 2 ** 20)
+
+    def _save_chunks(self, path: str) -> None:
+        document = self.document
+        count = document.count
+        written = 0
+        with open(path, "r+b") as f:
+            for attr in COLUMNS:
+                offset, _ = self._layout[attr]
+                column = getattr(document, attr)
+                row_bytes = COLUMN_DTYPES[attr].itemsize
+                for chunk in np.flatnonzero(self._dirty[attr]).tolist():
+                    start = chunk * CHUNK_ROWS
+                    stop = min(count, start + CHUNK_ROWS)
+                    if start >= stop:
+                        continue
+                    f.seek(offset + start * row_bytes)
+                    f.write(memoryview(np.ascontiguousarray(column[start:stop])))
+                    written += (stop - start) * row_bytes
+
+            changed = self._write_blobs(
+                f, names=len(document.names) != self._names_saved,
+                expressions=self._expressions_dirty, tree=self._tree_dirty)
+            for name, (_, length) in changed.items():
+                self._garbage += self._layout.get(name, (0, 0))[1]
+                written += length
+            self._layout.update(changed)
+            self._write_toc(f, self._layout, count, self._capacity)
+            f.flush()
+            os.fsync(f.fileno())
+            self._size = f.tell()
+        logger.info("Saved %s: %.1f MiB of changes", path, written / 2 ** 20)
+
+    def _write_blobs(self, f, names: bool, expressions: bool, tree: bool) -> dict:
+        """Append the requested blobs at the end of f, returning their toc entries"""
+        document = self.document
+        entries = {}
+
+        def write(name: str, blocks) -> None:
+            offset = _align(f, BLOB_ALIGN)
+            for block in blocks:
+                f.write(memoryview(block))
+            entries[name] = (offset, f.tell() - offset)
+
+        if names:
+            offsets = [np.zeros(1, "<u8")]
+            base = 0
+
+            def data_blocks():
+                nonlocal base
+                for relative, data in document.names.encoded():
+                    offsets.append(np.asarray(relative[1:], "<u8") + base)
+                    base += len(data)
+                    yield data
+
+            write("names.data", data_blocks())
+            write("names.offsets", offsets)
+
+        if expressions:
+            text = json.dumps({str(oid): list(value) for oid, value in document.expressions.items()})
+            write("expressions", [text.encode()])
+
+        if tree:
+            groups = np.concatenate([[ROOT], np.flatnonzero(
+                (document.kinds == GROUP) & (document.flags & FLAG_ALIVE).astype(bool))]).astype("<i4")
+            counts = np.array([document.child_count(g) for g in groups.tolist()], "<i8")
+            offsets = np.concatenate([[0], np.cumsum(counts)]).astype("<i8")
+            write("tree.groups", [groups])
+            write("tree.offsets", [offsets])
+            # Groups never expanded come straight from the previous tree
+            write("tree.children", (np.ascontiguousarray(document.peek_children(g), "<i4")
+                                    for g in groups.tolist()))
+        return entries
+
+    def _write_toc(self, f, layout: dict, count: int, capacity: int) -> None:
+        toc_offset = _align(f, BLOB_ALIGN)
+        for name, (offset, length) in layout.items():
+            f.write(TOC_ENTRY.pack(name.encode(), offset, length))
+        end = f.tell()
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 0, count, capacity, CHUNK_ROWS,
+                            toc_offset, len(layout)))
+        f.seek(end)
+        f.truncate()
+
+    def _replace(self, temp: str, path: str) -> None:
+        try:
+            os.replace(temp, path)
+        except PermissionError:
+            # Windows refuses to replace a file that is still mapped
+            self._detach()
+            os.replace(temp, path)
+
+    def _detach(self) -> None:
+        """Copy everything still mapped from the open file into memory"""
+        document = self.document
+        for attr in COLUMNS:
+            setattr(document, attr, np.array(getattr(document, attr)))
+        document.names.detach()
+        if isinstance(document.tree, ChildIndex):
+            document.tree.detach()
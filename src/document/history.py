@@ -0,0 +1,414 @@
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable
+import time
+import numpy as np
+
+from src.document.store import DocumentStore
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Edits to the same objects closer together than this merge into one step
+COALESCE_SECONDS = 1.0
+
+
+class _Ids:
+    """A set of ids stored as a range when they are consecutive"""
+
+    def __init__(self, ids: np.ndarray):
+        ids = np.asarray(ids, np.int32)
+        if len(ids) > 1 and ids[-1] - ids[0] == len(ids) - 1 and (np.diff(ids) == 1).all():
+            self._range = (int(ids[0]), int(ids[-1]) + 1)
+            self._ids = None
+        else:
+            self._range = None
+            self._ids = ids.copy()
+
+    def array(self) -> np.ndarray:
+        if self._range is not None:
+            return np.arange(*self._range, dtype=np.int32)
+        return self._ids
+
+    def same(self, ids: np.ndarray) -> bool:
+        if self._range is not None:
+            start, stop = self._range
+            return len(ids) == stop - start and ids[0] == start and ids[-1] == stop - 1 \
+                and (np.diff(ids) == 1).all()
+        return np.array_equal(self._ids, ids)
+
+    @property
+    def nbytes(self) -> int:
+        return 8 if self._range is not None else self._ids.nbytes
+
+
+class CoordsDelta:
+    """Old and new coordinates; a uniform move only stores its offset"""
+
+    label = "Edit geometry"
+
+    def __init__(self, ids: np.ndarray, before: np.ndarray, after: np.ndarray):
+        self.ids = _Ids(ids)
+        self.before = before
+        self.set_after(after)
+
+    def set_after(self, after: np.ndarray) -> None:
+        shift = after[0] - self.before[0] if len(after) else np.zeros(4)
+        if np.array_equal(self.before + shift, after):
+            self.shift, self.after = shift, None
+        else:
+            self.shift, self.after = None, after.copy()
+
+    def undo(self, document: DocumentStore) -> None:
+        document.set_coords(self.ids.array(), self.before)
+
+    def redo(self, document: DocumentStore) -> None:
+        after = self.before + self.shift if self.after is None else self.after
+        document.set_coords(self.ids.array(), after)
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.before.nbytes + (32 if self.after is None else self.after.nbytes)
+
+
+class FlagsDelta:
+    label = "Change visibility"
+
+    def __init__(self, ids: np.ndarray, before: np.ndarray, after: np.ndarray):
+        self.ids = _Ids(ids)
+        self.before = before
+        self.after = after.copy()
+
+    def _apply(self, document: DocumentStore, flags: np.ndarray) -> None:
+        ids = self.ids.array()
+        # Flags are written bit by bit so only the bits that differ notify
+        current = document.flags[ids]
+        for bit in (1, 2, 4, 8, 16, 32, 64, 128):
+            differs = (current ^ flags) & bit != 0
+            for value in (True, False):
+                chosen = differs & (((flags & bit) != 0) == value)
+                if chosen.any():
+                    document.set_flag(ids[chosen], bit, value)
+
+    def undo(self, document: DocumentStore) -> None:
+        self._apply(document, self.before)
+
+    def redo(self, document: DocumentStore) -> None:
+        self._apply(document, self.after)
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes + self.before.nbytes + self.after.nbytes
+
+
+class NameDelta:
+    label = "Rename"
+
+    def __init__(self, oid: int, before: int, after: int):
+        self.oid, self.before, self.after = oid, before, after
+
+    def undo(self, document: DocumentStore) -> None:
+        document.rename(self.oid, document.names[self.before])
+
+    def redo(self, document: DocumentStore) -> None:
+        document.rename(self.oid, document.names[self.after])
+
+    nbytes = 24
+
+
+class ExpressionDelta:
+    label = "Edit expression"
+
+    def __init__(self, oid: int, before: tuple, after: tuple):
+        self.oid, self.before, self.after = oid, before, after
+
+    def undo(self, document: DocumentStore) -> None:
+        self._apply(document, self.before)
+
+    def redo(self, document: DocumentStore) -> None:
+        self._apply(document, self.after)
+
+    def _apply(self, document: DocumentStore, expression: tuple) -> None:
+        if expression is None:
+            document.clear_expression(self.oid)
+        else:
+            document.set_expression(self.oid, *expression)
+
+    @property
+    def nbytes(self) -> int:
+        return 64 + sum(len(str(v)) for v in (self.before or ()) + (self.after or ()))
+
+
+class InsertDelta:
+    label = "Add"
+
+    def __init__(self, tops: np.ndarray):
+        self.tops = _Ids(tops)
+
+    def undo(self, document: DocumentStore) -> None:
+        document.remove(self.tops.array())
+
+    def redo(self, document: DocumentStore) -> None:
+        document.revive(self.tops.array())
+
+    @property
+    def nbytes(self) -> int:
+        return self.tops.nbytes
+
+
+class RemoveDelta(InsertDelta):
+    label = "Delete"
+
+    def undo(self, document: DocumentStore) -> None:
+        InsertDelta.redo(self, document)
+
+    def redo(self, document: DocumentStore) -> None:
+        InsertDelta.undo(self, document)
+
+
+class MoveDelta:
+    label = "Move"
+
+    def __init__(self, oid: int, source: int, source_row: int, target: int, target_row: int):
+        self.oid = oid
+        self.source, self.source_row = source, source_row
+        self.target, self.target_row = target, target_row
+
+    @staticmethod
+    def _place(document: DocumentStore, oid: int, parent: int, row: int) -> None:
+        # move() takes the insertion row before the object is taken out
+        if document.parent_of(oid) == parent and document.row_of(oid) < row:
+            row += 1
+        document.move([oid], parent, row)
+
+    def undo(self, document: DocumentStore) -> None:
+        self._place(document, self.oid, self.source, self.source_row)
+
+    def redo(self, document: DocumentStore) -> None:
+        self._place(document, self.oid, self.target, self.target_row)
+
+    nbytes = 40
+
+
+class Entry:
+    def __init__(self, label: str = None):
+        self.label = label
+        self.deltas = []
+        self.nbytes = 0
+        self.time = time.monotonic()
+
+    @property
+    def title(self) -> str:
+        return self.label or (self.deltas[0].label if self.deltas else "")
+
+
+class History:
+    """Undo and redo stacks built from document notifications.
+
+    Every edit is kept as a small delta rather than a snapshot: coordinate
+    edits store the old rows and either the new rows or a single offset,
+    inserts and deletes only the ids involved (removed objects keep their
+    data in the store). Edits between two commit() calls form one step, and
+    repeated coordinate edits of the same objects, such as a drag, keep
+    merging into the last step for COALESCE_SECONDS. Once the stacks hold
+    more than max_bytes the oldest steps are dropped.
+    """
+
+    def __init__(self, document: DocumentStore, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.document = document
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.schedule: Callable[[], None] = None
+        self._undo: deque[Entry] = deque()
+        self._redo: list[Entry] = []
+        self._open: Entry = None
+        self._depth = 0
+        self._paused = 0
+        self._before = {}
+        self._pending = []
+        self._listeners: list[Callable] = []
+        document.subscribe(self._on_document_event)
+
+    def subscribe(self, listener: Callable) -> None:
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self) -> None:
+        for listener in self._listeners:
+            listener("changed")
+
+    # State
+
+    def can_undo(self) -> bool:
+        return bool(self._undo) or self._open is not None
+
+    def can_redo(self) -> bool:
+        return bool(self._redo)
+
+    def undo_title(self) -> str:
+        self.commit()
+        return self._undo[-1].title if self._undo else ""
+
+    def redo_title(self) -> str:
+        return self._redo[-1].title if self._redo else ""
+
+    def __len__(self) -> int:
+        return len(self._undo) + len(self._redo)
+
+    # Grouping
+
+    @contextmanager
+    def transaction(self, label: str = None):
+        """Record everything inside as a single step"""
+        self.commit()
+        self._depth += 1
+        self._open = Entry(label)
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            if not self._depth:
+                self.commit()
+
+    @contextmanager
+    def paused(self):
+        """Ignore edits made inside, such as derived values recomputed from others"""
+        self._paused += 1
+        try:
+            yield
+        finally:
+            self._paused -= 1
+
+    def commit(self) -> None:
+        """Close the open step"""
+        if self._depth or self._open is None:
+            return
+        entry, self._open = self._open, None
+        if entry.deltas:
+            self._undo.append(entry)
+            self._evict()
+            self._notify()
+
+    def clear(self) -> None:
+        self._undo.clear()
+        self._redo.clear()
+        self._open = None
+        self.nbytes = 0
+        self._notify()
+
+    # Undo and redo
+
+    def undo(self) -> None:
+        self.commit()
+        if not self._undo:
+            return
+        entry = self._undo.pop()
+        with self.paused():
+            for delta in reversed(entry.deltas):
+                delta.undo(self.document)
+        self._redo.append(entry)
+        self._notify()
+
+    def redo(self) -> None:
+        self.commit()
+        if not self._redo:
+            return
+        entry = self._redo.pop()
+        with self.paused():
+            for delta in entry.deltas:
+                delta.redo(self.document)
+        self._undo.append(entry)
+        # Nothing may merge into a step that came back from the redo stack
+        entry.time = float("-inf")
+        self._notify()
+
+    # Recording
+
+    def _record(self, delta) -> None:
+        if self._open is None:
+            self._open = Entry()
+            if self.schedule is not None:
+                self.schedule()
+        if self._redo:
+            self.nbytes -= sum(entry.nbytes for entry in self._redo)
+            self._redo.clear()
+        self._open.deltas.append(delta)
+        self._open.nbytes += delta.nbytes
+        self._open.time = time.monotonic()
+        self.nbytes += delta.nbytes
+        if self.schedule is None and not self._depth:
+            self.commit()
+
+    def _coalesce(self, ids: np.ndarray, after: np.ndarray) -> bool:
+        """Fold a coordinate edit into the last step if it edits the same objects"""
+        entry = self._open
+        if entry is None and self._undo and not self._redo:
+            entry = self._undo[-1]
+        if entry is None or not entry.deltas or time.monotonic() - entry.time > COALESCE_SECONDS:
+            return False
+        delta = entry.deltas[-1]
+        if not isinstance(delta, CoordsDelta) or not delta.ids.same(ids):
+            return False
+        self.nbytes -= delta.nbytes
+        entry.nbytes -= delta.nbytes
+        delta.set_after(after)
+        self.nbytes += delta.nbytes
+        entry.nbytes += delta.nbytes
+        entry.time = time.monotonic()
+        return True
+
+    def _on_document_event(self, event: str, *args) -> None:
+        if self._paused:
+            return
+        document = self.document
+        if event == "begin_change":
+            ids, what = args
+            if what == "coords":
+                self._before[what] = document.coords[ids].copy()
+            elif what == "flags":
+                self._before[what] = document.flags[ids].copy()
+            elif what == "name":
+                self._before[what] = int(document.name_ids[ids[0]])
+            elif what == "expression":
+                self._before[what] = document.expressions.get(int(ids[0]))
+        elif event == "changed":
+            ids, what = args
+            before = self._before.pop(what, None)
+            if before is None and what != "expression":
+                return
+            oid = int(ids[0]) if len(ids) else None
+            if what == "coords":
+                after = document.coords[ids]
+                if not self._coalesce(ids, after):
+                    self._record(CoordsDelta(ids, before, after))
+            elif what == "flags":
+                self._record(FlagsDelta(ids, before, document.flags[ids]))
+            elif what == "name":
+                self._record(NameDelta(oid, before, int(document.name_ids[oid])))
+            elif what == "expression":
+                self._record(ExpressionDelta(oid, before, document.expressions.get(oid)))
+        elif event == "end_insert":
+            ids = args[0]
+            self._record(InsertDelta(ids[~np.isin(document.parents[ids], ids)]))
+        elif event == "begin_remove":
+            parent, first, last = args
+            self._pending.append(document.peek_children(parent)[first:last + 1].copy())
+        elif event == "end_remove":
+            self._record(RemoveDelta(self._pending.pop()))
+        elif event == "begin_move":
+            source, first, _, _, _ = args
+            self._pending.append((int(document.child(source, first)), source, first))
+        elif event == "end_move":
+            oid, source, source_row = self._pending.pop()
+            self._record(MoveDelta(oid, source, source_row,
+                                   document.parent_of(oid), document.row_of(oid)))
+        elif event == "reset":
+            self.clear()
+
+    def _evict(self) -> None:
+        # The newest step is always kept, however large
+        while self.nbytes > self.max_bytes and len(self._undo) > 1:
+            self.nbytes -= self._undo.popleft().nbytes
+        while self.nbytes > self.max_bytes and self._redo:
+            self.nbytes -= self._redo.pop(0).nbytes
@@ -0,0 +1,306 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+import os
+import time
+import numpy as np
+
+from src.document.store import DocumentStore
+import src.utils.logger as logger
+
+# Levels with fewer dirty nodes than this run inline, the pool costs more than it saves
+PARALLEL_MIN = 4
+
+
+class Modifier:
+    """Computes the coordinate row of target from the rows of its sources.
+
+    function receives a (len(sources), 4) array and returns the four new
+    coordinates of target. It may run on a worker thread, so it must not
+    touch the document itself.
+    """
+
+    def __init__(self, name: str, sources: list[int], target: int,
+                 function: Callable[[np.ndarray], np.ndarray]):
+        self.name = name
+        self.sources = [int(oid) for oid in sources]
+        self.target = int(target)
+        self.function = function
+
+
+def translate(dx: float, dy: float) -> Callable:
+    """Copy of the first source moved by (dx, dy)"""
+    shift = np.array([dx, dy, dx, dy])
+
+    def function(coords: np.ndarray) -> np.ndarray:
+        return coords[0] + shift
+
+    return function
+
+
+def midpoint(coords: np.ndarray) -> np.ndarray:
+    """Point halfway between the first coordinates of two sources"""
+    x, y = coords[:, :2].mean(axis=0)
+    return np.array([x, y, 0.0, 0.0])
+
+
+class NodeStats:
+    __slots__ = ("calls", "hits", "errors", "last", "total")
+
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.errors = 0
+        self.last = 0.0
+        self.total = 0.0
+
+
+class ModifierGraph:
+    """Dependency DAG of modifiers over document objects.
+
+    Node A feeds node B when B reads the object A writes. An edit marks the
+    nodes reading the edited objects dirty, together with everything
+    downstream of them, and evaluate() recomputes only those. Dirty nodes are
+    grouped into levels by their longest dirty path; the nodes of one level
+    are independent and run on a thread pool, then the level's results are
+    written back in one set_coords call. Each node also remembers its last
+    inputs, so a node whose inputs did not actually change is a cache hit.
+    """
+
+    def __init__(self, document: DocumentStore, workers: int = None):
+        self.document = document
+        self.nodes: dict[int, Modifier] = {}
+        self.schedule: Callable[[], None] = None
+        self.workers = workers or os.cpu_count() or 1
+        self._next_id = 0
+        self._readers: dict[int, set[int]] = {}
+        self._writers: dict[int, int] = {}
+        self._dirty: set[int] = set()
+        self._order: list[int] = None
+        self._inputs: dict[int, bytes] = {}
+        self._outputs: dict[int, np.ndarray] = {}
+        self._stats: dict[int, NodeStats] = {}
+        self._listeners: list[Callable] = []
+        self._pool: ThreadPoolExecutor = None
+        self._applying = False
+        document.subscribe(self._on_document_event)
+
+    def subscribe(self, listener: Callable) -> None:
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    # Structure
+
+    def add(self, modifier: Modifier) -> int:
+        """Add a node and mark it dirty; raises ValueError on a second writer or a cycle"""
+        target = modifier.target
+        if target in self._writers:
+            raise ValueError(f"Object {target} is already written by "
+                             f"{self.nodes[self._writers[target]].name!r}")
+        below = self._downstream_objects([target])
+        if any(oid == target or oid in below for oid in modifier.sources):
+            raise ValueError(f"Modifier {modifier.name!r} would create a cycle")
+
+        node = self._next_id
+        self._next_id += 1
+        self.nodes[node] = modifier
+        self._stats[node] = NodeStats()
+        self._writers[target] = node
+        for oid in modifier.sources:
+            self._readers.setdefault(oid, set()).add(node)
+        self._order = None
+        self._mark({node})
+        return node
+
+    def remove(self, node: int) -> None:
+        modifier = self.nodes.pop(node)
+        del self._writers[modifier.target]
+        for oid in modifier.sources:
+            self._readers[oid].discard(node)
+        for table in (self._stats, self._inputs, self._outputs):
+            table.pop(node, None)
+        self._dirty.discard(node)
+        self._order = None
+
+    def clear(self) -> None:
+        for node in list(self.nodes):
+            self.remove(node)
+
+    def upstream(self, node: int) -> list[int]:
+        """Nodes writing the objects node reads"""
+        writers = (self._writers.get(oid) for oid in self.nodes[node].sources)
+        return [w for w in writers if w is not None]
+
+    def downstream(self, node: int) -> set[int]:
+        """Nodes reading the object node writes"""
+        return self._readers.get(self.nodes[node].target, set())
+
+    def _downstream_objects(self, ids) -> set[int]:
+        """Every object recomputed, directly or not, when ids change"""
+        found = set()
+        stack = list(ids)
+        while stack:
+            for node in self._readers.get(stack.pop(), ()):
+                target = self.nodes[node].target
+                if target not in found:
+                    found.add(target)
+                    stack.append(target)
+        return found
+
+    def _topological_order(self) -> list[int]:
+        if self._order is None:
+            pending = {node: len(self.upstream(node)) for node in self.nodes}
+            ready = [node for node, count in pending.items() if count == 0]
+            order = []
+            while ready:
+                node = ready.pop()
+                order.append(node)
+                for child in self.downstream(node):
+                    pending[child] -= 1
+                    if pending[child] == 0:
+                        ready.append(child)
+            self._order = order
+        return self._order
+
+    # Invalidation
+
+    def invalidate(self, ids) -> None:
+        """Mark the nodes reading ids, and everything below them, dirty"""
+        nodes = set()
+        for oid in np.asarray(ids).tolist():
+            nodes.update(self._readers.get(oid, ()))
+        if nodes:
+            self._mark(nodes)
+
+    def _mark(self, nodes: set[int]) -> None:
+        was_clean = not self._dirty
+        stack = [node for node in nodes if node not in self._dirty]
+        while stack:
+            node = stack.pop()
+            if node in self._dirty:
+                continue
+            self._dirty.add(node)
+            stack.extend(self.downstream(node))
+        if was_clean and self._dirty:
+            if self.schedule is not None:
+                self.schedule()
+            else:
+                self.evaluate()
+
+    def _on_document_event(self, event: str, *args) -> None:
+        if self._applying:
+            return
+        if event == "changed" and args[1] in ("coords", "expression"):
+            self.invalidate(args[0])
+        elif event == "end_remove":
+            self.invalidate(args[0])
+        elif event == "reset":
+            self.clear()
+
+    @property
+    def dirty(self) -> set[int]:
+        return set(self._dirty)
+
+    # Evaluation
+
+    def levels(self) -> list[list[int]]:
+        """Dirty nodes grouped so every node comes after the dirty nodes it reads"""
+        depth = {}
+        for node in self._topological_order():
+            if node in self._dirty:
+                depth[node] = max((depth[u] + 1 for u in self.upstream(node) if u in depth),
+                                  default=0)
+        levels = [[] for _ in range(max(depth.values(), default=-1) + 1)]
+        for node, level in depth.items():
+            levels[level].append(node)
+        return levels
+
+    def evaluate(self) -> int:
+        """Recompute every dirty node; returns how many ran"""
+        with logger.span("modifiers.evaluate"):
+            return self._evaluate()
+
+    def _evaluate(self) -> int:
+        levels = self.levels()
+        self._dirty.clear()
+        evaluated = []
+        for level in levels:
+            if len(level) >= PARALLEL_MIN and self.workers > 1:
+                results = list(self._executor().map(self._run, level))
+            else:
+                results = [self._run(node) for node in level]
+
+            written = [(self.nodes[node].target, row)
+                       for node, row in zip(level, results) if row is not None]
+            if written:
+                targets, rows = zip(*written)
+                self._applying = True
+                try:
+                    self.document.set_coords(list(targets), np.array(rows))
+                finally:
+                    self._applying = False
+            evaluated.extend(level)
+
+        if evaluated:
+            for listener in self._listeners:
+                listener("evaluated", evaluated)
+        return len(evaluated)
+
+    def _run(self, node: int) -> np.ndarray:
+        """New target row for node, or None when it cannot be computed"""
+        modifier = self.nodes[node]
+        stats = self._stats[node]
+        document = self.document
+        if not all(document.is_alive(oid) for oid in modifier.sources + [modifier.target]):
+            return None
+
+        start = time.perf_counter()
+        inputs = document.coords[modifier.sources]
+        key = inputs.tobytes()
+        if self._inputs.get(node) == key:
+            stats.hits += 1
+            row = self._outputs[node]
+        else:
+            try:
+                row = np.asarray(modifier.function(inputs), np.float64).reshape(4)
+            except Exception as e:
+                stats.errors += 1
+                logger.error("Modifier %r failed: %s", modifier.name, e)
+                return None
+            self._inputs[node] = key
+            self._outputs[node] = row
+        stats.calls += 1
+        stats.last = time.perf_counter() - start
+        stats.total += stats.last
+        return row
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="modifier")
+        return self._pool
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    # Reporting
+
+    def stats(self) -> list[dict]:
+        """Per node timings and cache hits, slowest first"""
+        rows = []
+        for node, s in self._stats.items():
+            rows.append({
+                "node": node,
+                "name": self.nodes[node].name,
+                "calls": s.calls,
+                "hits": s.hits,
+                "errors": s.errors,
+                "last_ms": s.last * 1000,
+                "total_ms": s.total * 1000,
+                "hit_rate": s.hits / s.calls if s.calls else 0.0,
+            })
+        rows.sort(key=lambda row: row["total_ms"], reverse=True)
+        return rows
@@ -0,0 +1,248 @@
+from collections import OrderedDict
+from functools import lru_cache
+from threading import Lock
+from typing import Callable
+import ast
+import math
+import numpy as np
+
+from src.document.store import DocumentStore
+
+INITIAL_SAMPLES = 32
+MAX_REFINEMENTS = 12
+MAX_POINTS = 1 << 16
+BOUNDS_TOLERANCE = 1e-3
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+FUNCTIONS = {
+    name: getattr(np, name) for name in (
+        "sin", "cos", "tan", "arcsin", "arccos", "arctan", "arctan2",
+        "sinh", "cosh", "tanh", "exp", "log", "log10", "sqrt", "abs",
+        "floor", "ceil", "sign", "minimum", "maximum", "hypot",
+    )
+}
+FUNCTIONS.update(asin=np.arcsin, acos=np.arccos, atan=np.arctan, atan2=np.arctan2,
+                 min=np.minimum, max=np.maximum)
+CONSTANTS = {"pi": math.pi, "tau": math.tau, "e": math.e}
+
+ALLOWED_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Call, ast.Name, ast.Load, ast.Constant,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow, ast.Mod, ast.FloorDiv, ast.USub, ast.UAdd,
+)
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(source: str, params: tuple[str, ...] = ()) -> Callable:
+    """Compile an expression in t and named parameters to a vectorized function.
+
+    Only arithmetic, numeric constants, the functions in FUNCTIONS and the
+    names t, CONSTANTS and params are accepted, so user documents cannot run
+    arbitrary code. Numbers are floats, so a power overflows instead of
+    growing without bound, and every failure while evaluating is raised as
+    an ExpressionError.
+    """
+    names = {"t", *FUNCTIONS, *CONSTANTS, *params}
+    try:
+        tree = ast.parse(source, mode="eval")
+    except SyntaxError as e:
+        raise ExpressionError(f"Invalid expression {source!r}: {e.msg}") from None
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES):
+            raise ExpressionError(f"Unsupported syntax in {source!r}: {type(node).__name__}")
+        if isinstance(node, ast.Call) and not (
+                isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS):
+            raise ExpressionError(f"Unknown function in {source!r}")
+        if isinstance(node, ast.Name) and node.id not in names:
+            raise ExpressionError(f"Unknown name {node.id!r} in {source!r}")
+        if isinstance(node, ast.Constant):
+            if not isinstance(node.value, (int, float)) or isinstance(node.value, bool):
+                raise ExpressionError(f"Unsupported constant in {source!r}")
+            try:
+                node.value = float(node.value)
+            except OverflowError:
+                raise ExpressionError(f"Number too large in {source!r}") from None
+
+    code = compile(tree, "<expression>", "eval")
+    namespace = {"__builtins__": {}, **FUNCTIONS, **CONSTANTS}
+
+    def evaluate(t: np.ndarray, params: dict = None) -> np.ndarray:
+        try:
+            with np.errstate(all="ignore"):
+                value = eval(code, namespace, {"t": t, **(params or {})})
+        except (NameError, ArithmeticError, TypeError, ValueError) as e:
+            raise ExpressionError(f"Cannot evaluate {source!r}: {e}") from None
+        return np.broadcast_to(np.asarray(value, np.float64), t.shape)
+
+    return evaluate
+
+
+def quantize_tolerance(tolerance: float) -> float:
+    """Snap a tolerance down to a power of two so nearby zoom levels share tessellations"""
+    return 2.0 ** math.floor(math.log2(max(tolerance, 1e-12)))
+
+
+def sample(x: str, y: str, t0: float, t1: float, tolerance: float,
+           params: dict = None) -> np.ndarray:
+    """Adaptively sample a curve into an (n, 2) polyline.
+
+    Every pass evaluates the midpoint of each remaining interval at once and
+    splits the intervals whose midpoint strays further than tolerance from
+    the chord, so flat stretches stay coarse and tight bends get refined.
+    Undefined points come back as NaN rows, which break the polyline.
+    """
+    names = tuple(sorted(params or {}))
+    fx, fy = compile_expression(x, names), compile_expression(y, names)
+    t = np.linspace(t0, t1, INITIAL_SAMPLES + 1)
+    points = np.column_stack([fx(t, params), fy(t, params)])
+    open_ = np.ones(len(t) - 1, bool)
+
+    for _ in range(MAX_REFINEMENTS):
+        intervals = np.flatnonzero(open_)
+        if not len(intervals) or len(t) + len(intervals) > MAX_POINTS:
+            break
+        tm = (t[intervals] + t[intervals + 1]) * 0.5
+        mid = np.column_stack([fx(tm, params), fy(tm, params)])
+        a, b = points[intervals], points[intervals + 1]
+
+        # Distance from the true midpoint to the chord; the curvature term of
+        # the chord error, falling back to the midpoint gap for tiny chords
+        chord = b - a
+        length = np.hypot(chord[:, 0], chord[:, 1])
+        offset = mid - a
+        cross = np.abs(chord[:, 0] * offset[:, 1] - chord[:, 1] * offset[:, 0])
+        with np.errstate(all="ignore"):
+            deviation = np.where(length > 1e-12, cross / length,
+                                 np.hypot(*(mid - (a + b) * 0.5).T))
+        split = ~(deviation <= tolerance)
+
+        keep = intervals[split]
+        if not len(keep):
+            break
+        t = np.insert(t, keep + 1, tm[split])
+        points = np.insert(points, keep + 1, mid[split], axis=0)
+        # Both halves of a split interval stay open, the rest are done
+        open_ = np.zeros(len(t) - 1, bool)
+        halves = keep + np.arange(len(keep))
+        open_[halves] = True
+        open_[halves + 1] = True
+
+    return points
+
+
+class TessellationCache:
+    """Memory-bounded LRU of curve tessellations.
+
+    Keys are (x, y, t0, t1, params, quantized tolerance). Shared by every
+    painter, including tile workers, so lookups are guarded by a lock.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[tuple, np.ndarray] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, x: str, y: str, t0: float, t1: float, tolerance: float,
+            params: dict = None) -> np.ndarray:
+        tolerance = quantize_tolerance(tolerance)
+        key = (x, y, t0, t1, tuple(sorted((params or {}).items())), tolerance)
+        with self._lock:
+            points = self._entries.get(key)
+            if points is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return points
+            self.misses += 1
+
+        points = sample(x, y, t0, t1, tolerance, params)
+        points.setflags(write=False)
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = points
+                self.nbytes += points.nbytes
+            while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                _, old = self._entries.popitem(last=False)
+                self.nbytes -= old.nbytes
+                self.evictions += 1
+        return points
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.nbytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+tessellation_cache = TessellationCache()
+
+
+def tessellate(document: DocumentStore, oid: int, tolerance: float) -> np.ndarray:
+    """Polyline for a parametric object at tolerance scene units"""
+    expression = document.expressions.get(oid)
+    if expression is None:
+        return np.zeros((0, 2))
+    x, y, t0, t1 = expression
+    try:
+        return tessellation_cache.get(x, y, t0, t1, tolerance)
+    except ExpressionError:
+        return np.zeros((0, 2))
+
+
+class ParametricEngine:
+    """Keeps the bounding box column of parametric objects in step with their expressions"""
+
+    def __init__(self, document: DocumentStore):
+        self.document = document
+        document.subscribe(self._on_document_event)
+
+    def _on_document_event(self, event: str, *args) -> None:
+        if event == "changed" and args[1] == "expression":
+            self.update_bounds(args[0])
+
+    def update_bounds(self, ids=None) -> None:
+        document = self.document
+        if ids is None:
+            ids = document.ids_of_kind("parametric")
+        ids = np.asarray(ids).tolist()
+        if not ids:
+            return
+        boxes = []
+        for oid in ids:
+            if oid not in document.expressions:
+                # No curve, so no geometry, as for a cleared expression
+                boxes.append(np.full(4, np.nan))
+                continue
+            x, y, t0, t1 = document.expressions[oid]
+            try:
+                points = sample(x, y, t0, t1, BOUNDS_TOLERANCE * self._scale(x, y, t0, t1))
+            except ExpressionError:
+                points = np.zeros((0, 2))
+            finite = points[np.isfinite(points).all(axis=1)]
+            boxes.append(np.concatenate([finite.min(axis=0), finite.max(axis=0)])
+                         if len(finite) else np.full(4, np.nan))
+        document.set_coords(ids, np.array(boxes))
+
+    def _scale(self, x: str, y: str, t0: float, t1: float) -> float:
+        """Rough size of a curve, so the bounds tolerance is relative to it"""
+        t = np.linspace(t0, t1, INITIAL_SAMPLES + 1)
+        points = np.column_stack([compile_expression(x)(t), compile_expression(y)(t)])
+        finite = points[np.isfinite(points).all(axis=1)]
+        return float(np.ptp(finite, axis=0).max()) if len(finite) else 1.0
+
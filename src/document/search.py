@@ -0,0 +1,124 @@
+import re
+import numpy as np
+
+from src.document.store import DocumentStore, KINDS, ROOT
+
+# Names interned since the last build are scanned one by one until there are
+# this many of their words (or this fraction of the index)
+REBUILD_MIN = 4096
+REBUILD_FRACTION = 0.05
+# Sorts after every character, so prefix + LAST_CHAR bounds the words with that prefix
+LAST_CHAR = chr(0x10FFFF)
+
+_WORD = re.compile(r"\w+")
+
+
+def words(text: str) -> list[str]:
+    """Lower case words of a name or query"""
+    return _WORD.findall(text.lower())
+
+
+def with_ancestors(document: DocumentStore, ids: np.ndarray) -> np.ndarray:
+    """Sorted ids plus every group above them"""
+    keep = np.zeros(document.count, bool)
+    keep[ids] = True
+    frontier = np.asarray(ids)
+    while len(frontier):
+        # One level up at a time; a mask dedupes the parents without sorting them
+        parents = document.parents[frontier]
+        found = np.zeros(document.count, bool)
+        found[parents[parents != ROOT]] = True
+        frontier = np.flatnonzero(found & ~keep)
+        keep[frontier] = True
+    return np.flatnonzero(keep)
+
+
+class SearchIndex:
+    """Word prefix index over object names and types.
+
+    Every word of every interned name sits in one sorted array next to the
+    name it came from, so the names with a word starting with a prefix are
+    one contiguous slice found by two binary searches: a trie flattened into
+    arrays. Names are interned once and never change, so renames and new
+    objects only add names, which are scanned until there are enough of them
+    to merge. Each query word must start a word of the name or the type.
+
+    A query that only extends the previous one, as typing does, is matched
+    against the previous result instead of the whole document.
+    """
+
+    def __init__(self, document: DocumentStore):
+        self.document = document
+        self.rebuilds = 0
+        self._clear()
+        document.subscribe(self._on_document_event)
+
+    def _clear(self) -> None:
+        self._indexed = 0
+        self._words = np.zeros(0, "U1")
+        self._owners = np.zeros(0, np.int32)
+        self._pending_words: list[str] = []
+        self._pending_owners: list[int] = []
+        self._last: tuple[list[str], int, np.ndarray] = None
+
+    def _on_document_event(self, event: str, *args) -> None:
+        if event == "reset":
+            # Cleared or loaded, so the names were replaced
+            self._clear()
+
+    def update(self) -> None:
+        """Index the names interned since the last call"""
+        names = self.document.names
+        for name_id in range(self._indexed, len(names)):
+            found = words(names[name_id])
+            self._pending_words += found
+            self._pending_owners += [name_id] * len(found)
+        self._indexed = len(names)
+        if len(self._pending_words) > max(REBUILD_MIN, REBUILD_FRACTION * len(self._words)):
+            self._merge()
+
+    def build(self) -> None:
+        """Index and merge every name now, so the first query does not have to"""
+        self.update()
+        if self._pending_words:
+            self._merge()
+
+    def _merge(self) -> None:
+        all_words = np.concatenate([self._words, np.array(self._pending_words, str)])
+        owners = np.concatenate([self._owners, np.array(self._pending_owners, np.int32)])
+        order = np.argsort(all_words, kind="stable")
+        self._words, self._owners = all_words[order], owners[order]
+        self._pending_words, self._pending_owners = [], []
+        self.rebuilds += 1
+
+    def names_matching(self, prefix: str) -> np.ndarray:
+        """Mask over interned names with a word starting with prefix"""
+        hit = np.zeros(self._indexed, bool)
+        lo = np.searchsorted(self._words, prefix, "left")
+        hi = np.searchsorted(self._words, prefix + LAST_CHAR, "left")
+        hit[self._owners[lo:hi]] = True
+        for word, owner in zip(self._pending_words, self._pending_owners):
+            if word.startswith(prefix):
+                hit[owner] = True
+        return hit
+
+    def match(self, query: str) -> np.ndarray:
+        """Sorted ids of alive objects matching every word of the query"""
+        document = self.document
+        self.update()
+        prefixes = words(query)
+        last = self._last
+        if (last is not None and last[1] == document.version and len(prefixes) >= len(last[0])
+                and all(new.startswith(old) for old, new in zip(last[0], prefixes))):
+            candidates = last[2]
+        else:
+            candidates = document.alive()
+        name_ids = document.name_ids[candidates]
+        kinds = document.kinds[candidates]
+        keep = np.ones(len(candidates), bool)
+        for prefix in prefixes:
+            kind_hit = np.array([kind.startswith(prefix) for kind in KINDS])
+            keep &= self.names_matching(prefix)[name_ids] | kind_hit[kinds]
+        ids = candidates[keep]
+        self._last = (prefixes, document.version, ids)
+        return ids
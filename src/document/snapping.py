@@ -0,0 +1,456 @@
+from collections import OrderedDict
+from typing import Callable
+import math
+import time
+import numpy as np
+
+from src.document.store import DocumentStore, KIND_IDS, FLAG_ALIVE
+from src.document.spatial import SpatialIndex
+import src.utils.logger as logger
+
+# Kinds of snap target, in order of preference when equally close
+SNAP_POINT, SNAP_ENDPOINT, SNAP_CENTER, SNAP_INTERSECTION, SNAP_MIDPOINT = range(5)
+SNAP_KINDS = ["point", "endpoint", "center", "intersection", "midpoint"]
+
+LEAF_SIZE = 128
+# Queries start at the level with this many nodes, 2 ** TOP_LEVEL
+TOP_LEVEL = 9
+# Intersections are found per square region holding about this many objects
+REGION_OBJECTS = 64
+MAX_REGIONS = 4096
+# Regions one query finds the intersections of itself; the rest are left to
+# fill() when a schedule is set
+QUERY_REGIONS = 1
+# Radii spanning more regions than this side to side snap without intersections
+MAX_QUERY_SPAN = 4
+FILL_BUDGET = 0.008
+PAIR_CHUNK = 1 << 18
+INVALIDATE_EACH_MAX = 64
+# Objects edited since the last build are snapped to brute force until there
+# are this many of them (or this fraction of the document), as in SpatialIndex
+REBUILD_MIN = 4096
+REBUILD_FRACTION = 0.05
+
+_POINT, _LINE, _CIRCLE = KIND_IDS["point"], KIND_IDS["line"], KIND_IDS["circle"]
+
+
+class KDTree:
+    """Static 2D KD-tree over points, with the leaves as buckets.
+
+    The tree is implicit: points are reordered so that every node is a
+    contiguous slice, node j of depth d covering positions (j n) >> d up to
+    ((j + 1) n) >> d. Only the bounding box of every node is stored, one
+    array per depth, and a query descends all levels at once, keeping the
+    nodes whose boxes come within the radius.
+    """
+
+    def __init__(self, points: np.ndarray):
+        points = np.asarray(points, np.float64).reshape(-1, 2)
+        n = len(points)
+        self.depth = max(0, math.ceil(math.log2(n / LEAF_SIZE))) if n > LEAF_SIZE else 0
+        order = np.arange(n)
+        # Kept in tree order as the nodes are split, so every node is a view
+        xs, ys = points[:, 0].copy(), points[:, 1].copy()
+        for d in range(self.depth):
+            edges = ((np.arange(2 ** d + 1, dtype=np.int64) * n) >> d).tolist()
+            for j in range(2 ** d):
+                start, end = edges[j], edges[j + 1]
+                split = ((2 * j + 1) * n >> (d + 1)) - start
+                if split <= 0 or split >= end - start:
+                    continue
+                x, y = xs[start:end], ys[start:end]
+                # Split across the wider side
+                wide = x if x.max() - x.min() >= y.max() - y.min() else y
+                part = np.argpartition(wide, split)
+                xs[start:end], ys[start:end] = x[part], y[part]
+                order[start:end] = order[start:end][part]
+        self.order = order
+        self.points = np.column_stack([xs, ys])
+        self.edges = (np.arange(2 ** self.depth + 1, dtype=np.int64) * n) >> self.depth
+
+        if n:
+            starts = self.edges[:-1]
+            leaves = np.column_stack([np.minimum.reduceat(self.points, starts),
+                                      np.maximum.reduceat(self.points, starts)])
+        else:
+            leaves = np.zeros((0, 4))
+        self.boxes = [leaves]
+        for _ in range(self.depth):
+            child = self.boxes[0]
+            self.boxes.insert(0, np.column_stack([
+                np.minimum(child[0::2, :2], child[1::2, :2]),
+                np.maximum(child[0::2, 2:], child[1::2, 2:])]))
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def query(self, x: float, y: float, radius: float) -> np.ndarray:
+        """Indices of the points within radius of (x, y)"""
+        if not len(self.points):
+            return np.zeros(0, np.int64)
+        # The top levels are few enough nodes to test all at once
+        top = min(self.depth, TOP_LEVEL)
+        nodes = np.arange(2 ** top)
+        r2 = radius * radius
+        for d in range(top, self.depth + 1):
+            if d > top:
+                nodes = (2 * nodes[:, None] + [0, 1]).ravel()
+            b = self.boxes[d][nodes]
+            dx = np.maximum(np.maximum(b[:, 0] - x, x - b[:, 2]), 0)
+            dy = np.maximum(np.maximum(b[:, 1] - y, y - b[:, 3]), 0)
+            nodes = nodes[dx * dx + dy * dy <= r2]
+            if not len(nodes):
+                return np.zeros(0, np.int64)
+        start, end = self.edges[nodes], self.edges[nodes + 1]
+        lengths = end - start
+        positions = np.repeat(start - np.cumsum(lengths) + lengths, lengths) + \
+            np.arange(int(lengths.sum()))
+        p = self.points[positions]
+        near = (p[:, 0] - x) ** 2 + (p[:, 1] - y) ** 2 <= r2
+        return self.order[positions[near]]
+
+
+def snap_candidates(document: DocumentStore, ids: np.ndarray):
+    """Points, endpoints, centres and midpoints of objects ids.
+
+    Returns their (k, 2) positions, snap kinds and owning object ids.
+    """
+    ids = np.asarray(ids, np.int64)
+    kinds = document.kinds[ids]
+    c = document.coords[ids]
+    points, lines, circles = ids[kinds == _POINT], ids[kinds == _LINE], ids[kinds == _CIRCLE]
+    pc, lc, cc = c[kinds == _POINT], c[kinds == _LINE], c[kinds == _CIRCLE]
+    xy = np.concatenate([pc[:, :2], lc[:, :2], lc[:, 2:], (lc[:, :2] + lc[:, 2:]) / 2, cc[:, :2]])
+    snap = np.repeat([SNAP_POINT, SNAP_ENDPOINT, SNAP_ENDPOINT, SNAP_MIDPOINT, SNAP_CENTER],
+                     [len(points), len(lines), len(lines), len(lines), len(circles)])
+    owners = np.concatenate([points, lines, lines, lines, circles])
+    return xy, snap.astype(np.int8), owners
+
+
+def _cross(ax, ay, bx, by):
+    return ax * by - ay * bx
+
+
+def overlapping_pairs(boxes: np.ndarray):
+    """Index pairs of x0, y0, x1, y1 boxes that overlap, in chunks.
+
+    A sweep along x: with the boxes sorted by their left edge, the boxes a
+    box can overlap are the run after it that starts before its right edge,
+    found by one binary search each. Only those pairs are generated, and
+    PAIR_CHUNK at a time, before the y test.
+    """
+    n = len(boxes)
+    order = np.argsort(boxes[:, 0], kind="stable")
+    b = boxes[order]
+    end = np.searchsorted(b[:, 0], b[:, 2], "right")
+    counts = np.maximum(end - np.arange(n) - 1, 0)
+    total = np.cumsum(counts)
+    start = 0
+    while start < n:
+        base = int(total[start - 1]) if start else 0
+        stop = max(int(np.searchsorted(total, base + PAIR_CHUNK, "right")), start + 1)
+        c = counts[start:stop]
+        i = np.repeat(np.arange(start, stop), c)
+        j = i + 1 + np.arange(len(i)) - np.repeat(np.cumsum(c) - c, c)
+        ok = (b[i, 1] <= b[j, 3]) & (b[j, 1] <= b[i, 3])
+        yield order[i[ok]], order[j[ok]]
+        start = stop
+
+
+def _line_line(coords: np.ndarray, a: np.ndarray, b: np.ndarray):
+    p, q = coords[a], coords[b]
+    ux, uy = p[:, 2] - p[:, 0], p[:, 3] - p[:, 1]
+    vx, vy = q[:, 2] - q[:, 0], q[:, 3] - q[:, 1]
+    wx, wy = q[:, 0] - p[:, 0], q[:, 1] - p[:, 1]
+    denom = _cross(ux, uy, vx, vy)
+    ok = np.abs(denom) > 1e-12
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = _cross(wx, wy, vx, vy) / denom
+        s = _cross(wx, wy, ux, uy) / denom
+    ok &= (t >= 0) & (t <= 1) & (s >= 0) & (s <= 1)
+    xy = np.column_stack([p[ok, 0] + t[ok] * ux[ok], p[ok, 1] + t[ok] * uy[ok]])
+    return [(xy, a[ok], b[ok])]
+
+
+def _line_circle(coords: np.ndarray, a: np.ndarray, b: np.ndarray):
+    p, q = coords[a], coords[b]
+    ux, uy = p[:, 2] - p[:, 0], p[:, 3] - p[:, 1]
+    wx, wy = p[:, 0] - q[:, 0], p[:, 1] - q[:, 1]
+    # |p + t u - centre|^2 = r^2
+    qa = np.maximum(ux * ux + uy * uy, 1e-24)
+    qb = 2 * (ux * wx + uy * wy)
+    qc = wx * wx + wy * wy - q[:, 2] ** 2
+    disc = qb * qb - 4 * qa * qc
+    root = np.sqrt(np.maximum(disc, 0))
+    found = []
+    for sign in (-1, 1):
+        t = (-qb + sign * root) / (2 * qa)
+        ok = (disc >= 0) & (t >= 0) & (t <= 1)
+        if sign > 0:
+            ok &= disc > 0
+        xy = np.column_stack([p[ok, 0] + t[ok] * ux[ok], p[ok, 1] + t[ok] * uy[ok]])
+        found.append((xy, a[ok], b[ok]))
+    return found
+
+
+def _circle_circle(coords: np.ndarray, a: np.ndarray, b: np.ndarray):
+    p, q = coords[a], coords[b]
+    dx, dy = q[:, 0] - p[:, 0], q[:, 1] - p[:, 1]
+    d = np.hypot(dx, dy)
+    r0, r1 = np.abs(p[:, 2]), np.abs(q[:, 2])
+    ok = (d > 1e-12) & (d <= r0 + r1) & (d >= np.abs(r0 - r1))
+    d, dx, dy, r0, r1 = d[ok], dx[ok], dy[ok], r0[ok], r1[ok]
+    along = (r0 * r0 - r1 * r1 + d * d) / (2 * d)
+    h = np.sqrt(np.maximum(r0 * r0 - along * along, 0))
+    mx, my = p[ok, 0] + along * dx / d, p[ok, 1] + along * dy / d
+    return [(np.column_stack([mx + sign * h * dy / d, my - sign * h * dx / d]), a[ok], b[ok])
+            for sign in (-1, 1)]
+
+
+def intersections(document: DocumentStore, ids: np.ndarray, box=None):
+    """Crossings between the lines and circles of ids.
+
+    Only pairs whose boxes overlap are tested exactly; with box, only the
+    parts of their boxes inside it count, as for crossings in one region.
+    Returns their (k, 2) positions and the two objects of each.
+    """
+    ids = np.asarray(ids, np.int64)
+    kinds = document.kinds[ids]
+    ids = ids[(kinds == _LINE) | (kinds == _CIRCLE)]
+    boxes = document.bounds(ids)
+    if box is not None:
+        boxes[:, :2] = np.maximum(boxes[:, :2], box[:2])
+        boxes[:, 2:] = np.minimum(boxes[:, 2:], box[2:])
+    valid = (boxes[:, 0] <= boxes[:, 2]) & (boxes[:, 1] <= boxes[:, 3])
+    ids, boxes = ids[valid], boxes[valid]
+    line = document.kinds[ids] == _LINE
+    coords = document.coords
+    found = [(np.zeros((0, 2)), np.zeros(0, np.int64), np.zeros(0, np.int64))]
+    for i, j in overlapping_pairs(boxes):
+        a, b, la, lb = ids[i], ids[j], line[i], line[j]
+        both = la & lb
+        found += _line_line(coords, a[both], b[both])
+        # Line first in mixed pairs
+        mixed = la != lb
+        first, second = np.where(la, a, b)[mixed], np.where(la, b, a)[mixed]
+        found += _line_circle(coords, first, second)
+        neither = ~(la | lb)
+        found += _circle_circle(coords, a[neither], b[neither])
+
+    xy, first, second = zip(*found)
+    return np.concatenate(xy), np.concatenate(first), np.concatenate(second)
+
+
+class Snap:
+    def __init__(self, x: float, y: float, kind: int, owners: tuple[int, ...]):
+        self.x = x
+        self.y = y
+        self.kind = kind
+        self.owners = owners
+
+    @property
+    def name(self) -> str:
+        return SNAP_KINDS[self.kind]
+
+
+class SnapEngine:
+    """Finds the snap target nearest to the cursor.
+
+    Points, endpoints, centres and midpoints live in a KD-tree built from the
+    whole document. Objects edited since are marked stale in it and snapped
+    to brute force until a rebuild is worth it. Intersections are found
+    lazily, a square region at a time, the first time a query touches the
+    region, and dropped again when an edit touches it. With a schedule set, a
+    query only finds those of QUERY_REGIONS regions itself and queues the
+    rest for fill(), so a cursor entering new ground never waits on them.
+    """
+
+    def __init__(self, document: DocumentStore, index: SpatialIndex):
+        self.document = document
+        self.index = index
+        self.rebuilds = 0
+        self.schedule: Callable[[], None] = None
+        self._tree: KDTree = None
+        self._regions: OrderedDict[tuple[int, int], tuple] = OrderedDict()
+        self._pending: OrderedDict[tuple[int, int], None] = OrderedDict()
+        self._region_size = 1.0
+        self._old_bounds = None
+        document.subscribe(self._on_document_event)
+
+    def build(self) -> None:
+        """Bulk load the tree from every object in the document"""
+        with logger.span("snap.build"):
+            document = self.document
+            xy, kinds, owners = snap_candidates(document, document.alive())
+            self._tree = KDTree(xy)
+            self._xy, self._kinds, self._owners = xy, kinds, owners
+            self._stale = np.zeros(document.count, bool)
+            self._dynamic = np.zeros(0, np.int64)
+            self._dynamic_candidates = snap_candidates(document, self._dynamic)
+            self._regions.clear()
+            self._pending.clear()
+            extent = self.index.extent()
+            area = max((extent[2] - extent[0]) * (extent[3] - extent[1]), 1e-12)
+            self._region_size = max(math.sqrt(area * REGION_OBJECTS / max(len(document), 1)),
+                                    1e-6)
+            self.rebuilds += 1
+
+    def update(self, ids) -> None:
+        """Refresh the candidates of objects that were added, moved or removed"""
+        if self._tree is None:
+            return
+        ids = np.asarray(ids, np.int64)
+        count = self.document.count
+        if count > len(self._stale):
+            self._stale = np.concatenate([self._stale, np.zeros(count - len(self._stale), bool)])
+        self._stale[ids] = True
+        self._dynamic = np.union1d(self._dynamic, ids)
+        if len(self._dynamic) > max(REBUILD_MIN, REBUILD_FRACTION * count):
+            self._tree = None
+            return
+        alive = self._dynamic[(self.document.flags[self._dynamic] & FLAG_ALIVE).astype(bool)]
+        self._dynamic_candidates = snap_candidates(self.document, alive)
+
+    def invalidate(self, boxes: np.ndarray) -> None:
+        """Drop the intersections of regions touching any x0, y0, x1, y1 box"""
+        boxes = boxes[np.isfinite(boxes).all(axis=1)]
+        if not len(boxes) or not self._regions:
+            return
+        if len(boxes) > INVALIDATE_EACH_MAX:
+            boxes = np.array([[boxes[:, 0].min(), boxes[:, 1].min(),
+                               boxes[:, 2].max(), boxes[:, 3].max()]])
+        keys = np.array(list(self._regions), np.int64).reshape(-1, 2)
+        cell = self._region_size
+        hit = np.zeros(len(keys), bool)
+        for x0, y0, x1, y1 in boxes:
+            hit |= (keys[:, 0] >= math.floor(x0 / cell)) & (keys[:, 0] <= math.floor(x1 / cell)) & \
+                   (keys[:, 1] >= math.floor(y0 / cell)) & (keys[:, 1] <= math.floor(y1 / cell))
+        for key in map(tuple, keys[hit].tolist()):
+            del self._regions[key]
+
+    def _on_document_event(self, event: str, *args) -> None:
+        document = self.document
+        if event == "begin_change":
+            ids, what = args
+            if what == "coords":
+                self._old_bounds = document.bounds(ids)
+        elif event == "changed":
+            ids, what = args
+            if what != "coords":
+                return
+            boxes = document.bounds(ids)
+            if self._old_bounds is not None:
+                boxes = np.concatenate([self._old_bounds, boxes])
+                self._old_bounds = None
+            self.invalidate(boxes)
+            self.update(ids)
+        elif event in ("end_insert", "end_remove"):
+            self.invalidate(document.bounds(args[0], removed=True))
+            self.update(args[0])
+        elif event == "reset":
+            self._tree = None
+            self._pending.clear()
+
+    def _region(self, key: tuple[int, int]) -> tuple:
+        """Intersections that fall inside one region, found on first use"""
+        found = self._regions.get(key)
+        if found is not None:
+            self._regions.move_to_end(key)
+            return found
+        self._pending.pop(key, None)
+        cell = self._region_size
+        x0, y0 = key[0] * cell, key[1] * cell
+        ids = self.index.query(x0, y0, x0 + cell, y0 + cell)
+        xy, first, second = intersections(self.document, ids,
+                                          np.array([x0, y0, x0 + cell, y0 + cell]))
+        # Each crossing belongs to the one region it lies in
+        inside = (np.floor(xy[:, 0] / cell) == key[0]) & (np.floor(xy[:, 1] / cell) == key[1])
+        found = self._regions[key] = (xy[inside], first[inside], second[inside])
+        if len(self._regions) > MAX_REGIONS:
+            self._regions.popitem(last=False)
+        return found
+
+    def fill(self, budget: float = FILL_BUDGET) -> bool:
+        """Find the intersections of queued regions for up to budget seconds.
+
+        The regions queued last, nearest the cursor, go first. Returns whether
+        any were found, and schedules another pass while some are left.
+        """
+        if self._tree is None:
+            self._pending.clear()
+            return False
+        start = time.perf_counter()
+        filled = False
+        with logger.span("snap.fill"):
+            while self._pending and time.perf_counter() - start < budget:
+                key, _ = self._pending.popitem()
+                self._region(key)
+                filled = True
+        if self._pending and self.schedule is not None:
+            self.schedule()
+        return filled
+
+    def _queue(self, key: tuple[int, int]) -> None:
+        was_empty = not self._pending
+        self._pending[key] = None
+        self._pending.move_to_end(key)
+        if len(self._pending) > MAX_REGIONS:
+            self._pending.popitem(last=False)
+        if was_empty:
+            self.schedule()
+
+    def snap(self, x: float, y: float, radius: float, exclude=()) -> Snap:
+        """The target within radius of (x, y) nearest to it, or None"""
+        with logger.span("snap.query"):
+            if self._tree is None:
+                self.build()
+            exclude = np.asarray(exclude, np.int64)
+
+            def shown(owners):
+                keep = self.document.shown(owners)
+                if len(exclude):
+                    keep &= ~np.isin(owners, exclude)
+                return keep
+
+            found = self._tree.query(x, y, radius)
+            xy, kinds, owners = self._xy[found], self._kinds[found], self._owners[found]
+            keep = ~self._stale[owners] & shown(owners)
+            groups = [(xy[keep], kinds[keep], owners[keep], owners[keep])]
+
+            dxy, dkinds, downers = self._dynamic_candidates
+            near = np.hypot(dxy[:, 0] - x, dxy[:, 1] - y) <= radius
+            near[near] &= shown(downers[near])
+            groups.append((dxy[near], dkinds[near], downers[near], downers[near]))
+
+            cell = self._region_size
+            kx0, kx1 = math.floor((x - radius) / cell), math.floor((x + radius) / cell)
+            ky0, ky1 = math.floor((y - radius) / cell), math.floor((y + radius) / cell)
+            keys = []
+            # Zoomed far out crossings are too dense to pick from, so none are offered
+            if max(kx1 - kx0, ky1 - ky0) < MAX_QUERY_SPAN:
+                # The cursor's own region first, it is the likeliest to hold the target
+                keys = sorted(((kx, ky) for kx in range(kx0, kx1 + 1) for ky in range(ky0, ky1 + 1)),
+                              key=lambda k: abs(k[0] + 0.5 - x / cell) + abs(k[1] + 0.5 - y / cell))
+            computed = 0
+            for key in keys:
+                if key not in self._regions:
+                    if self.schedule is not None and computed >= QUERY_REGIONS:
+                        self._queue(key)
+                        continue
+                    computed += 1
+                ixy, first, second = self._region(key)
+                near = np.hypot(ixy[:, 0] - x, ixy[:, 1] - y) <= radius
+                near[near] &= shown(first[near]) & shown(second[near])
+                groups.append((ixy[near], np.full(int(near.sum()), SNAP_INTERSECTION, np.int8),
+                               first[near], second[near]))
+
+            xy = np.concatenate([g[0] for g in groups])
+            if not len(xy):
+                return None
+            kinds = np.concatenate([g[1] for g in groups])
+            first = np.concatenate([g[2] for g in groups])
+            second = np.concatenate([g[3] for g in groups])
+            distance = np.hypot(xy[:, 0] - x, xy[:, 1] - y)
+            best = int(np.lexsort((kinds, distance))[0])
+            owners = tuple(sorted({int(first[best]), int(second[best])}))
+            return Snap(float(xy[best, 0]), float(xy[best, 1]), int(kinds[best]), owners)
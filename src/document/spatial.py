@@ -0,0 +1,276 @@
+import numpy as np
+
+from src.document.store import DocumentStore, KIND_IDS, GROUP, ROOT
+from src.document.parametric import tessellate
+
+TARGET_PER_CELL = 8
+MAX_CELLS_PER_AXIS = 2048
+# Objects that moved since the last bulk load are tested brute force until
+# there are this many of them (or this fraction of the document)
+REBUILD_MIN = 4096
+REBUILD_FRACTION = 0.05
+
+
+def _segment_distance(a: np.ndarray, b: np.ndarray, x: float, y: float) -> np.ndarray:
+    """Distance from (x, y) to each segment a-b"""
+    ab = b - a
+    length = np.maximum((ab ** 2).sum(axis=1), 1e-12)
+    t = np.clip(((np.array([x, y]) - a) * ab).sum(axis=1) / length, 0, 1)
+    nearest = a + ab * t[:, None]
+    return np.hypot(nearest[:, 0] - x, nearest[:, 1] - y)
+
+
+class SpatialIndex:
+    """Uniform grid over object bounding boxes for culling and hit-testing.
+
+    Bulk loading sorts objects by the grid cell holding their box centre into
+    one flat array (CSR layout), so a query gathers one contiguous slice per
+    grid row. Objects larger than a cell are kept in a short side list, and
+    objects edited since the last load go to a dynamic list until it grows
+    large enough to be worth a rebuild. Group bounds are the union of their
+    descendants and are recomputed lazily after edits. After a reset the
+    grid is only rebuilt by the first query, so opening a document does not
+    wait for it.
+    """
+
+    def __init__(self, document: DocumentStore):
+        self.document = document
+        self.rebuilds = 0
+        self._boxes = np.zeros((0, 4))
+        self._group_boxes = np.zeros((0, 4))
+        self._groups_dirty = True
+        self._needs_build = False
+        document.subscribe(self._on_document_event)
+        self.build()
+
+    def build(self) -> None:
+        """Bulk load the grid from every object in the document"""
+        self._boxes = self.document.bounds()
+        boxes = self._boxes
+        valid = np.flatnonzero(np.isfinite(boxes[:, 0]))
+        self._stale = np.zeros(len(boxes), bool)
+        self._dynamic = np.zeros(0, np.int64)
+        self._groups_dirty = True
+        self._needs_build = False
+        self.rebuilds += 1
+
+        self._extent = None
+        if len(valid) == 0:
+            self._origin = np.zeros(2)
+            self._cell = 1.0
+            self._shape = (1, 1)
+            self._starts = np.zeros(2, np.int64)
+            self._sorted = np.zeros(0, np.int64)
+            self._large = np.zeros(0, np.int64)
+            return
+
+        b = boxes[valid]
+        lo = b[:, :2].min(axis=0)
+        hi = b[:, 2:].max(axis=0)
+        self._extent = np.concatenate([lo, hi])
+        extent = np.maximum(hi - lo, 1e-9)
+        cells = max(1, len(valid) // TARGET_PER_CELL)
+        cell = max(float(np.sqrt(extent[0] * extent[1] / cells)), float(extent.max()) / MAX_CELLS_PER_AXIS)
+        gx = min(MAX_CELLS_PER_AXIS, int(extent[0] // cell) + 1)
+        gy = min(MAX_CELLS_PER_AXIS, int(extent[1] // cell) + 1)
+
+        self._origin = lo
+        self._cell = cell
+        self._shape = (gx, gy)
+
+        size = np.maximum(b[:, 2] - b[:, 0], b[:, 3] - b[:, 1])
+        large = size > cell
+        self._large = valid[large]
+
+        small = valid[~large]
+        cells_of = self._cell_of(boxes[small])
+        order = np.argsort(cells_of, kind="stable")
+        self._sorted = small[order]
+        counts = np.bincount(cells_of, minlength=gx * gy)
+        self._starts = np.concatenate([[0], np.cumsum(counts)])
+
+    def _cell_of(self, boxes: np.ndarray) -> np.ndarray:
+        gx, gy = self._shape
+        centre = (boxes[:, :2] + boxes[:, 2:]) * 0.5
+        c = np.floor((centre - self._origin) / self._cell).astype(np.int64)
+        cx = np.clip(c[:, 0], 0, gx - 1)
+        cy = np.clip(c[:, 1], 0, gy - 1)
+        return cy * gx + cx
+
+    # Incremental updates
+
+    def update(self, ids) -> None:
+        """Refresh the boxes of objects that were added, moved or removed"""
+        ids = np.asarray(ids, np.int64)
+        if not len(ids) or self._needs_build:
+            return
+        count = self.document.count
+        if count > len(self._boxes):
+            grow = count - len(self._boxes)
+            self._boxes = np.vstack([self._boxes, np.full((grow, 4), np.nan)])
+            self._stale = np.concatenate([self._stale, np.zeros(grow, bool)])
+        boxes = self._boxes[ids] = self.document.bounds(ids)
+        boxes = boxes[np.isfinite(boxes[:, 0])]
+        if len(boxes):
+            # The extent only grows between rebuilds, which is fine for scrolling
+            lo, hi = boxes[:, :2].min(axis=0), boxes[:, 2:].max(axis=0)
+            if self._extent is not None:
+                lo, hi = np.minimum(self._extent[:2], lo), np.maximum(self._extent[2:], hi)
+            self._extent = np.concatenate([lo, hi])
+        self._stale[ids] = True
+        self._dynamic = np.union1d(self._dynamic, ids)
+        self._groups_dirty = True
+
+        if len(self._dynamic) > max(REBUILD_MIN, REBUILD_FRACTION * count):
+            self.build()
+
+    def _on_document_event(self, event: str, *args) -> None:
+        if event in ("end_insert", "end_remove"):
+            self.update(args[0])
+        elif event == "changed" and args[1] in ("coords", "expression"):
+            self.update(args[0])
+        elif event == "end_move":
+            self._groups_dirty = True
+        elif event == "reset":
+            self._needs_build = True
+            self._groups_dirty = True
+
+    # Queries
+
+    def query(self, x0: float, y0: float, x1: float, y1: float) -> np.ndarray:
+        """Ids of objects whose bounding box overlaps the rectangle"""
+        if self._needs_build:
+            self.build()
+        inside, border = self._grid_candidates(x0, y0, x1, y1)
+        large = self._large
+        if len(self._dynamic):
+            large = large[~self._stale[large]]
+        ids = np.concatenate([border, large, self._dynamic])
+        b = self._boxes[ids]
+        hit = (b[:, 0] <= x1) & (b[:, 2] >= x0) & (b[:, 1] <= y1) & (b[:, 3] >= y0)
+        return np.concatenate([inside, ids[hit]])
+
+    def _grid_candidates(self, x0: float, y0: float, x1: float, y1: float) -> tuple[np.ndarray, np.ndarray]:
+        """Ids from cells that lie wholly inside the rectangle, and from its border cells"""
+        empty = self._sorted[:0]
+        if not len(self._sorted):
+            return empty, empty
+        gx, gy = self._shape
+        cell = self._cell
+        # Small objects reach at most half a cell past their centre's cell
+        half = cell * 0.5
+        ox, oy = self._origin
+        cx0, cy0 = int(np.floor((x0 - half - ox) / cell)), int(np.floor((y0 - half - oy) / cell))
+        cx1, cy1 = int(np.floor((x1 + half - ox) / cell)), int(np.floor((y1 + half - oy) / cell))
+        if cx1 < 0 or cy1 < 0 or cx0 >= gx or cy0 >= gy:
+            return empty, empty
+        cx0, cy0 = max(cx0, 0), max(cy0, 0)
+        cx1, cy1 = min(cx1, gx - 1), min(cy1, gy - 1)
+
+        # Cells whose every object is guaranteed to overlap need no box test
+        ix0, iy0 = int(np.ceil((x0 + half - ox) / cell)), int(np.ceil((y0 + half - oy) / cell))
+        ix1, iy1 = int(np.floor((x1 - half - ox) / cell)) - 1, int(np.floor((y1 - half - oy) / cell)) - 1
+        ix0, iy0 = max(ix0, cx0), max(iy0, cy0)
+        ix1, iy1 = min(ix1, cx1), min(iy1, cy1)
+
+        if ix0 > ix1 or iy0 > iy1:
+            inside = empty
+            border = self._gather(cy0, cy1, cx0, cx1)
+        else:
+            inside = self._gather(iy0, iy1, ix0, ix1)
+            border = np.concatenate([
+                self._gather(cy0, iy0 - 1, cx0, cx1),
+                self._gather(iy1 + 1, cy1, cx0, cx1),
+                self._gather(iy0, iy1, cx0, ix0 - 1),
+                self._gather(iy0, iy1, ix1 + 1, cx1),
+            ])
+        if len(self._dynamic):
+            inside = inside[~self._stale[inside]]
+            border = border[~self._stale[border]]
+        return inside, border
+
+    def _gather(self, row0: int, row1: int, col0: int, col1: int) -> np.ndarray:
+        """Ids in a block of cells; each grid row of it is one contiguous CSR run"""
+        if row0 > row1 or col0 > col1:
+            return self._sorted[:0]
+        rows = np.arange(row0, row1 + 1) * self._shape[0]
+        start = self._starts[rows + col0]
+        lengths = self._starts[rows + col1 + 1] - start
+        total = int(lengths.sum())
+        if total == 0:
+            return self._sorted[:0]
+        if len(rows) == 1:
+            return self._sorted[start[0]:start[0] + total]
+        offsets = np.repeat(start - np.cumsum(lengths) + lengths, lengths)
+        return self._sorted[offsets + np.arange(total)]
+
+    def hit_test(self, x: float, y: float, tolerance: float) -> int:
+        """Id of the object drawn closest to (x, y) within tolerance, or ROOT"""
+        document = self.document
+        ids = self.query(x - tolerance, y - tolerance, x + tolerance, y + tolerance)
+        # Hidden objects, or objects in hidden groups, are not drawn
+        ids = ids[document.shown(ids)]
+        if not len(ids):
+            return ROOT
+        c = document.coords[ids]
+        kinds = document.kinds[ids]
+        distance = np.full(len(ids), np.inf)
+
+        point = kinds == KIND_IDS["point"]
+        distance[point] = np.hypot(c[point, 0] - x, c[point, 1] - y)
+
+        line = kinds == KIND_IDS["line"]
+        distance[line] = _segment_distance(c[line, :2], c[line, 2:], x, y)
+
+        circle = kinds == KIND_IDS["circle"]
+        distance[circle] = np.abs(np.hypot(c[circle, 0] - x, c[circle, 1] - y) - np.abs(c[circle, 2]))
+
+        # Curves are measured against the same cached polylines the canvas draws
+        for i in np.flatnonzero(kinds == KIND_IDS["parametric"]).tolist():
+            points = tessellate(document, int(ids[i]), tolerance)
+            if len(points) > 1:
+                d = _segment_distance(points[:-1], points[1:], x, y)
+                distance[i] = np.nanmin(d, initial=np.inf)
+
+        best = int(np.argmin(distance))
+        return int(ids[best]) if distance[best] <= tolerance else ROOT
+
+    # Group bounds
+
+    def group_bounds(self, oid: int = None) -> np.ndarray:
+        """Union of descendant boxes for one group, or for every object id"""
+        if self._needs_build:
+            self.build()
+        if self._groups_dirty:
+            self._compute_group_bounds()
+        return self._group_boxes if oid is None else self._group_boxes[oid]
+
+    def _compute_group_bounds(self) -> None:
+        document = self.document
+        count = document.count
+        boxes = np.full((count, 4), np.nan)
+        boxes[:len(self._boxes)] = self._boxes[:count]
+        groups = document.kinds == GROUP
+        boxes[groups] = [np.inf, np.inf, -np.inf, -np.inf]
+
+        # Deepest level first so nested groups are complete before their parents
+        depth = document.depths()
+        parents = document.parents
+        for level in range(int(depth.max(initial=0)), 0, -1):
+            ids = np.flatnonzero((depth == level) & np.isfinite(boxes[:, 0]))
+            p = parents[ids]
+            np.minimum.at(boxes[:, 0], p, boxes[ids, 0])
+            np.minimum.at(boxes[:, 1], p, boxes[ids, 1])
+            np.maximum.at(boxes[:, 2], p, boxes[ids, 2])
+            np.maximum.at(boxes[:, 3], p, boxes[ids, 3])
+
+        empty = groups & ~np.isfinite(boxes[:, 0])
+        boxes[empty] = np.nan
+        self._group_boxes = boxes
+        self._groups_dirty = False
+
+    def extent(self) -> np.ndarray:
+        """Box around every object in the document, kept since the last rebuild"""
+        if self._needs_build:
+            self.build()
+        return np.zeros(4) if self._extent is None else self._extent
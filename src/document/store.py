@@ -0,0 +1,599 @@
+from array import array
+from typing import Callable, Iterable
+import sys
+import numpy as np
+
+ROOT = -1
+
+KINDS = ["default", "point", "line", "circle", "parametric", "group"]
+KIND_IDS = {name: i for i, name in enumerate(KINDS)}
+GROUP = KIND_IDS["group"]
+
+FLAG_VISIBLE = 1
+FLAG_RENDER = 2
+FLAG_ALIVE = 4
+DEFAULT_FLAGS = FLAG_VISIBLE | FLAG_RENDER | FLAG_ALIVE
+# Flags a group passes down to everything below it
+INHERITED_FLAGS = (FLAG_VISIBLE, FLAG_RENDER)
+
+COLUMNS = ("_kind", "_flags", "_coords", "_parent", "_row", "_name")
+
+# Geometry layout of the four coordinate columns per kind:
+#   point       x, y, -, -
+#   line        x1, y1, x2, y2
+#   circle      cx, cy, r, -
+#   parametric  bounding box x0, y0, x1, y1 of the evaluated curve
+#   group       unused
+
+
+class NameTable:
+    """Interned object names.
+
+    Names loaded from a file stay encoded in their original buffer and are
+    only decoded when asked for; names added afterwards are kept as strings.
+    """
+
+    def __init__(self, offsets: np.ndarray = None, data=None):
+        self._offsets = offsets
+        self._data = data
+        self._loaded = 0 if offsets is None else len(offsets) - 1
+        self._added: list[str] = []
+
+    def __len__(self) -> int:
+        return self._loaded + len(self._added)
+
+    def __getitem__(self, index: int) -> str:
+        if index < self._loaded:
+            start, end = int(self._offsets[index]), int(self._offsets[index + 1])
+            return bytes(self._data[start:end]).decode()
+        return self._added[index - self._loaded]
+
+    def append(self, name: str) -> None:
+        self._added.append(name)
+
+    def detach(self) -> None:
+        """Copy the loaded buffer into memory, releasing whatever it came from"""
+        if self._loaded:
+            self._offsets = np.array(self._offsets)
+            self._data = bytes(self._data)
+
+    def clear(self) -> None:
+        self._offsets = self._data = None
+        self._loaded = 0
+        self._added = []
+
+    @property
+    def loaded(self) -> int:
+        """How many names came from the loaded buffer"""
+        return self._loaded
+
+    def encoded(self, start: int = 0):
+        """Yield (offsets, data) blocks of names from start onwards, UTF-8 encoded"""
+        for first in range(start, len(self), 1 << 16):
+            last = min(len(self), first + (1 << 16))
+            if last <= self._loaded:
+                o = self._offsets[first:last + 1]
+                yield o - o[0], bytes(self._data[int(o[0]):int(o[-1])])
+                continue
+            encoded = [self[i].encode() for i in range(first, last)]
+            yield np.cumsum([0] + [len(e) for e in encoded], dtype=np.uint64), b"".join(encoded)
+
+
+class DocumentStore:
+    """Columnar scene graph for every object in a diagram.
+
+    Objects are identified by a stable integer id which is also their slot in
+    each column. Ids are never reused; removed objects only lose FLAG_ALIVE
+    and keep the rest of their data, so a removal can be undone by reviving
+    them. The hierarchy lives in the parent/row columns plus one compact int32
+    child array per parent, so a moved object only touches its old and new
+    sibling arrays.
+
+    Structural changes are reported to listeners in begin/end pairs that map
+    one-to-one onto Qt's item model notifications:
+
+        begin_insert(parent, first, last)      end_insert(ids)
+        begin_remove(parent, first, last)      end_remove(ids)
+        begin_move(parent, first, last, dst_parent, dst_row)   end_move(ids)
+        begin_change(ids, what)                changed(ids, what)
+        reset()
+
+    begin_change is sent while the old values can still be read, for
+    listeners such as the undo history that need them.
+
+    Visibility and render state are inherited: an object is shown only when
+    it and every group above it are alive and visible, and likewise for
+    rendering. The effective state is kept as one packed bitset per flag and
+    updated a subtree at a time; edits that change it for objects other than
+    the ones edited are followed by changed(ids, "shown") for those objects.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self.count = 0
+        self.version = 0
+        self.names = NameTable()
+        self.expressions: dict[int, tuple[str, str, float, float]] = {}
+        self._name_ids: dict[str, int] = {}
+        self._children: dict[int, array] = {ROOT: array("i")}
+        # Source of child arrays not yet materialized, see load()
+        self._tree = None
+        self._listeners: list[Callable] = []
+        # Effective state bitsets, built on first use
+        self._effective: dict[int, np.ndarray] = None
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        self._kind = np.zeros(capacity, np.uint8)
+        self._flags = np.zeros(capacity, np.uint8)
+        self._coords = np.zeros((capacity, 4), np.float64)
+        self._parent = np.full(capacity, ROOT, np.int32)
+        self._row = np.zeros(capacity, np.int32)
+        self._name = np.zeros(capacity, np.int32)
+
+    def _reserve(self, extra: int) -> None:
+        needed = self.count + extra
+        capacity = len(self._kind)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for attr in COLUMNS:
+            old = getattr(self, attr)
+            new = np.zeros((capacity,) + old.shape[1:], old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, attr, new)
+
+    # Columns, trimmed to the ids handed out so far
+
+    @property
+    def kinds(self) -> np.ndarray:
+        return self._kind[:self.count]
+
+    @property
+    def flags(self) -> np.ndarray:
+        return self._flags[:self.count]
+
+    @property
+    def coords(self) -> np.ndarray:
+        return self._coords[:self.count]
+
+    @property
+    def parents(self) -> np.ndarray:
+        return self._parent[:self.count]
+
+    @property
+    def rows(self) -> np.ndarray:
+        return self._row[:self.count]
+
+    @property
+    def name_ids(self) -> np.ndarray:
+        return self._name[:self.count]
+
+    # Listeners
+
+    def subscribe(self, listener: Callable) -> None:
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, event: str, *args) -> None:
+        for listener in self._listeners:
+            listener(event, *args)
+
+    # Lookup
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.flags & FLAG_ALIVE))
+
+    def alive(self) -> np.ndarray:
+        return np.flatnonzero(self.flags & FLAG_ALIVE)
+
+    def ids_of_kind(self, kind: str) -> np.ndarray:
+        mask = (self.kinds == KIND_IDS[kind]) & (self.flags & FLAG_ALIVE).astype(bool)
+        return np.flatnonzero(mask)
+
+    def kind_of(self, oid: int) -> str:
+        return KINDS[self._kind[oid]]
+
+    def name_of(self, oid: int) -> str:
+        return self.names[self._name[oid]]
+
+    def is_alive(self, oid: int) -> bool:
+        return 0 <= oid < self.count and bool(self._flags[oid] & FLAG_ALIVE)
+
+    def parent_of(self, oid: int) -> int:
+        return int(self._parent[oid])
+
+    def row_of(self, oid: int) -> int:
+        return int(self._row[oid])
+
+    def children(self, oid: int = ROOT) -> array:
+        return self._siblings(oid) or array("i")
+
+    def child(self, oid: int, row: int) -> int:
+        return self._siblings(oid)[row]
+
+    def child_count(self, oid: int = ROOT) -> int:
+        children = self._children.get(oid)
+        if children is None and self._tree is not None:
+            return self._tree.count(oid)
+        return len(children) if children else 0
+
+    def is_materialized(self, oid: int) -> bool:
+        return oid in self._children or self._tree is None
+
+    def peek_children(self, oid: int) -> np.ndarray:
+        """Child ids of oid as an int32 array, without materializing them"""
+        children = self._children.get(oid)
+        if children is None and self._tree is not None:
+            return self._tree.peek(oid)
+        return np.frombuffer(children, np.int32) if children else np.zeros(0, np.int32)
+
+    @property
+    def tree(self):
+        """Where child arrays that are not materialized yet come from"""
+        return self._tree
+
+    def _siblings(self, oid: int) -> array:
+        """Child array of oid, materializing it from the loaded file on first use"""
+        children = self._children.get(oid)
+        if children is None and self._tree is not None and (oid == ROOT or self._kind[oid] == GROUP):
+            children = self._children[oid] = self._tree.load(oid)
+        return children
+
+    def is_ancestor(self, ancestor: int, oid: int) -> bool:
+        while oid != ROOT:
+            if oid == ancestor:
+                return True
+            oid = int(self._parent[oid])
+        return False
+
+    def descendants(self, oid: int) -> np.ndarray:
+        """Ids of every object below oid, one vectorized step per tree level"""
+        found = []
+        level = np.asarray(self.children(oid), np.int32)
+        while len(level):
+            found.append(level)
+            groups = level[self._kind[level] == GROUP]
+            level = np.concatenate([np.asarray(self.children(g), np.int32) for g in groups]) \
+                if len(groups) else level[:0]
+        return np.concatenate(found) if found else np.zeros(0, np.int32)
+
+    def bounds(self, ids=None, removed: bool = False) -> np.ndarray:
+        """Axis-aligned x0, y0, x1, y1 boxes; NaN for objects without geometry.
+
+        Removed objects count as having none unless removed is set.
+        """
+        ids = np.arange(self.count) if ids is None else np.asarray(ids, np.int32)
+        coords = self._coords[ids]
+        kinds = self._kind[ids]
+        boxes = np.full((len(ids), 4), np.nan)
+
+        point = kinds == KIND_IDS["point"]
+        boxes[point] = coords[point][:, [0, 1, 0, 1]]
+
+        segment = (kinds == KIND_IDS["line"]) | (kinds == KIND_IDS["parametric"])
+        c = coords[segment]
+        boxes[segment] = np.column_stack([
+            np.minimum(c[:, 0], c[:, 2]), np.minimum(c[:, 1], c[:, 3]),
+            np.maximum(c[:, 0], c[:, 2]), np.maximum(c[:, 1], c[:, 3])])
+
+        circle = kinds == KIND_IDS["circle"]
+        c = coords[circle]
+        r = np.abs(c[:, 2])
+        boxes[circle] = np.column_stack([c[:, 0] - r, c[:, 1] - r, c[:, 0] + r, c[:, 1] + r])
+
+        if not removed:
+            boxes[(self._flags[ids] & FLAG_ALIVE) == 0] = np.nan
+        return boxes
+
+    def depths(self) -> np.ndarray:
+        """Hierarchy depth of every object, zero for top level objects"""
+        depth = np.zeros(self.count, np.int32)
+        parent = self.parents.copy()
+        nested = parent != ROOT
+        while nested.any():
+            depth += nested
+            parent[nested] = self._parent[parent[nested]]
+            nested = parent != ROOT
+        return depth
+
+    def intern(self, name: str) -> int:
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name = sys.intern(name)
+            name_id = len(self.names)
+            self.names.append(name)
+            self._name_ids[name] = name_id
+        return name_id
+
+    # Editing
+
+    def add(self, kind: str, name: str, coords: Iterable[float] = None,
+            parent: int = ROOT) -> int:
+        ids = self.add_many(kind, [name], None if coords is None else [coords], parent)
+        return int(ids[0])
+
+    def add_many(self, kind: str, names: list[str], coords=None, parent: int = ROOT) -> np.ndarray:
+        """Append objects of one kind under parent as a single insert"""
+        n = len(names)
+        if n == 0:
+            return np.zeros(0, np.int32)
+        siblings = self._siblings(parent)
+        if siblings is None:
+            siblings = self._children[parent] = array("i")
+        first_row = len(siblings)
+        self._notify("begin_insert", parent, first_row, first_row + n - 1)
+
+        self._reserve(n)
+        ids = np.arange(self.count, self.count + n, dtype=np.int32)
+        self.count += n
+        self._kind[ids] = KIND_IDS[kind]
+        self._flags[ids] = DEFAULT_FLAGS
+        self._coords[ids] = 0.0 if coords is None else np.asarray(coords, np.float64).reshape(n, 4)
+        self._parent[ids] = parent
+        self._row[ids] = np.arange(first_row, first_row + n, dtype=np.int32)
+        self._name[ids] = [self.intern(name) for name in names]
+        if kind == "group":
+            for oid in ids.tolist():
+                self._children[oid] = array("i")
+        siblings.frombytes(ids.tobytes())
+        self.version += 1
+        self._update_effective(ids)
+
+        self._notify("end_insert", ids)
+        return ids
+
+    def _sibling_runs(self, ids: np.ndarray) -> list[tuple[int, int, int]]:
+        """Split ids into (parent, first row, last row) runs of adjacent siblings"""
+        ids = ids[np.lexsort((self._row[ids], self._parent[ids]))]
+        parents, rows = self._parent[ids], self._row[ids]
+        breaks = np.flatnonzero((np.diff(parents) != 0) | (np.diff(rows) != 1)) + 1
+        return [(int(parents[start]), int(rows[start]), int(rows[stop - 1]))
+                for start, stop in zip(np.r_[0, breaks], np.r_[breaks, len(ids)])]
+
+    def _with_descendants(self, ids: np.ndarray) -> np.ndarray:
+        groups = ids[self._kind[ids] == GROUP].tolist()
+        return np.concatenate([ids] + [self.descendants(g) for g in groups]).astype(np.int32)
+
+    def remove(self, ids: Iterable[int]) -> None:
+        """Remove objects along with everything below them.
+
+        Adjacent siblings are removed as one range, so removing many objects
+        costs one notification per run rather than one per object.
+        """
+        ids = np.unique(np.fromiter(ids, np.int32) if not isinstance(ids, np.ndarray) else ids)
+        ids = ids[(ids >= 0) & (ids < self.count)]
+        ids = ids[(self._flags[ids] & FLAG_ALIVE).astype(bool)]
+        # Objects below another removed object go along with it
+        groups = ids[self._kind[ids] == GROUP]
+        below = self._with_descendants(groups)[len(groups):]
+        ids = ids[~np.isin(ids, below)]
+        if not len(ids):
+            return
+        # Highest rows first so the rows of the remaining runs stay valid
+        for parent, first, last in reversed(self._sibling_runs(ids)):
+            self._notify("begin_remove", parent, first, last)
+
+            siblings = self._siblings(parent)
+            dead = self._with_descendants(np.frombuffer(siblings, np.int32)[first:last + 1].copy())
+            dead = dead[(self._flags[dead] & FLAG_ALIVE).astype(bool)]
+            self._flags[dead] &= ~np.uint8(FLAG_ALIVE)
+            del siblings[first:last + 1]
+            self._renumber(parent, first)
+            self.version += 1
+            self._update_effective(dead)
+
+            self._notify("end_remove", dead)
+
+    def revive(self, ids: Iterable[int]) -> None:
+        """Undo remove(): put removed objects back at their old rows.
+
+        ids are the objects that were removed directly; whatever was below
+        them when they were removed comes back with them.
+        """
+        ids = np.unique(np.asarray(ids, np.int32))
+        ids = ids[(self._flags[ids] & FLAG_ALIVE) == 0]
+        if not len(ids):
+            return
+        # Lowest rows first so each run lands where it was
+        for parent, first, last in self._sibling_runs(ids):
+            self._notify("begin_insert", parent, first, last)
+
+            tops = ids[(self._parent[ids] == parent) & (self._row[ids] >= first) & (self._row[ids] <= last)]
+            tops = tops[np.argsort(self._row[tops])]
+            siblings = self._siblings(parent)
+            siblings[first:first] = array("i", tops.tobytes())
+            revived = self._with_descendants(tops)
+            self._flags[revived] |= np.uint8(FLAG_ALIVE)
+            self._renumber(parent, first)
+            self.version += 1
+            self._update_effective(revived)
+
+            self._notify("end_insert", revived)
+
+    def move(self, ids: Iterable[int], parent: int, row: int) -> None:
+        """Move objects under parent starting at row, keeping their order"""
+        if parent != ROOT and self._kind[parent] != GROUP:
+            raise ValueError(f"Object {parent} cannot hold children")
+        for oid in ids:
+            if self.is_ancestor(oid, parent):
+                continue
+            source, src_row = int(self._parent[oid]), int(self._row[oid])
+            dst_row = row - 1 if source == parent and src_row < row else row
+            if source == parent and dst_row == src_row:
+                row = dst_row + 1
+                continue
+
+            self._notify("begin_move", source, src_row, src_row, parent, row)
+            del self._siblings(source)[src_row]
+            self._renumber(source, src_row)
+            self._siblings(parent).insert(dst_row, oid)
+            self._parent[oid] = parent
+            self._renumber(parent, dst_row)
+            moved = np.array([oid], np.int32)
+            shown = self._update_effective(moved)
+            self._notify("end_move", moved)
+            if len(shown):
+                self._notify("changed", shown, "shown")
+            row = dst_row + 1
+
+    def set_coords(self, ids, coords) -> None:
+        ids = np.asarray(ids, np.int32)
+        self._notify("begin_change", ids, "coords")
+        self._coords[ids] = np.asarray(coords, np.float64).reshape(len(ids), 4)
+        self.version += 1
+        self._notify("changed", ids, "coords")
+
+    def set_flag(self, ids, flag: int, value: bool) -> None:
+        ids = np.asarray(ids, np.int32)
+        self._notify("begin_change", ids, "flags")
+        if value:
+            self._flags[ids] |= np.uint8(flag)
+        else:
+            self._flags[ids] &= ~np.uint8(flag)
+        shown = self._update_effective(ids)
+        self._notify("changed", ids, "flags")
+        # Objects below the edited groups that now show or hide with them
+        shown = shown[~np.isin(shown, ids)]
+        if len(shown):
+            self._notify("changed", shown, "shown")
+
+    def rename(self, oid: int, name: str) -> None:
+        self._notify("begin_change", np.array([oid], np.int32), "name")
+        self._name[oid] = self.intern(name)
+        self.version += 1
+        self._notify("changed", np.array([oid], np.int32), "name")
+
+    def set_expression(self, oid: int, x: str, y: str, t0: float = 0.0, t1: float = 1.0) -> None:
+        self._notify("begin_change", np.array([oid], np.int32), "expression")
+        self.expressions[oid] = (x, y, float(t0), float(t1))
+        self.version += 1
+        self._notify("changed", np.array([oid], np.int32), "expression")
+
+    def clear_expression(self, oid: int) -> None:
+        self._notify("begin_change", np.array([oid], np.int32), "expression")
+        self.expressions.pop(oid, None)
+        self.version += 1
+        self._notify("changed", np.array([oid], np.int32), "expression")
+
+    def clear(self) -> None:
+        self.count = 0
+        self.names.clear()
+        self.expressions.clear()
+        self._name_ids.clear()
+        self._children = {ROOT: array("i")}
+        self._tree = None
+        self._effective = None
+        self._allocate(len(self._kind))
+        self.version += 1
+        self._notify("reset")
+
+    def load(self, count: int, columns: dict[str, np.ndarray], names: NameTable,
+             expressions: dict, tree) -> None:
+        """Replace the whole document with loaded columns.
+
+        columns maps each name in COLUMNS to an array with at least count
+        rows; they are adopted as they are, so memory-mapped arrays stay
+        mapped. tree provides count(oid), peek(oid) -> int32 array and
+        load(oid) -> array('i') for the child arrays, which are only
+        materialized when first needed.
+        """
+        for attr in COLUMNS:
+            setattr(self, attr, columns[attr])
+        self.count = count
+        self.names = names
+        self.expressions = dict(expressions)
+        self._name_ids.clear()
+        self._children = {}
+        self._tree = tree
+        self._effective = None
+        self.version += 1
+        self._notify("reset")
+
+    # Effective state
+
+    def shown(self, ids=None, flag: int = FLAG_VISIBLE) -> np.ndarray:
+        """Whether objects are alive and have flag set along with every group above them"""
+        if self._effective is None:
+            self._build_effective()
+        bits = self._effective[flag]
+        if ids is None:
+            return np.unpackbits(bits, count=self.count).astype(bool)
+        ids = np.asarray(ids, np.int64)
+        return ((bits[ids >> 3] >> (7 - (ids & 7))) & 1).astype(bool)
+
+    def is_shown(self, oid: int, flag: int = FLAG_VISIBLE) -> bool:
+        """shown() for one object, without the array overhead"""
+        if self._effective is None:
+            self._build_effective()
+        return bool((int(self._effective[flag][oid >> 3]) >> (7 - (oid & 7))) & 1)
+
+    def _build_effective(self) -> None:
+        """Effective state of every object, one vectorized step per tree level"""
+        depth = self.depths()
+        parents = self.parents
+        order = np.argsort(depth, kind="stable")
+        starts = np.searchsorted(depth[order], np.arange(int(depth.max(initial=0)) + 2))
+        self._effective = {}
+        for flag in INHERITED_FLAGS:
+            wanted = np.uint8(flag | FLAG_ALIVE)
+            effective = (self.flags & wanted) == wanted
+            for level in range(1, len(starts) - 1):
+                ids = order[starts[level]:starts[level + 1]]
+                effective[ids] &= effective[parents[ids]]
+            self._effective[flag] = np.packbits(effective)
+
+    def _update_effective(self, ids: np.ndarray) -> np.ndarray:
+        """Recompute the effective state of ids and whatever it changes below them.
+
+        Groups are only descended into when their own state changed, so
+        hiding a group inside an already hidden one stops right there.
+        Returns the ids whose state changed.
+        """
+        if self._effective is None:
+            return np.zeros(0, np.int32)
+        needed = (self.count + 7) // 8
+        for flag, bits in self._effective.items():
+            if len(bits) < needed:
+                self._effective[flag] = np.concatenate(
+                    [bits, np.zeros(max(needed, 2 * len(bits)) - len(bits), np.uint8)])
+        changed = []
+        level = np.unique(np.asarray(ids, np.int64))
+        while len(level):
+            parents = self._parent[level].astype(np.int64)
+            top = parents == ROOT
+            moved = np.zeros(len(level), bool)
+            for flag, bits in self._effective.items():
+                wanted = np.uint8(flag | FLAG_ALIVE)
+                above = top | ((bits[parents >> 3] >> (7 - (parents & 7))) & 1).astype(bool)
+                value = ((self._flags[level] & wanted) == wanted) & above
+                masks = (1 << (7 - (level & 7))).astype(np.uint8)
+                old = (bits[level >> 3] & masks) != 0
+                differs = value != old
+                if differs.any():
+                    np.bitwise_or.at(bits, level[differs & value] >> 3, masks[differs & value])
+                    np.bitwise_and.at(bits, level[differs & ~value] >> 3,
+                                      ~masks[differs & ~value])
+                    moved |= differs
+            changed.append(level[moved])
+            groups = level[moved & (self._kind[level] == GROUP)].tolist()
+            level = np.concatenate([np.asarray(self.children(g), np.int64) for g in groups]) \
+                if groups else level[:0]
+        return np.concatenate(changed).astype(np.int32)
+
+    def _renumber(self, parent: int, start: int) -> None:
+        siblings = self._siblings(parent)
+        if start < len(siblings):
+            view = np.frombuffer(siblings, np.int32)
+            self._row[view[start:]] = np.arange(start, len(siblings), dtype=np.int32)
+            del view
+
+    # Reporting
+
+    def nbytes(self) -> int:
+        columns = [getattr(self, attr) for attr in COLUMNS]
+        children = sum(c.itemsize * len(c) for c in self._children.values())
+        return sum(c.nbytes for c in columns) + children
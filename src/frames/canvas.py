@@ -1,16 +1,319 @@
 from PySide6.QtWidgets import (
     QWidget, QGraphicsScene, QGraphicsView
 )
-from PySide6.QtCore import Qt
+from PySide6.QtGui import QPainter, QColor, QMouseEvent, QWheelEvent, QKeyEvent, QPen
+from PySide6.QtCore import Qt, QPointF, QRectF, QRect, QTimer, Signal
+import numpy as np
+
+from src.document.store import DocumentStore, ROOT
+from src.document.spatial import SpatialIndex
+from src.document.snapping import SnapEngine, Snap, SNAP_POINT, SNAP_ENDPOINT, SNAP_MIDPOINT
+from src.render.batch import BatchRenderer, LABEL_MIN_SCALE, LABEL_MAX_COUNT
+from src.render.tiles import TileCache, LEVELS_PER_OCTAVE, level_of, tile_rect, tiles_in
+from src.render.export import PAGE_RECT
+from src.utils.config import config
+import src.utils.logger as logger
+
+SCENE_MARGIN = 1000
+HIT_TOLERANCE_PX = 4
+SNAP_RADIUS_PX = 8
+SNAP_MARKER_PX = 5
+# One zoom step moves one tile level, so stepped zooms always blit exactly
+ZOOM_STEP = 2 ** (1 / LEVELS_PER_OCTAVE)
+MIN_ZOOM = 2 ** -8
+MAX_ZOOM = 2 ** 8
 
 
 class CanvasFrame(QGraphicsView):
-    def __init__(self, parent: QWidget = None):
+    objects_selected = Signal(object)
+
+    def __init__(self, parent: QWidget = None, document: DocumentStore = None):
         super().__init__(parent)
+        self.document = document
+        self.index = SpatialIndex(document) if document is not None else None
+        self.snapping = SnapEngine(document, self.index) if document is not None else None
+        self.tool = "Select"
+        # Pen tool: where the line being drawn starts, and the cursor or its snap
+        self._pen_start: QPointF = None
+        self._pen_end: QPointF = None
+        self._pen_cursor: QPointF = None
+        self._snap: Snap = None
+        self.renderer = BatchRenderer()
+        self.selection = np.zeros(0, np.int64)
+        self._rubber_band = QRectF()
+        self._centered = False
+        self.tiles = None
+        if document is not None:
+            self.tiles = TileCache(
+                document, self._query_visible, self,
+                config.getint('canvas', 'tile_cache_mb', fallback=128) * 2 ** 20)
+            self.tiles.tile_ready.connect(self._on_tile_ready)
+
         scene = QGraphicsScene(self)
         scene.setSceneRect(0, 0, 2000, 2000)
         self.setScene(scene)
 
         # Contents will go here
-        scene.addRect(0, 0, 800, 600, brush=Qt.white)
-        
+        scene.addRect(PAGE_RECT, brush=Qt.white)
+
+        # Panning only repaints the newly exposed strip
+        self.setViewportUpdateMode(QGraphicsView.MinimalViewportUpdate)
+        self.setOptimizationFlag(QGraphicsView.DontSavePainterState)
+
+        self.setDragMode(QGraphicsView.RubberBandDrag)
+        self.rubberBandChanged.connect(self._on_rubber_band_changed)
+
+        # Scene rect follows the document, refreshed at most once per event loop pass
+        self._extent_timer = QTimer(self, singleShot=True, interval=0)
+        self._extent_timer.timeout.connect(self.update_scene_rect)
+        # Intersections the pen's queries left over are found between events
+        self._snap_timer = QTimer(self, singleShot=True, interval=0)
+        self._snap_timer.timeout.connect(self._fill_snapping)
+        if self.snapping is not None:
+            self.snapping.schedule = self._snap_timer.start
+
+        if document is not None:
+            document.subscribe(self._on_document_event)
+            self.update_scene_rect()
+
+    def _on_document_event(self, event: str, *args) -> None:
+        if event in ("end_insert", "end_remove", "changed", "reset"):
+            self._extent_timer.start()
+            self.viewport().update()
+
+    def update_scene_rect(self):
+        x0, y0, x1, y1 = self.index.extent()
+        rect = QRectF(x0, y0, x1 - x0, y1 - y0).united(PAGE_RECT)
+        self.scene().setSceneRect(rect.adjusted(
+            -SCENE_MARGIN, -SCENE_MARGIN, SCENE_MARGIN, SCENE_MARGIN))
+
+    def visible_ids(self, rect: QRectF) -> np.ndarray:
+        """Ids of shown objects whose bounds overlap rect in scene coordinates"""
+        return self._query_visible(rect.left(), rect.top(), rect.right(), rect.bottom())
+
+    def _query_visible(self, x0: float, y0: float, x1: float, y1: float) -> np.ndarray:
+        ids = self.index.query(x0, y0, x1, y1)
+        return ids[self.document.shown(ids)]
+
+    def object_at(self, pos: QPointF) -> int:
+        """Id of the object under a scene position, or ROOT"""
+        tolerance = HIT_TOLERANCE_PX / max(self.transform().m11(), 1e-9)
+        return self.index.hit_test(pos.x(), pos.y(), tolerance)
+
+    def select(self, ids) -> None:
+        self.selection = np.asarray(ids, np.int64)
+        self.objects_selected.emit(self.selection)
+        self.viewport().update()
+
+    # Zoom
+
+    def zoom(self) -> float:
+        return float(np.hypot(self.transform().m11(), self.transform().m12()))
+
+    def zoom_by(self, factor: float) -> None:
+        factor = min(max(self.zoom() * factor, MIN_ZOOM), MAX_ZOOM) / self.zoom()
+        self.scale(factor, factor)
+
+    def zoom_in(self):
+        self.zoom_by(ZOOM_STEP)
+
+    def zoom_out(self):
+        self.zoom_by(1 / ZOOM_STEP)
+
+    def reset_view(self):
+        self.resetTransform()
+        self.centerOn(PAGE_RECT.center())
+
+    def wheelEvent(self, event: QWheelEvent):
+        if not event.modifiers() & Qt.ControlModifier:
+            super().wheelEvent(event)
+            return
+        # Ctrl+wheel zooms around the cursor, one level per notch
+        anchor = self.transformationAnchor()
+        self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
+        self.zoom_by(ZOOM_STEP ** (event.angleDelta().y() / 120))
+        self.setTransformationAnchor(anchor)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self._centered:
+            # The scene rect reaches well past the page; start on the page
+            self._centered = True
+            self.reset_view()
+
+    # Selection
+
+    def _on_rubber_band_changed(self, viewport_rect: QRect, start: QPointF, end: QPointF):
+        if not viewport_rect.isNull():
+            self._rubber_band = QRectF(start, end).normalized()
+        elif not self._rubber_band.isNull():
+            # A null rect marks the end of the drag
+            self.select(self.visible_ids(self._rubber_band))
+            self._rubber_band = QRectF()
+
+    def mouseReleaseEvent(self, event: QMouseEvent):
+        if self.tool == "Pen":
+            return
+        dragged = not self._rubber_band.isNull()
+        super().mouseReleaseEvent(event)
+        if event.button() == Qt.LeftButton and not dragged and self.index is not None:
+            oid = self.object_at(self.mapToScene(event.position().toPoint()))
+            self.select([] if oid == ROOT else [oid])
+
+    # Pen
+
+    def set_tool(self, tool: str):
+        self.tool = tool
+        pen = tool == "Pen" and self.document is not None
+        self.setDragMode(QGraphicsView.NoDrag if pen else QGraphicsView.RubberBandDrag)
+        self.viewport().setCursor(Qt.CrossCursor if pen else Qt.ArrowCursor)
+        self.viewport().setMouseTracking(pen)
+        self._pen_start = self._pen_end = self._pen_cursor = self._snap = None
+        self.viewport().update()
+
+    def _pen_rect(self) -> QRect:
+        """Viewport area covered by the pen's line and snap marker"""
+        points = [p for p in (self._pen_start, self._pen_end) if p is not None]
+        if not points:
+            return QRect()
+        rect = QRectF(points[0], points[-1]).normalized()
+        pad = SNAP_MARKER_PX + 2
+        return self.mapFromScene(rect).boundingRect().adjusted(-pad, -pad, pad, pad)
+
+    def _pen_point(self, event: QMouseEvent) -> QPointF:
+        """Scene position of the cursor, snapped when a target is near"""
+        self._pen_cursor = self.mapToScene(event.position().toPoint())
+        return self._snap_point(self._pen_cursor)
+
+    def _snap_point(self, pos: QPointF) -> QPointF:
+        with logger.span("canvas.snap"):
+            self._snap = self.snapping.snap(pos.x(), pos.y(), SNAP_RADIUS_PX / self.zoom())
+        return pos if self._snap is None else QPointF(self._snap.x, self._snap.y)
+
+    def _fill_snapping(self) -> None:
+        # Snap again if crossings near the cursor were just found
+        if not self.snapping.fill() or self.tool != "Pen" or self._pen_cursor is None:
+            return
+        before = self._pen_rect()
+        self._pen_end = self._snap_point(self._pen_cursor)
+        self.viewport().update(before.united(self._pen_rect()))
+
+    def mouseMoveEvent(self, event: QMouseEvent):
+        if self.tool != "Pen" or self.document is None:
+            super().mouseMoveEvent(event)
+            return
+        before = self._pen_rect()
+        self._pen_end = self._pen_point(event)
+        # Only the line and the marker are repainted, the tiles stay as they are
+        self.viewport().update(before.united(self._pen_rect()))
+
+    def mousePressEvent(self, event: QMouseEvent):
+        if self.tool != "Pen" or self.document is None:
+            super().mousePressEvent(event)
+            return
+        before = self._pen_rect()
+        if event.button() == Qt.LeftButton:
+            point = self._pen_point(event)
+            if self._pen_start is not None and point != self._pen_start:
+                self.document.add("line", f"Line {self.document.count + 1}",
+                                  (self._pen_start.x(), self._pen_start.y(), point.x(), point.y()))
+            # Lines chain from the end of the last one until the pen is lifted
+            self._pen_start = self._pen_end = point
+        else:
+            self._pen_start = None
+        self.viewport().update(before.united(self._pen_rect()))
+
+    def keyPressEvent(self, event: QKeyEvent):
+        if self.tool == "Pen" and event.key() == Qt.Key_Escape:
+            before = self._pen_rect()
+            self._pen_start = None
+            self.viewport().update(before)
+            return
+        super().keyPressEvent(event)
+
+    def _draw_pen(self, painter: QPainter, scale: float) -> None:
+        color = self.palette().highlight().color()
+        pen = QPen(color, 1)
+        pen.setCosmetic(True)
+        painter.setPen(pen)
+        painter.setBrush(Qt.NoBrush)
+        if self._pen_start is not None:
+            painter.drawLine(self._pen_start, self._pen_end)
+        snap = self._snap
+        if snap is not None:
+            size = SNAP_MARKER_PX / scale
+            centre = QPointF(snap.x, snap.y)
+            marker = QRectF(centre.x() - size, centre.y() - size, 2 * size, 2 * size)
+            # Squares for points, triangles for midpoints, crosses for the rest
+            if snap.kind in (SNAP_POINT, SNAP_ENDPOINT):
+                painter.drawRect(marker)
+            elif snap.kind == SNAP_MIDPOINT:
+                painter.drawPolygon([QPointF(centre.x(), marker.top()), marker.bottomRight(),
+                                     marker.bottomLeft()])
+            else:
+                painter.drawLine(marker.topLeft(), marker.bottomRight())
+                painter.drawLine(marker.topRight(), marker.bottomLeft())
+
+    # Painting
+
+    def drawForeground(self, painter: QPainter, rect: QRectF):
+        """Blit cached tiles of the exposed rect, then draw selection and labels live"""
+        if self.document is None:
+            return
+        with logger.span("canvas.paint"):
+            transform = painter.worldTransform()
+            scale = float(np.hypot(transform.m11(), transform.m12()))
+
+            painter.save()
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+            self._draw_tiles(painter, rect, level_of(scale))
+
+            labels = scale >= LABEL_MIN_SCALE
+            if labels or len(self.selection):
+                ids = self.visible_ids(rect)
+                if labels and len(ids) <= LABEL_MAX_COUNT:
+                    self.renderer.draw_labels(painter, self.document, ids,
+                                              self.document.coords[ids], scale, QColor(Qt.black))
+                if len(self.selection):
+                    selected = self.selection[np.isin(self.selection, ids)]
+                    self.renderer.paint(painter, self.document, selected, scale,
+                                        self.palette().highlight().color(), labels=False)
+            if self.tool == "Pen" and self._pen_end is not None:
+                self._draw_pen(painter, scale)
+            painter.restore()
+
+    def _draw_tiles(self, painter: QPainter, rect: QRectF, level: int) -> None:
+        tiles = self.tiles
+        levels = sorted(tiles.levels() - {level}, key=lambda other: abs(other - level))
+        for tx, ty in tiles_in(level, rect):
+            key = (level, tx, ty)
+            target = tile_rect(*key)
+            image = tiles.get(key)
+            if image is None:
+                if self._draw_preview(painter, target, levels):
+                    tiles.request(key)
+                else:
+                    # Nothing to stand in for it, e.g. right after an edit
+                    image = tiles.render_now(key, self.renderer)
+            if image is not None and not image.isNull():
+                painter.drawImage(target, image)
+
+    def _draw_preview(self, painter: QPainter, target: QRectF, levels: list[int]) -> bool:
+        """Stretch the tiles of the nearest other level that covers target"""
+        for other in levels:
+            keys = [(other, tx, ty) for tx, ty in tiles_in(other, target)]
+            images = [self.tiles.peek(key) for key in keys]
+            if any(image is None for image in images):
+                continue
+            painter.save()
+            painter.setClipRect(target)
+            for key, image in zip(keys, images):
+                if not image.isNull():
+                    painter.drawImage(tile_rect(*key), image)
+            painter.restore()
+            return True
+        return False
+
+    def _on_tile_ready(self, rect: QRectF):
+        self.viewport().update(self.mapFromScene(rect).boundingRect())
@@ -1,12 +1,30 @@
 from PySide6.QtWidgets import (
     QWidget, QFrame, QVBoxLayout, QLabel, QHBoxLayout, QTabWidget, QLabel, QSplitter,
-    QTreeWidget, QTreeWidgetItem
+    QTreeView, QLineEdit
 )
-from PySide6.QtGui import QIcon, QPixmap, QTransform
-from PySide6.QtCore import QSize, Qt
-from src.frames.controller.outliner_entries import OutlineEntry
-from src.utils.os import resource_path
-from PySide6.QtCore import QTimer
+from PySide6.QtCore import QSize, Qt, QTimer
+from functools import partial
+import time
+from src.document.store import DocumentStore
+from src.document.modifiers import ModifierGraph
+from src.document.history import History
+from src.document.constraints import ConstraintSystem
+from src.frames.controller.outliner_entries import OutlineEntryDelegate
+from src.frames.controller.outliner_model import OutlinerModel
+from src.frames.controller.outliner_filter import OutlinerFilterModel
+from src.frames.controller.lazy_tab import LazyTab
+from src.utils.config import config
+from src.utils.icons import icon_cache
+
+# Larger documents open collapsed so groups are only loaded when expanded
+EXPAND_ALL_LIMIT = 10000
+# Search results open up to their matches only when there are few enough to
+# expand while typing
+EXPAND_MATCHES_LIMIT = 500
+# Hidden tabs are torn down when more than this many are built, or when unused
+# for longer than the idle time; both can be set in the [tabs] config section
+MAX_BUILT_TABS = config.getint('tabs', 'max_built', fallback=3)
+TAB_IDLE_SECONDS = config.getfloat('tabs', 'idle_seconds', fallback=300.0)
 
 
 from src.frames.controller.tabs.modifiers import ModifierControllerFrame
@@ -24,7 +42,7 @@ class TabFrame(QFrame):
         self.layout.setSpacing(0)
 
         label = QLabel(title)
-        label.setStyleSheet("padding: 2px 2px 2px 2px;")
+        label.setObjectName("tab_title")
         self.layout.addWidget(label)
 
         line = QFrame()
@@ -37,12 +55,15 @@ class TabFrame(QFrame):
 
 
 class ControllerFrame(QFrame):
-    def __init__(self, parent: QWidget = None):
+    def __init__(self, parent: QWidget = None, document: DocumentStore = None,
+                 modifiers: ModifierGraph = None, history: History = None,
+                 constraints: ConstraintSystem = None):
         super().__init__(parent)
         self.splitter = QSplitter(Qt.Vertical)
-        self.splitter.addWidget(OutlinerFrame())
+        self.splitter.addWidget(OutlinerFrame(document=document))
 
-        self.splitter.addWidget(PropertiesFrame())
+        self.splitter.addWidget(PropertiesFrame(document=document, modifiers=modifiers,
+                                                history=history, constraints=constraints))
 
         self.layout = QVBoxLayout(self)
         self.layout.setContentsMargins(0, 0, 0, 0)
@@ -51,93 +72,102 @@ class ControllerFrame(QFrame):
 
 
 class OutlinerFrame(QFrame):
-    SUPPORTS_CHILDREN = [
-        "group"
-    ]
-
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, document: DocumentStore = None):
         super().__init__(parent)
         self.layout = QVBoxLayout(self)
         self.layout.setContentsMargins(0, 0, 0, 0)
         self.layout.setSpacing(0)
 
         label = QLabel("Diagram Collection")
-        label.setStyleSheet("padding: 5px;")
+        label.setObjectName("outliner_title")
         self.layout.addWidget(label)
 
-        tree = QTreeWidget()
+        self.search_box = QLineEdit(placeholderText="Search names and types",
+                                    clearButtonEnabled=True)
+        self.search_box.textChanged.connect(self.filter_tree)
+        self.layout.addWidget(self.search_box)
+
+        self.model = OutlinerModel(document, self)
+        # Only shown while searching, so browsing never pays for the mapping
+        self.filter = OutlinerFilterModel(self.model, self)
+
+        tree = QTreeView()
+        tree.setModel(self.model)
+        tree.setItemDelegate(OutlineEntryDelegate(tree))
         tree.setHeaderHidden(True)
+        tree.setUniformRowHeights(True)
         tree.setDragEnabled(True)
         tree.setAcceptDrops(True)
         tree.setDropIndicatorShown(True)
         tree.setAlternatingRowColors(True)
         tree.setIndentation(10)
-        tree.setSelectionMode(QTreeWidget.ExtendedSelection)
-        tree.setDragDropMode(QTreeWidget.InternalMove)
+        tree.setSelectionMode(QTreeView.ExtendedSelection)
+        tree.setDragDropMode(QTreeView.InternalMove)
+        tree.setDefaultDropAction(Qt.MoveAction)
 
         self.tree = tree
-
-        colors = ["point", "line", "circle", "parametric", "default", "group"]
-        for i, color in enumerate(colors):
-            child_item = QTreeWidgetItem(tree)
-            child_item.setData(
-                0, Qt.UserRole, {"text": f"Item {i+1}", "color": color})
-
-            if color not in self.SUPPORTS_CHILDREN:
-                child_item.setFlags(child_item.flags() & ~Qt.ItemIsDropEnabled)
-
-            entry = OutlineEntry(f"Item {i+1}", color)
-            tree.setItemWidget(child_item, 0, entry)
-
-        tree.expandAll()
-
-        original_drop_event = tree.dropEvent
-
-        def custom_drop_event(event):
-            original_drop_event(event)
-            QTimer.singleShot(0, self.recreate_widgets)
-
-        tree.dropEvent = custom_drop_event
-
-        palette = self.palette()
-        alt_color = palette.color(palette.ColorRole.AlternateBase).name()
-        base_color = palette.color(palette.ColorRole.Base).name()
-        row_height = tree.visualItemRect(tree.topLevelItem(0)).height()
-
-        tree.setStyleSheet(f"""
-                QTreeView {{
-                    background: repeating-linear-gradient(
-                        0deg,
-                        {base_color} 0px,
-                        {base_color} {row_height}px,
-                        {alt_color} {row_height}px,
-                        {alt_color} {row_height * 2}px
-                    );
-                }}
-            """)
+        self.model.modelReset.connect(self.expand_default)
+        self.model.shown_changed.connect(tree.viewport().update)
+        # Groups opened for the current matches, so each is only expanded once
+        self._expanded = set()
+        self.filter.modelReset.connect(self._on_filter_reset)
+        self.filter.layoutChanged.connect(self._expand_matches)
+        self.expand_default()
 
         self.layout.addWidget(tree)
 
-    def recreate_widgets(self):
-        def recreate_recursive(item):
-            for i in range(item.childCount()):
-                child = item.child(i)
-                data = child.data(0, Qt.UserRole)
-                if data:
-                    existing_widget = self.tree.itemWidget(child, 0)
-                    if not existing_widget or not isinstance(existing_widget, OutlineEntry):
-                        entry = OutlineEntry(data["text"], data["color"])
-                        self.tree.setItemWidget(child, 0, entry)
-                recreate_recursive(child)
-
-        recreate_recursive(self.tree.invisibleRootItem())
+    def expand_default(self):
+        if self.model.document is None or self.tree.model() is not self.model:
+            return
+        if len(self.model.document) <= EXPAND_ALL_LIMIT:
+            self.tree.expandAll()
+
+    def filter_tree(self, text: str):
+        """Show only the objects matching text, with the groups above them"""
+        if not text.strip():
+            self.filter.set_query("")
+            if self.tree.model() is not self.model:
+                self.tree.setModel(self.model)
+                self.expand_default()
+            return
+        if self.tree.model() is self.filter:
+            if self.filter.set_query(text):
+                # Laid out now rather than on the view's delayed pass, which
+                # would paint the rows a second time
+                self.tree.doItemsLayout()
+            return
+        # Filtered before the view is attached, so it only lays out once
+        self.filter.set_query(text)
+        self.tree.setModel(self.filter)
+        self._on_filter_reset()
+        self.tree.doItemsLayout()
+
+    def _on_filter_reset(self):
+        self._expanded.clear()
+        self._expand_matches()
+
+    def _expand_matches(self):
+        # Matches are only useful with the groups above them open
+        if self.tree.model() is not self.filter:
+            return
+        groups = self.filter.groups().tolist()
+        # Groups that dropped out lost their expanded state with their rows
+        self._expanded.intersection_update(groups)
+        if len(self.filter) > EXPAND_MATCHES_LIMIT:
+            return
+        for oid in groups:
+            if oid not in self._expanded:
+                self._expanded.add(oid)
+                self.tree.expand(self.filter.index_of(oid))
 
     def sizeHint(self):
         return QSize(self.width(), 50)
 
 
 class PropertiesFrame(QFrame):
-    def __init__(self, parent: QWidget = None):
+    def __init__(self, parent: QWidget = None, document: DocumentStore = None,
+                 modifiers: ModifierGraph = None, history: History = None,
+                 constraints: ConstraintSystem = None):
         super().__init__(parent)
         CONTROLLER_TABS = [
             {
@@ -149,16 +179,19 @@ class PropertiesFrame(QFrame):
                 "title": "Modifiers",
                 "icon": "src/assets/icons/modifiers_tab.svg",
                 "frame": ModifierControllerFrame,
+                "args": {"graph": modifiers},
             },
             {
                 "title": "Geometry",
                 "icon": "src/assets/icons/geometry_tab.svg",
                 "frame": GeometryControllerFrame,
+                "args": {"constraints": constraints},
             },
             {
                 "title": "Document",
                 "icon": "src/assets/icons/document_tab.svg",
                 "frame": DocumentControllerFrame,
+                "args": {"history": history},
             },
             {
                 "title": "Settings",
@@ -173,39 +206,47 @@ class PropertiesFrame(QFrame):
 
         self.tab_widget = QTabWidget()
         self.tab_widget.setTabPosition(QTabWidget.West)
+        # Styled by the application theme
+        self.tab_widget.setObjectName("properties_tabs")
 
-        palette = self.palette()
-        style = f"""
-            QTabBar::tab {{
-                width: 16px;
-                height: 16px;
-                padding: 5px;
-                margin: 0px 0px 0px 2px;
-                border-top-left-radius: 5px;
-                border-bottom-left-radius: 5px;
-                border-right: none;
-            }}
-
-            QTabBar::tab:first {{
-                margin-top: 28px;
-            }}
-            
-            QTabBar::tab:last {{
-                margin-bottom: 3px;
-            }}
-            
-            QTabBar::tab:selected {{
-                background-color: {palette.color(palette.ColorRole.Base).name()};
-            }}
-        """
+        self.tabs: list[LazyTab] = []
+        self._current: int = None
         for i, c in enumerate(CONTROLLER_TABS):
-            # style += f"QTabBar::tab:nth-child({i + 1}) {{ background: {c['color']}; }}\n"
-            tab = c['frame'](self)
-            pix = QPixmap(resource_path(c['icon']))
-            pix = pix.transformed(QTransform().rotate(90))
+            # Frames are only built when their tab is first opened
+            factory = partial(c['frame'], document=document, **c.get('args', {}))
+            tab = LazyTab(factory, c['title'])
+            icon = icon_cache.icon(c['icon'], 16, rotation=90)
 
-            self.tab_widget.addTab(tab, QIcon(pix), "")
+            self.tabs.append(tab)
+            self.tab_widget.addTab(tab, icon, "")
             self.tab_widget.setIconSize(QSize(16, 16))
 
-        self.tab_widget.setStyleSheet(style)
         layout.addWidget(self.tab_widget)
+
+        self.tab_widget.currentChanged.connect(self._on_current_changed)
+        self._on_current_changed(self.tab_widget.currentIndex())
+        self._idle_timer = QTimer(self, interval=int(TAB_IDLE_SECONDS * 1000 / 4))
+        self._idle_timer.timeout.connect(self.release_idle)
+        self._idle_timer.start()
+
+    def _on_current_changed(self, index: int):
+        if index < 0:
+            return
+        if self._current is not None:
+            # Idle time counts from when a tab was last visible
+            self.tabs[self._current].last_used = time.monotonic()
+        self._current = index
+        self.tabs[index].build()
+
+        # Over budget: drop the least recently used hidden tabs
+        built = [t for t in self.tabs if t.is_built() and t is not self.tabs[index]]
+        for tab in sorted(built, key=lambda t: t.last_used)[:max(0, len(built) + 1 - MAX_BUILT_TABS)]:
+            tab.release()
+
+    def release_idle(self):
+        """Drop hidden tabs that have not been opened for TAB_IDLE_SECONDS"""
+        now = time.monotonic()
+        current = self.tab_widget.currentWidget()
+        for tab in self.tabs:
+            if tab is not current and tab.is_built() and now - tab.last_used > TAB_IDLE_SECONDS:
+                tab.release()
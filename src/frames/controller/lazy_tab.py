@@ -0,0 +1,52 @@
+from typing import Callable
+import time
+from PySide6.QtWidgets import QWidget, QVBoxLayout
+
+from src.frames.controller.tab_frame import TabFrame
+import src.utils.logger as logger
+
+
+class LazyTab(QWidget):
+    """Tab page that only builds its frame when first shown.
+
+    release() drops the frame again, keeping whatever state() returned so
+    the next build() restores it; the rest is rebuilt from the document.
+    """
+
+    def __init__(self, factory: Callable[[QWidget], TabFrame], name: str = "",
+                 parent: QWidget = None):
+        super().__init__(parent)
+        self.factory = factory
+        self.name = name
+        self.frame: TabFrame = None
+        self.last_used = 0.0
+        self._state = None
+        self.layout = QVBoxLayout(self)
+        self.layout.setContentsMargins(0, 0, 0, 0)
+
+    def is_built(self) -> bool:
+        return self.frame is not None
+
+    def build(self) -> TabFrame:
+        self.last_used = time.monotonic()
+        if self.frame is None:
+            with logger.span("tab.build"):
+                self.frame = self.factory(self)
+                if self._state is not None:
+                    self.frame.restore(self._state)
+                    self._state = None
+                self.layout.addWidget(self.frame)
+            logger.info("Built %s tab", self.name)
+        return self.frame
+
+    def release(self) -> bool:
+        """Drop the frame if it allows it; True if it was dropped"""
+        if self.frame is None or not self.frame.can_release():
+            return False
+        self._state = self.frame.state()
+        self.frame.release()
+        self.layout.removeWidget(self.frame)
+        self.frame.deleteLater()
+        self.frame = None
+        logger.info("Released %s tab", self.name)
+        return True
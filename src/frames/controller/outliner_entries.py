@@ -1,105 +1,107 @@
-from PySide6.QtWidgets import QWidget, QLabel, QHBoxLayout, QPushButton
-from PySide6.QtGui import QIcon
-from PySide6.QtCore import QSize
-
-from src.utils.os import resource_path
-
-ICON_HASH = {
-    "point": "src/assets/icons/point.svg",
-    "line": "src/assets/icons/line.svg",
-    "circle": "src/assets/icons/circle.svg",
-    "parametric": "src/assets/icons/parametric.svg",
-    "default": "src/assets/icons/default.svg",
-    "group": "src/assets/icons/group.svg",
+from PySide6.QtWidgets import QStyledItemDelegate, QStyleOptionViewItem, QStyle, QApplication
+from PySide6.QtGui import QPainter, QPalette
+from PySide6.QtCore import QEvent, QModelIndex, QRect, QSize, Qt
+
+from src.frames.controller.outliner_model import (
+    ICON_HASH, TypeRole, VisibleRole, RenderRole, ShownRole, RenderedRole
+)
+from src.utils.icons import icon_cache
+
+ROW_HEIGHT = 20
+ICON_SIZE = 16
+TEXT_PADDING = 5
+TOGGLE_SPACING = 2
+TOGGLE_MARGIN = 5
+HIDDEN_OPACITY = 0.4
+
+VISIBILITY_ICONS = {
+    True: "src/assets/icons/visible.svg",
+    False: "src/assets/icons/visibility_off.svg",
 }
+RENDER_ICONS = {
+    True: "src/assets/icons/render.svg",
+    False: "src/assets/icons/render_off.svg",
+}
+
+# Every painted row needs these, and each Qt enum lookup costs microseconds
+PANEL = QStyle.PE_PanelItemViewItem
+SELECTED = QStyle.State_Selected
+ELIDE = Qt.ElideRight
+TEXT_ALIGNMENT = Qt.AlignLeft | Qt.AlignVCenter
+TEXT_ROLE = QPalette.Text
+SELECTED_TEXT_ROLE = QPalette.HighlightedText
+
+
+class OutlineEntryDelegate(QStyledItemDelegate):
+    """Paints an outliner row: type icon, label, visibility and render toggles.
+
+    Rows are never backed by widgets; the toggles are hit-tested in
+    editorEvent and written straight back to the model. All icons come from
+    the shared icon cache, so toggling a row never parses an SVG.
+    """
+
+    def toggle_rects(self, rect: QRect) -> tuple[QRect, QRect]:
+        """Visibility and render toggle rectangles for a row"""
+        top = rect.top() + (rect.height() - ICON_SIZE) // 2
+        render = QRect(rect.right() - TOGGLE_MARGIN - ICON_SIZE + 1,
+                       top, ICON_SIZE, ICON_SIZE)
+        visibility = render.translated(-(ICON_SIZE + TOGGLE_SPACING), 0)
+        return visibility, render
+
+    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex):
+        opt = QStyleOptionViewItem(option)
+        self.initStyleOption(opt, index)
+        widget = opt.widget
+        style = widget.style() if widget else QApplication.style()
+        dpr = painter.device().devicePixelRatio()
+
+        visible = bool(index.data(VisibleRole))
+        render_enabled = bool(index.data(RenderRole))
+        # A group that is hidden or not rendered dims the rows below it too
+        shown = bool(index.data(ShownRole))
+        rendered = bool(index.data(RenderedRole))
+        object_type = index.data(TypeRole)
+        rect = opt.rect
+        visibility_rect, render_rect = self.toggle_rects(rect)
+
+        painter.save()
+        style.drawPrimitive(PANEL, opt, painter, widget)
+        if not shown:
+            painter.setOpacity(HIDDEN_OPACITY)
+
+        top = rect.top() + (rect.height() - ICON_SIZE) // 2
+        painter.drawPixmap(rect.left(), top, icon_cache.pixmap(
+            ICON_HASH.get(object_type, ICON_HASH["default"]), ICON_SIZE, dpr=dpr))
+
+        text_rect = QRect(rect.left() + ICON_SIZE + TEXT_PADDING, rect.top(),
+                          visibility_rect.left() - rect.left() - ICON_SIZE - 2 * TEXT_PADDING,
+                          rect.height())
+        text = opt.fontMetrics.elidedText(opt.text, ELIDE, text_rect.width())
+        role = SELECTED_TEXT_ROLE if opt.state & SELECTED else TEXT_ROLE
+        style.drawItemText(painter, text_rect, TEXT_ALIGNMENT, opt.palette, True, text, role)
+
+        painter.drawPixmap(visibility_rect.topLeft(), icon_cache.pixmap(
+            VISIBILITY_ICONS[visible], ICON_SIZE, dpr=dpr))
+        painter.setOpacity(1.0 if rendered else HIDDEN_OPACITY)
+        painter.drawPixmap(render_rect.topLeft(), icon_cache.pixmap(
+            RENDER_ICONS[render_enabled], ICON_SIZE, dpr=dpr))
+        painter.restore()
+
+    def sizeHint(self, option: QStyleOptionViewItem, index: QModelIndex) -> QSize:
+        return QSize(option.rect.width(), ROW_HEIGHT)
+
+    def editorEvent(self, event: QEvent, model, option: QStyleOptionViewItem,
+                    index: QModelIndex) -> bool:
+        if event.type() not in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease,
+                                QEvent.MouseButtonDblClick):
+            return super().editorEvent(event, model, option, index)
 
-from PySide6.QtWidgets import QWidget, QLabel, QHBoxLayout, QPushButton
-from PySide6.QtGui import QIcon
-from PySide6.QtCore import Qt
-
-class OutlineEntry(QWidget):
-    def __init__(self, text, object_type: str = "default"):
-        super().__init__()
-        self.visible = True
-        self.render_enabled = True
-        
-        layout = QHBoxLayout()
-        layout.setContentsMargins(0, 0, 0, 0)
-        layout.setSpacing(2)
-
-        # Icon and label
-        icon_label = QLabel()
-        icon_label.setPixmap(QIcon(resource_path(ICON_HASH[object_type])).pixmap(16, 16))
-        self.label = QLabel(text)
-        self.label.setStyleSheet("padding: 0px 5px;")
-        
-        layout.addWidget(icon_label)
-        layout.addWidget(self.label)
-        layout.addStretch()
-
-        btn_style = """
-            QPushButton {
-                background: transparent;
-                border: none;
-                padding: 0px;
-                margin: 0px;
-            }
-        """
-
-        # Visibility button
-        self.visibility_btn = QPushButton()
-        self.visibility_btn.setFixedSize(16, 16)
-        self.visibility_btn.setFlat(True)
-        self.visibility_btn.clicked.connect(self.toggle_visibility)
-        self.visibility_btn.setStyleSheet(btn_style)
-        self.update_visibility_icon()
-        
-        # Render button
-        self.render_btn = QPushButton()
-        self.render_btn.setFixedSize(16, 16)
-        self.render_btn.setFlat(True)
-        self.render_btn.clicked.connect(self.toggle_render)
-        self.render_btn.setStyleSheet(btn_style)
-        self.update_render_icon()
-        
-        layout.addSpacing(5)
-        layout.addWidget(self.visibility_btn)
-        layout.addSpacing(2)
-        layout.addWidget(self.render_btn)
-        layout.addSpacing(5)
-
-        self.setLayout(layout)
-    
-    def toggle_visibility(self):
-        self.visible = not self.visible
-        self.update_visibility_icon()
-        self.update_opacity()
-        # TODO: Update children visibility state
-    
-    def toggle_render(self):
-        self.render_enabled = not self.render_enabled
-        self.update_render_icon()
-        # TODO: Update children render state
-    
-    def update_visibility_icon(self):
-        icon_path = "src/assets/icons/visible.svg" if self.visible else "src/assets/icons/visibility_off.svg"
-        self.visibility_btn.setIcon(QIcon(resource_path(icon_path)))
-        self.visibility_btn.setIconSize(QSize(16, 16))
-    
-    def update_render_icon(self):
-        icon_path = "src/assets/icons/render.svg" if self.render_enabled else "src/assets/icons/render_off.svg"
-        self.render_btn.setIcon(QIcon(resource_path(icon_path)))
-        self.render_btn.setIconSize(QSize(16, 16))
-    
-    def update_opacity(self):
-        opacity = 1.0 if self.visible else 0.4
-        self.setStyleSheet(f"opacity: {opacity};")
-    
-    def set_parent_render_disabled(self, disabled):
-        """Call this on children when parent render is toggled"""
-        if disabled:
-            self.render_btn.setEnabled(False)
-            self.render_btn.setStyleSheet("opacity: 0.4;")
-        else:
-            self.render_btn.setEnabled(True)
-            self.render_btn.setStyleSheet("")
\ No newline at end of file
+        pos = event.position().toPoint()
+        visibility_rect, render_rect = self.toggle_rects(option.rect)
+        for rect, role in ((visibility_rect, VisibleRole), (render_rect, RenderRole)):
+            if rect.contains(pos):
+                # Swallow press/double-click so clicking a toggle keeps the selection
+                if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+                    model.setData(index, not index.data(role), role)
+                return True
+        return super().editorEvent(event, model, option, index)
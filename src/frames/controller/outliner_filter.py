@@ -0,0 +1,207 @@
+from PySide6.QtCore import QAbstractProxyModel, QModelIndex, QTimer, Qt
+import numpy as np
+
+from src.document.search import SearchIndex, with_ancestors
+from src.document.store import ROOT
+from src.frames.controller.outliner_model import OutlinerModel
+import src.utils.logger as logger
+
+
+class OutlinerFilterModel(QAbstractProxyModel):
+    """The outliner rows matching a search, with every group above them.
+
+    The kept ids are held sorted by parent and row, so the visible children
+    of a parent are one slice of that array and indexes carry the object id
+    just like the source's. A new query, or a rename that changes what
+    matches, is a layout change: persistent indexes move to their new rows
+    or are dropped, so the view keeps its expanded groups and selection
+    instead of starting over as after a reset. Structural changes in the
+    source still refilter and reset. Nothing is kept while the query is
+    empty, the outliner shows its own model then. The search index is built
+    on the first idle pass after creation and after every reset, so the
+    first keystroke finds it ready.
+    """
+
+    def __init__(self, source: OutlinerModel, parent=None):
+        super().__init__(parent)
+        self.document = source.document
+        self.search = SearchIndex(self.document)
+        self.query = ""
+        self._refilter_timer = QTimer(self, singleShot=True, interval=0)
+        self._refilter_timer.timeout.connect(self._refilter_if_changed)
+        self._index_timer = QTimer(self, singleShot=True, interval=0)
+        self._index_timer.timeout.connect(self._build_index)
+        self._index_timer.start()
+        self.setSourceModel(source)
+        self._source = source
+        self._set_ids(np.zeros(0, np.int64))
+        for signal in (source.rowsInserted, source.rowsRemoved, source.rowsMoved,
+                       source.layoutChanged):
+            signal.connect(self._on_structure_changed)
+        source.modelReset.connect(self._on_source_reset)
+        source.dataChanged.connect(self._on_data_changed)
+
+    def __len__(self) -> int:
+        return len(self._kept)
+
+    def set_query(self, query: str) -> bool:
+        """Filter by query, returning whether the kept rows changed"""
+        query = query.strip()
+        if query == self.query:
+            return False
+        self.query = query
+        return self._relayout(self._filter())
+
+    def groups(self) -> np.ndarray:
+        """Ids of the groups with kept rows below them"""
+        return self._groups
+
+    # QAbstractProxyModel interface
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        lo, hi = self._range(parent.internalId() if parent.isValid() else ROOT)
+        if column != 0 or not 0 <= row < hi - lo:
+            return QModelIndex()
+        return self.createIndex(row, 0, int(self._ids[lo + row]))
+
+    def parent(self, index: QModelIndex = QModelIndex()) -> QModelIndex:
+        if not index.isValid():
+            return QModelIndex()
+        pid = int(self._parents[self._positions[index.internalId()]])
+        if pid == ROOT:
+            return QModelIndex()
+        return self.createIndex(int(self._rows[pid]), 0, pid)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.column() > 0:
+            return 0
+        lo, hi = self._range(parent.internalId() if parent.isValid() else ROOT)
+        return hi - lo
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 1
+
+    # Asked for every row the view lays out or paints; the source only reads
+    # the object id, which indexes of both models carry, so nothing is mapped
+
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        return bool(self._sizes[(parent.internalId() if parent.isValid() else ROOT) + 1])
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        return self._source.data(index, role)
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlags:
+        return self._source.flags(index)
+
+    def mapToSource(self, index: QModelIndex) -> QModelIndex:
+        if not index.isValid():
+            return QModelIndex()
+        return self.sourceModel().index_of(index.internalId())
+
+    def mapFromSource(self, index: QModelIndex) -> QModelIndex:
+        if not index.isValid():
+            return QModelIndex()
+        return self.index_of(index.internalId())
+
+    def index_of(self, oid: int) -> QModelIndex:
+        if oid >= len(self._rows) or self._rows[oid] < 0:
+            return QModelIndex()
+        return self.createIndex(int(self._rows[oid]), 0, oid)
+
+    # Helpers
+
+    def _range(self, oid: int) -> tuple[int, int]:
+        # Slots are shifted by one so the root has one too
+        first = int(self._first[oid + 1])
+        return first, first + int(self._sizes[oid + 1])
+
+    def _filter(self) -> np.ndarray:
+        if not self.query:
+            return np.zeros(0, np.int64)
+        with logger.span("outliner.filter"):
+            return with_ancestors(self.document, self.search.match(self.query))
+
+    def _set_ids(self, ids: np.ndarray) -> None:
+        document = self.document
+        self._kept = ids
+        parents = document.parents[ids]
+        key = (parents.astype(np.int64) << 32) | document.rows[ids]
+        # Ids mostly come in row order already and then need no sorting
+        if (key[1:] < key[:-1]).any():
+            order = np.argsort(key, kind="stable")
+            ids, parents = ids[order], parents[order]
+        self._ids = ids
+        self._parents = parents
+        positions = np.arange(len(ids))
+        self._positions = np.full(document.count, -1, np.int64)
+        self._positions[ids] = positions
+        # Sorted by parent, so each group's children are one run of it
+        starts = np.ones(len(ids), bool)
+        starts[1:] = parents[1:] != parents[:-1]
+        first = np.flatnonzero(starts)
+        groups = parents[first]
+        sizes = np.diff(first, append=len(ids))
+        self._first = np.zeros(document.count + 1, np.int64)
+        self._sizes = np.zeros(document.count + 1, np.int64)
+        self._first[groups + 1] = first
+        self._sizes[groups + 1] = sizes
+        self._rows = np.full(document.count, -1, np.int64)
+        self._rows[self._ids] = positions - np.repeat(first, sizes)
+        self._groups = groups[groups != ROOT]
+
+    def _refilter(self) -> None:
+        self._refilter_timer.stop()
+        self.beginResetModel()
+        self._set_ids(self._filter())
+        self.endResetModel()
+
+    def _refilter_if_changed(self) -> None:
+        self._relayout(self._filter())
+
+    def _relayout(self, ids: np.ndarray) -> bool:
+        """Keep ids instead, moving persistent indexes rather than resetting"""
+        self._refilter_timer.stop()
+        if np.array_equal(ids, self._kept):
+            return False
+        self.layoutAboutToBeChanged.emit()
+        old = self.persistentIndexList()
+        oids = [index.internalId() for index in old]
+        self._set_ids(ids)
+        self.changePersistentIndexList(old, [self.index_of(oid) for oid in oids])
+        self.layoutChanged.emit()
+        return True
+
+    def _build_index(self) -> None:
+        with logger.span("outliner.index"):
+            self.search.build()
+
+    def _on_structure_changed(self, *args) -> None:
+        if self.query:
+            self._refilter()
+
+    def _on_source_reset(self) -> None:
+        self._index_timer.start()
+        if self.query:
+            self._refilter()
+
+    def _on_data_changed(self, top_left: QModelIndex, bottom_right: QModelIndex,
+                         roles: list[int] = ()) -> None:
+        if not self.query:
+            return
+        if not roles or Qt.DisplayRole in roles:
+            # A rename can make a row match or stop matching
+            self._refilter_timer.start()
+        parent = top_left.parent()
+        pid = parent.internalId() if parent.isValid() else ROOT
+        if pid != ROOT and not self.mapFromSource(parent).isValid():
+            return
+        children = np.asarray(self.document.children(pid))[top_left.row():bottom_right.row() + 1]
+        children = children[children < len(self._rows)]
+        rows = self._rows[children]
+        rows = rows[rows >= 0]
+        if not len(rows):
+            return
+        lo, _ = self._range(pid)
+        first, last = int(rows.min()), int(rows.max())
+        self.dataChanged.emit(self.createIndex(first, 0, int(self._ids[lo + first])),
+                              self.createIndex(last, 0, int(self._ids[lo + last])), roles)
@@ -0,0 +1,228 @@
+from PySide6.QtCore import QAbstractItemModel, QModelIndex, QMimeData, QByteArray, Qt, Signal
+from PySide6.QtGui import QIcon
+import numpy as np
+
+from src.document.store import DocumentStore, ROOT, GROUP, FLAG_VISIBLE, FLAG_RENDER, FLAG_ALIVE
+from src.utils.icons import icon_cache
+
+ICON_HASH = {
+    "point": "src/assets/icons/point.svg",
+    "line": "src/assets/icons/line.svg",
+    "circle": "src/assets/icons/circle.svg",
+    "parametric": "src/assets/icons/parametric.svg",
+    "default": "src/assets/icons/default.svg",
+    "group": "src/assets/icons/group.svg",
+}
+
+MIME_TYPE = "application/x-tordie-object-ids"
+
+TypeRole = Qt.UserRole + 1
+VisibleRole = Qt.UserRole + 2
+RenderRole = Qt.UserRole + 3
+ObjectIdRole = Qt.UserRole + 4
+# Whether the object is shown or rendered once the groups above it are counted
+ShownRole = Qt.UserRole + 5
+RenderedRole = Qt.UserRole + 6
+
+# data() runs for every role of every painted row, and reading a Qt enum
+# attribute costs microseconds, so the roles it checks are plain ints
+TEXT_ROLES = (int(Qt.DisplayRole), int(Qt.EditRole))
+DECORATION_ROLE = int(Qt.DecorationRole)
+
+# Flags are asked for every row during layout, so build them once
+ITEM_FLAGS = Qt.ItemIsEnabled | Qt.ItemIsSelectable | Qt.ItemIsDragEnabled
+GROUP_FLAGS = ITEM_FLAGS | Qt.ItemIsDropEnabled
+
+FLAG_ROLES = {
+    VisibleRole: FLAG_VISIBLE,
+    RenderRole: FLAG_RENDER,
+}
+EFFECTIVE_ROLES = {
+    ShownRole: FLAG_VISIBLE,
+    RenderedRole: FLAG_RENDER,
+}
+# Roles each kind of store change touches; expressions can change anything
+CHANGED_ROLES = {
+    "name": [Qt.DisplayRole, Qt.EditRole],
+    "flags": [VisibleRole, RenderRole, ShownRole, RenderedRole],
+}
+
+
+class OutlinerModel(QAbstractItemModel):
+    """Single column tree model over a DocumentStore.
+
+    Indexes carry the object id as their internal id, so nothing is allocated
+    per row; the view only asks for the rows it actually paints. Every edit
+    goes through the store, whose begin/end notifications are forwarded to
+    the matching Qt signals. A group's toggle only changes how the rows below
+    it are drawn, so it is announced once by shown_changed for views to
+    repaint, not by a dataChanged per parent that each re-lay out the view.
+    """
+    shown_changed = Signal()
+
+    def __init__(self, document: DocumentStore, parent=None):
+        super().__init__(parent)
+        self.document = document
+        self._handlers = {
+            "begin_insert": lambda p, first, last: self.beginInsertRows(self.index_of(p), first, last),
+            "end_insert": lambda ids: self.endInsertRows(),
+            "begin_remove": lambda p, first, last: self.beginRemoveRows(self.index_of(p), first, last),
+            "end_remove": lambda ids: self.endRemoveRows(),
+            "begin_move": lambda p, first, last, dst, row: self.beginMoveRows(
+                self.index_of(p), first, last, self.index_of(dst), row),
+            "end_move": lambda ids: self.endMoveRows(),
+            "begin_change": lambda ids, what: None,
+            "changed": self._on_changed,
+            "reset": lambda: (self.beginResetModel(), self.endResetModel()),
+        }
+        document.subscribe(self._on_document_event)
+
+    def index_of(self, oid: int) -> QModelIndex:
+        if oid == ROOT:
+            return QModelIndex()
+        return self.createIndex(self.document.row_of(oid), 0, oid)
+
+    def object_id(self, index: QModelIndex) -> int:
+        return index.internalId() if index.isValid() else ROOT
+
+    # QAbstractItemModel interface
+
+    def index(self, row: int, column: int, parent: QModelIndex = QModelIndex()) -> QModelIndex:
+        oid = self.object_id(parent)
+        if column != 0 or not 0 <= row < self.document.child_count(oid):
+            return QModelIndex()
+        return self.createIndex(row, 0, self.document.child(oid, row))
+
+    def parent(self, index: QModelIndex = QModelIndex()) -> QModelIndex:
+        if not index.isValid():
+            return QModelIndex()
+        return self.index_of(self.document.parent_of(index.internalId()))
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.column() > 0:
+            return 0
+        return self.document.child_count(self.object_id(parent))
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 1
+
+    def hasChildren(self, parent: QModelIndex = QModelIndex()) -> bool:
+        return self.document.child_count(self.object_id(parent)) > 0
+
+    def data(self, index: QModelIndex, role: int = Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        oid = index.internalId()
+        document = self.document
+        if role in TEXT_ROLES:
+            return document.name_of(oid)
+        if role == DECORATION_ROLE:
+            return self._icon(document.kind_of(oid))
+        if role == TypeRole:
+            return document.kind_of(oid)
+        if role in FLAG_ROLES:
+            return bool(document.flags[oid] & FLAG_ROLES[role])
+        if role in EFFECTIVE_ROLES:
+            return document.is_shown(oid, EFFECTIVE_ROLES[role])
+        if role == ObjectIdRole:
+            return oid
+        return None
+
+    def setData(self, index: QModelIndex, value, role: int = Qt.EditRole) -> bool:
+        if not index.isValid():
+            return False
+        oid = index.internalId()
+        if role == Qt.EditRole:
+            self.document.rename(oid, str(value))
+        elif role in FLAG_ROLES:
+            # The store passes the change down to the children, and they are
+            # repainted through the changed(ids, "shown") that follows
+            self.document.set_flag([oid], FLAG_ROLES[role], bool(value))
+        else:
+            return False
+        return True
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlags:
+        if not index.isValid():
+            return Qt.ItemIsDropEnabled
+        if self.document.kinds[index.internalId()] == GROUP:
+            return GROUP_FLAGS
+        return ITEM_FLAGS
+
+    # Drag and drop
+
+    def supportedDropActions(self) -> Qt.DropActions:
+        return Qt.MoveAction
+
+    def mimeTypes(self) -> list[str]:
+        return [MIME_TYPE]
+
+    def mimeData(self, indexes: list[QModelIndex]) -> QMimeData:
+        ids = sorted({i.internalId() for i in indexes if i.isValid()},
+                     key=self._sort_key)
+        mime = QMimeData()
+        mime.setData(MIME_TYPE, QByteArray(
+            ",".join(str(i) for i in ids).encode()))
+        return mime
+
+    def canDropMimeData(self, data: QMimeData, action: Qt.DropAction,
+                        row: int, column: int, parent: QModelIndex) -> bool:
+        if action != Qt.MoveAction or not data.hasFormat(MIME_TYPE):
+            return False
+        target = self.object_id(parent)
+        if target != ROOT and self.document.kinds[target] != GROUP:
+            return False
+        # Refuse to drop a group into itself or one of its descendants
+        return not any(self.document.is_ancestor(oid, target) for oid in self._decode(data))
+
+    def dropMimeData(self, data: QMimeData, action: Qt.DropAction,
+                     row: int, column: int, parent: QModelIndex) -> bool:
+        if not self.canDropMimeData(data, action, row, column, parent):
+            return False
+        if row < 0:
+            row = self.rowCount(parent)
+        self.document.move(self._decode(data), self.object_id(parent), row)
+        # The move already happened here, so the view's removeRows() after a
+        # MoveAction drag falls through to the base implementation and is a no-op
+        return True
+
+    # Helpers
+
+    def _on_document_event(self, event: str, *args) -> None:
+        self._handlers[event](*args)
+
+    def _on_changed(self, ids: np.ndarray, what: str) -> None:
+        if what == "coords":
+            return
+        if what == "shown":
+            self.shown_changed.emit()
+            return
+        ids = ids[(self.document.flags[ids] & FLAG_ALIVE).astype(bool)]
+        if not len(ids):
+            return
+        parents = self.document.parents[ids]
+        # One dataChanged per parent covering the touched rows
+        rows = self.document.rows[ids]
+        order = np.lexsort((rows, parents))
+        parents, rows = parents[order], rows[order]
+        starts = np.flatnonzero(np.r_[True, parents[1:] != parents[:-1]])
+        ends = np.r_[starts[1:], len(parents)] - 1
+        for parent, first, last in zip(parents[starts].tolist(), rows[starts].tolist(),
+                                       rows[ends].tolist()):
+            parent_index = self.index_of(parent)
+            self.dataChanged.emit(self.index(first, 0, parent_index),
+                                  self.index(last, 0, parent_index), CHANGED_ROLES.get(what, []))
+
+    def _sort_key(self, oid: int) -> list[int]:
+        path = []
+        while oid != ROOT:
+            path.append(self.document.row_of(oid))
+            oid = self.document.parent_of(oid)
+        return path[::-1]
+
+    def _decode(self, data: QMimeData) -> list[int]:
+        raw = bytes(data.data(MIME_TYPE)).decode()
+        return [int(i) for i in raw.split(",") if i and self.document.is_alive(int(i))]
+
+    def _icon(self, object_type: str) -> QIcon:
+        return icon_cache.icon(ICON_HASH.get(object_type, ICON_HASH["default"]))
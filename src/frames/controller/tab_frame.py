@@ -1,17 +1,29 @@
+from typing import Callable
 from PySide6.QtWidgets import (
     QWidget, QFrame, QVBoxLayout, QLabel, QWidget, QLabel
 )
 
+from src.document.store import DocumentStore
+
 
 class TabFrame(QFrame):
-    def __init__(self, parent: QWidget = None, title: str = ""):
+    """Base of the property tabs.
+
+    Tabs may be torn down while hidden and rebuilt later, so anything a tab
+    subscribes to goes through listen() and anything that is not derived
+    from the document goes through state() and restore().
+    """
+
+    def __init__(self, parent: QWidget = None, title: str = "", document: DocumentStore = None):
         super().__init__(parent)
+        self.document = document
+        self._subscriptions: list[tuple[object, Callable]] = []
         self.layout = QVBoxLayout(self)
         self.layout.setContentsMargins(0, 0, 0, 0)
         self.layout.setSpacing(0)
 
         label = QLabel(title)
-        label.setStyleSheet("padding: 2px 2px 2px 2px;")
+        label.setObjectName("tab_title")
         self.layout.addWidget(label)
 
         line = QFrame()
@@ -21,3 +33,23 @@ class TabFrame(QFrame):
         self.layout.addWidget(line)
 
         self.layout.addStretch()
+
+    def listen(self, source, listener: Callable) -> None:
+        """Subscribe to a document, graph or history until the tab is released"""
+        source.subscribe(listener)
+        self._subscriptions.append((source, listener))
+
+    def can_release(self) -> bool:
+        return True
+
+    def state(self):
+        """What restore() needs to bring a rebuilt tab back as it was"""
+        return None
+
+    def restore(self, state) -> None:
+        pass
+
+    def release(self) -> None:
+        for source, listener in self._subscriptions:
+            source.unsubscribe(listener)
+        self._subscriptions.clear()
@@ -1,13 +1,46 @@
 from PySide6.QtWidgets import (
     QWidget, QLabel, QWidget, QLabel
 )
+from PySide6.QtCore import QTimer
 
+from src.document.store import DocumentStore, KINDS
+from src.document.history import History
 from src.frames.controller.tab_frame import TabFrame
 
 
 class DocumentControllerFrame(TabFrame):
-    def __init__(self, parent: QWidget = None):
-        super().__init__(parent, title="Document")
-        content_label = QLabel("Document content here")
-        self.layout.addWidget(content_label)
+    def __init__(self, parent: QWidget = None, document: DocumentStore = None,
+                 history: History = None):
+        super().__init__(parent, title="Document", document=document)
+        self.history = history
+        self.content_label = QLabel()
+        self.content_label.setContentsMargins(5, 5, 5, 5)
+        self.layout.addWidget(self.content_label)
         self.layout.addStretch()
+
+        # Coalesce bursts of edits into one refresh
+        self._refresh_timer = QTimer(self, singleShot=True, interval=100)
+        self._refresh_timer.timeout.connect(self.refresh)
+        if document is not None:
+            self.listen(document, self._on_document_event)
+        if history is not None:
+            self.listen(history, lambda event: self._refresh_timer.start())
+        self.refresh()
+
+    def _on_document_event(self, event: str, *args) -> None:
+        if event in ("end_insert", "end_remove", "reset"):
+            self._refresh_timer.start()
+
+    def refresh(self):
+        if self.document is None:
+            self.content_label.setText("No document")
+            return
+        lines = [f"Objects: {len(self.document)}"]
+        for kind in KINDS:
+            lines.append(f"  {kind.capitalize()}: {len(self.document.ids_of_kind(kind))}")
+        lines.append(f"Memory: {self.document.nbytes() / 1024:.1f} KiB")
+        if self.history is not None:
+            lines.append(f"History: {len(self.history)} steps, "
+                         f"{self.history.nbytes / 1024:.1f} of "
+                         f"{self.history.max_bytes / 2 ** 20:.0f} MiB")
+        self.content_label.setText("\n".join(lines))
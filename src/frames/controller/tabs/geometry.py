@@ -1,13 +1,140 @@
+import numpy as np
 from PySide6.QtWidgets import (
-    QWidget, QLabel, QWidget, QLabel
+    QWidget, QLabel, QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView,
+    QFormLayout, QComboBox, QLineEdit, QDoubleSpinBox, QHBoxLayout, QPushButton, QMessageBox
 )
+from PySide6.QtCore import QTimer, Qt
 
+from src.document.store import DocumentStore
+from src.document.constraints import (
+    ConstraintSystem, CONSTRAINT_KINDS, COINCIDENT, DISTANCE, ANGLE
+)
 from src.frames.controller.tab_frame import TabFrame
 
+COLUMNS = ["Kind", "Objects", "Value", "Residual"]
+# Listing every constraint of a huge sketch would stall the tab
+MAX_ROWS = 2000
+
+
+def find_object(document: DocumentStore, text: str) -> tuple[int, int]:
+    """Object id and point of a name; "Line.1" is the second end of Line"""
+    text = text.strip()
+    candidates = [(text, 0)]
+    stem, _, sub = text.rpartition(".")
+    if stem and sub.isdigit():
+        candidates.append((stem, int(sub)))
+    alive = document.alive()
+    name_ids = document.name_ids[alive]
+    names = {document.names[nid]: nid for nid in np.unique(name_ids).tolist()}
+    for name, point in candidates:
+        if name in names:
+            return int(alive[np.flatnonzero(name_ids == names[name])[0]]), point
+    raise ValueError(f"No object named {text!r}")
+
 
 class GeometryControllerFrame(TabFrame):
-    def __init__(self, parent: QWidget = None):
-        super().__init__(parent, title="Geometry")
-        content_label = QLabel("Geometry content here")
-        self.layout.addWidget(content_label)
-        self.layout.addStretch()
+    def __init__(self, parent: QWidget = None, document: DocumentStore = None,
+                 constraints: ConstraintSystem = None):
+        super().__init__(parent, title="Geometry", document=document)
+        self.constraints = constraints
+
+        self.summary_label = QLabel()
+        self.summary_label.setContentsMargins(5, 5, 5, 5)
+        self.layout.insertWidget(2, self.summary_label)
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.Stretch)
+        self.table.verticalHeader().hide()
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.layout.insertWidget(3, self.table, 1)
+
+        form = QFormLayout()
+        form.setContentsMargins(5, 5, 5, 5)
+        self.kind_box = QComboBox()
+        self.kind_box.addItems([kind.capitalize() for kind in CONSTRAINT_KINDS])
+        self.kind_box.currentIndexChanged.connect(self._on_kind_changed)
+        self.first_edit = QLineEdit(placeholderText="Object name, .1 for a line's end")
+        self.second_edit = QLineEdit(placeholderText="Object name")
+        self.value_box = QDoubleSpinBox(decimals=3, minimum=-1e6, maximum=1e6)
+        form.addRow("Kind", self.kind_box)
+        form.addRow("First", self.first_edit)
+        form.addRow("Second", self.second_edit)
+        form.addRow("Value", self.value_box)
+
+        buttons = QHBoxLayout()
+        add_button = QPushButton("Add")
+        add_button.clicked.connect(self.add_constraint)
+        self.remove_button = QPushButton("Remove")
+        self.remove_button.clicked.connect(self.remove_selected)
+        buttons.addWidget(add_button)
+        buttons.addWidget(self.remove_button)
+        buttons.addStretch()
+        form.addRow(buttons)
+        self.form = QWidget()
+        self.form.setLayout(form)
+        self.layout.insertWidget(4, self.form)
+        self._on_kind_changed(0)
+
+        # Solves can run every frame while dragging, the table need not
+        self._refresh_timer = QTimer(self, singleShot=True, interval=250)
+        self._refresh_timer.timeout.connect(self.refresh)
+        if constraints is not None:
+            self.listen(constraints, lambda event, *args: self._refresh_timer.start())
+        self.form.setEnabled(constraints is not None)
+        self.refresh()
+
+    def _on_kind_changed(self, kind: int):
+        self.value_box.setEnabled(kind in (DISTANCE, ANGLE))
+        self.value_box.setSuffix(" rad" if kind == ANGLE else "")
+
+    def add_constraint(self):
+        kind = self.kind_box.currentIndex()
+        try:
+            a, a_sub = find_object(self.document, self.first_edit.text())
+            b, b_sub = find_object(self.document, self.second_edit.text())
+            self.constraints.add(kind, a, b, self.value_box.value(), a_sub, b_sub)
+        except ValueError as e:
+            QMessageBox.warning(self, "Cannot add constraint", str(e))
+
+    def remove_selected(self):
+        rows = self.table.selectionModel().selectedRows()
+        for cid in [self.table.item(index.row(), 0).data(Qt.UserRole) for index in rows]:
+            self.constraints.remove(cid)
+
+    def _describe(self, oid: int, sub: int, kind: int) -> str:
+        name = self.document.name_of(oid)
+        if kind in (COINCIDENT, DISTANCE) and self.document.kind_of(oid) == "line":
+            return f"{name}.{sub}"
+        return name
+
+    def refresh(self):
+        constraints = self.constraints
+        if constraints is None:
+            self.summary_label.setText("No constraints")
+            self.table.setRowCount(0)
+            return
+        stats = constraints.stats
+        self.summary_label.setText(
+            f"Constraints: {len(constraints)}    Clusters: {len(constraints.clusters())}    "
+            f"Dirty: {len(constraints.dirty)}\n"
+            f"Last solve: {stats.last * 1000:.1f} ms, {stats.iterations} iterations, "
+            f"residual {stats.residual:.2g}")
+        # Constraints on removed objects are switched off, not listed
+        ids = constraints.active()[:MAX_ROWS]
+        residuals = constraints.residuals(ids)
+        self.table.setRowCount(len(ids))
+        for r, (cid, residual) in enumerate(zip(ids.tolist(), residuals.tolist())):
+            kind = int(constraints.kinds[cid])
+            a, b = int(constraints.a[cid]), int(constraints.b[cid])
+            objects = (f"{self._describe(a, int(constraints.a_sub[cid]), kind)}, "
+                       f"{self._describe(b, int(constraints.b_sub[cid]), kind)}")
+            value = f"{constraints.values[cid]:.3f}" if kind in (DISTANCE, ANGLE) else ""
+            for c, text in enumerate([CONSTRAINT_KINDS[kind].capitalize(), objects, value,
+                                      f"{residual:.2g}"]):
+                item = QTableWidgetItem(text)
+                if c >= 2:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(r, c, item)
+            self.table.item(r, 0).setData(Qt.UserRole, cid)
@@ -1,14 +1,59 @@
 from PySide6.QtWidgets import (
-    QWidget, QLabel, QWidget, QLabel
+    QWidget, QLabel, QTableWidget, QTableWidgetItem, QHeaderView, QAbstractItemView
 )
+from PySide6.QtCore import QTimer, Qt
 
+from src.document.store import DocumentStore
+from src.document.modifiers import ModifierGraph
 from src.frames.controller.tab_frame import TabFrame
 
+STATS_COLUMNS = [
+    ("Modifier", "name"),
+    ("Calls", "calls"),
+    ("Hits", "hits"),
+    ("Last ms", "last_ms"),
+    ("Total ms", "total_ms"),
+]
+
 
 class ModifierControllerFrame(TabFrame):
-    def __init__(self, parent: QWidget = None):
-        super().__init__(parent, title="Modifiers")
-        content_label = QLabel("Modifier content here")
-        self.layout.addWidget(content_label)
-        self.layout.addStretch()
+    def __init__(self, parent: QWidget = None, document: DocumentStore = None,
+                 graph: ModifierGraph = None):
+        super().__init__(parent, title="Modifiers", document=document)
+        self.graph = graph
+
+        self.summary_label = QLabel()
+        self.summary_label.setContentsMargins(5, 5, 5, 5)
+        # Above the stretch TabFrame ends with, the table takes the spare height
+        self.layout.insertWidget(2, self.summary_label)
+
+        self.table = QTableWidget(0, len(STATS_COLUMNS))
+        self.table.setHorizontalHeaderLabels([title for title, _ in STATS_COLUMNS])
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.table.verticalHeader().hide()
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.layout.insertWidget(3, self.table, 1)
+
+        # Evaluations can run every frame while dragging, the table need not
+        self._refresh_timer = QTimer(self, singleShot=True, interval=250)
+        self._refresh_timer.timeout.connect(self.refresh)
+        if graph is not None:
+            self.listen(graph, lambda event, *args: self._refresh_timer.start())
+        self.refresh()
 
+    def refresh(self):
+        if self.graph is None:
+            self.summary_label.setText("No modifiers")
+            self.table.setRowCount(0)
+            return
+        rows = self.graph.stats()
+        self.summary_label.setText(
+            f"Modifiers: {len(self.graph.nodes)}    Dirty: {len(self.graph.dirty)}")
+        self.table.setRowCount(len(rows))
+        for r, row in enumerate(rows):
+            for c, (_, key) in enumerate(STATS_COLUMNS):
+                value = row[key]
+                item = QTableWidgetItem(f"{value:.2f}" if isinstance(value, float) else str(value))
+                if c:
+                    item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(r, c, item)
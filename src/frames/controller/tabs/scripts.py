@@ -1,13 +1,111 @@
 from PySide6.QtWidgets import (
-    QWidget, QLabel, QWidget, QLabel
+    QWidget, QLabel, QPlainTextEdit, QPushButton, QHBoxLayout, QApplication
 )
+from PySide6.QtGui import QFontDatabase
 
+from src.document.store import DocumentStore
 from src.frames.controller.tab_frame import TabFrame
+from src.scripting.runner import ScriptRunner, DONE
+
+OUTPUT_LINES = 1000
+
+EXAMPLE_SCRIPT = """\
+# `doc` is the open document, `np` and `math` are available
+t = np.linspace(0, math.tau, 200)
+coords = np.column_stack([400 + 150 * np.cos(t), 300 + 150 * np.sin(t),
+                          np.zeros_like(t), np.zeros_like(t)])
+group = doc.add("group", "Ring")
+doc.add_many("point", [f"P{i}" for i in range(len(t))], coords, parent=group)
+print("Added", len(t), "points")
+"""
 
 
 class ScriptsControllerFrame(TabFrame):
-    def __init__(self, parent: QWidget = None):
-        super().__init__(parent, title="Scripts")
-        content_label = QLabel("Scripts content here")
-        self.layout.addWidget(content_label)
-        self.layout.addStretch()
+    def __init__(self, parent: QWidget = None, document: DocumentStore = None):
+        super().__init__(parent, title="Scripts", document=document)
+        self.job = None
+        fixed = QFontDatabase.systemFont(QFontDatabase.FixedFont)
+
+        self.editor = QPlainTextEdit(EXAMPLE_SCRIPT)
+        self.editor.setFont(fixed)
+        self.layout.insertWidget(2, self.editor, 2)
+
+        buttons = QHBoxLayout()
+        buttons.setContentsMargins(5, 5, 5, 5)
+        self.run_button = QPushButton("Run")
+        self.run_button.clicked.connect(self.run)
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancel)
+        self.cancel_button.setEnabled(False)
+        self.status_label = QLabel()
+        buttons.addWidget(self.run_button)
+        buttons.addWidget(self.cancel_button)
+        buttons.addWidget(self.status_label, 1)
+        self.layout.insertLayout(3, buttons)
+
+        self.output = QPlainTextEdit()
+        self.output.setReadOnly(True)
+        self.output.setFont(fixed)
+        self.output.setMaximumBlockCount(OUTPUT_LINES)
+        self.layout.insertWidget(4, self.output, 1)
+
+        self.runner = None
+        if document is not None:
+            self.runner = ScriptRunner(document, self)
+            self.runner.job_started.connect(self._on_started)
+            self.runner.job_progress.connect(self._on_progress)
+            self.runner.job_output.connect(self._on_output)
+            self.runner.job_finished.connect(self._on_finished)
+            QApplication.instance().aboutToQuit.connect(self.runner.shutdown)
+        else:
+            self.run_button.setEnabled(False)
+
+    def can_release(self) -> bool:
+        return self.runner is None or not self.runner.is_busy()
+
+    def state(self):
+        return self.editor.toPlainText()
+
+    def restore(self, state) -> None:
+        self.editor.setPlainText(state)
+
+    def release(self) -> None:
+        super().release()
+        if self.runner is not None:
+            # Idle workers are whole processes, don't keep them for a hidden tab
+            self.runner.shutdown()
+
+    def run(self):
+        self.output.clear()
+        self.status_label.setText("Starting...")
+        self.run_button.setEnabled(False)
+        self.cancel_button.setEnabled(True)
+        self.job = self.runner.run(self.editor.toPlainText(), name="<editor>")
+
+    def cancel(self):
+        if self.job is not None:
+            self.runner.cancel(self.job)
+
+    def _on_started(self, job: int):
+        if job == self.job:
+            self.status_label.setText("Running")
+
+    def _on_progress(self, job: int, created: int, modified: int):
+        if job == self.job:
+            self.status_label.setText(f"Running: {created} created, {modified} modified")
+
+    def _on_output(self, job: int, text: str):
+        if job == self.job:
+            self.output.appendPlainText(text)
+
+    def _on_finished(self, job: int, status: str, message: str):
+        if job != self.job:
+            return
+        record = self.runner.jobs[job]
+        self.status_label.setText(
+            f"{status.capitalize()}: {record.created} created, {record.modified} modified")
+        if status != DONE:
+            self.output.appendPlainText(message)
+        self.run_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+        self.job = None
@@ -1,13 +1,24 @@
 from PySide6.QtWidgets import (
-    QWidget, QLabel, QWidget, QLabel
+    QWidget, QComboBox, QFormLayout
 )
 
+from src.document.store import DocumentStore
 from src.frames.controller.tab_frame import TabFrame
+from src.utils.theme import theme
 
 
 class SettingsControllerFrame(TabFrame):
-    def __init__(self, parent: QWidget = None):
-        super().__init__(parent, title="Settings")
-        content_label = QLabel("Settings content here")
-        self.layout.addWidget(content_label)
-        self.layout.addStretch()
+    def __init__(self, parent: QWidget = None, document: DocumentStore = None):
+        super().__init__(parent, title="Settings", document=document)
+        form = QFormLayout()
+        form.setContentsMargins(5, 5, 5, 5)
+        self.theme_box = QComboBox()
+        self.theme_box.addItems([name.capitalize() for name in theme.names()])
+        if theme.name is not None:
+            self.theme_box.setCurrentIndex(theme.names().index(theme.name))
+        self.theme_box.currentIndexChanged.connect(
+            lambda index: theme.apply(theme.names()[index]))
+        form.addRow("Theme", self.theme_box)
+        self.form = QWidget()
+        self.form.setLayout(form)
+        self.layout.insertWidget(2, self.form)
@@ -0,0 +1,52 @@
+import os
+import threading
+from PySide6.QtWidgets import QWidget, QProgressDialog, QMessageBox
+from PySide6.QtCore import Qt, QTimer
+
+from src.render.export import Exporter, ExportCancelled
+import src.utils.logger as logger
+
+POLL_MS = 100
+
+
+class ExportProgress(QProgressDialog):
+    """Runs an Exporter on a background thread behind a modal progress dialog"""
+
+    def __init__(self, exporter: Exporter, parent: QWidget = None):
+        super().__init__(f"Exporting {os.path.basename(exporter.path)}...", "Cancel", 0, 0, parent)
+        self.setWindowTitle("Export")
+        self.setWindowModality(Qt.WindowModal)
+        self.setMinimumDuration(300)
+        self.setAutoReset(False)
+        self.exporter = exporter
+        self.error: BaseException = None
+        self.canceled.connect(exporter.cancel)
+        self._thread = threading.Thread(target=self._run, name="export", daemon=True)
+        self._timer = QTimer(self, interval=POLL_MS)
+        self._timer.timeout.connect(self._poll)
+
+    def start(self) -> None:
+        self._thread.start()
+        self._timer.start()
+
+    def _run(self) -> None:
+        try:
+            self.exporter.run()
+        except BaseException as e:
+            self.error = e
+
+    def _poll(self) -> None:
+        exporter = self.exporter
+        if exporter.total:
+            self.setMaximum(exporter.total)
+            self.setValue(exporter.done)
+        if self._thread.is_alive():
+            return
+        self._timer.stop()
+        self.reset()
+        if isinstance(self.error, ExportCancelled):
+            logger.info("Export to %s cancelled", exporter.path)
+        elif self.error is not None:
+            logger.error("Export to %s failed: %s", exporter.path, self.error)
+            QMessageBox.critical(self.parent(), "Export failed", str(self.error))
+        self.deleteLater()
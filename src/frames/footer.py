@@ -7,7 +7,11 @@ class Footer(QFrame):
     def __init__(self, parent: QWidget = None):
         super().__init__(parent)
         self.layout = QHBoxLayout(self)
-        label = QLabel("Whoa")
-        label.setContentsMargins(0, 0, 0, 0)
-        self.layout.addWidget(label)
+        self.label = QLabel()
+        self.label.setContentsMargins(0, 0, 0, 0)
+        self.layout.addWidget(self.label, 1)
         self.layout.setContentsMargins(0, 0, 0, 0)
+
+    def add_widget(self, widget: QWidget) -> None:
+        """Show a widget at the right end of the footer"""
+        self.layout.addWidget(widget)
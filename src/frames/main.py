@@ -1,29 +1,83 @@
-import configparser
+import math
+import os
 from PySide6.QtWidgets import (
-    QMainWindow, QWidget, QVBoxLayout, QSplitter, QToolBar, QMenuBar, QLabel, QStatusBar
+    QMainWindow, QWidget, QVBoxLayout, QSplitter, QToolBar, QMenuBar, QLabel, QStatusBar,
+    QFileDialog, QMessageBox, QInputDialog
 )
-from PySide6.QtGui import QIcon, QAction
-from PySide6.QtCore import QSize, Qt
+from PySide6.QtGui import QIcon, QAction, QKeySequence
+from PySide6.QtCore import QSize, Qt, QTimer
 
+from src.document.store import DocumentStore
+from src.document.parametric import ParametricEngine
+from src.document.modifiers import ModifierGraph
+from src.document.constraints import ConstraintSystem
+from src.document.fileformat import DocumentFile, EXTENSION
+from src.document.history import History
 from src.frames.canvas import CanvasFrame
 from src.frames.controller import ControllerFrame
+from src.frames.export import ExportProgress
 from src.frames.footer import Footer
 from src.frames.tool import ToolFrame
+from src.render.export import Exporter, ExportError
+from src.utils.config import config
 from src.utils.os import resource_path
 
-config = configparser.ConfigParser()
-config.read(resource_path('config.ini'))
+
+EXPORT_FILTERS = {
+    "PNG image (*.png)": ".png",
+    "SVG drawing (*.svg)": ".svg",
+    "PDF document (*.pdf)": ".pdf",
+}
 
 
 class MainWindow(QMainWindow):
     def __init__(self, parent: QWidget = None):
         super().__init__(parent)
-        self.setWindowTitle(
-            f"{config.get('app', 'name')} V.{config.get('app', 'version')}")
         self.resize(1200, 800)
         icon = QIcon(resource_path("icon.ico"))
         self.setWindowIcon(icon)
 
+        # Every panel reads from this one store
+        self.document = DocumentStore()
+        self.curves = ParametricEngine(self.document)
+        self.modifiers = ModifierGraph(self.document)
+        # Edits mark modifiers dirty; they are recomputed once per event loop pass
+        self._modifier_timer = QTimer(self, singleShot=True, interval=0)
+        self._modifier_timer.timeout.connect(self._evaluate_modifiers)
+        self.modifiers.schedule = self._modifier_timer.start
+        self.constraints = ConstraintSystem(self.document)
+        self._build_document(self.document)
+        self.file = DocumentFile(self.document)
+        self.file.modified = False
+        self._update_title()
+
+        # Edits made during one event loop pass become one undo step
+        self.history = History(
+            self.document, config.getint('history', 'max_memory_mb', fallback=256) * 2 ** 20)
+        self._history_timer = QTimer(self, singleShot=True, interval=0)
+        self._history_timer.timeout.connect(self._commit_edits)
+        self.history.schedule = self._history_timer.start
+        # Constraints are solved just before the step is committed, so their
+        # fixes undo together with the edit that caused them
+        self.constraints.schedule = self._history_timer.start
+        self.history.subscribe(lambda event: self._update_history_actions())
+
+        self.new_action = QAction(QIcon.fromTheme("document-new"), "New", self,
+                                  shortcut=QKeySequence.New, triggered=self.new_document)
+        self.open_action = QAction(QIcon.fromTheme("document-open"), "Open...", self,
+                                   shortcut=QKeySequence.Open, triggered=self.open_document)
+        self.save_action = QAction(QIcon.fromTheme("document-save"), "Save", self,
+                                   shortcut=QKeySequence.Save, triggered=self.save_document)
+        self.save_as_action = QAction("Save As...", self, shortcut=QKeySequence.SaveAs,
+                                      triggered=self.save_document_as)
+        self.export_action = QAction("Export...", self, shortcut="Ctrl+E",
+                                     triggered=self.export_document)
+        self.undo_action = QAction("Undo", self, shortcut=QKeySequence.Undo,
+                                   triggered=self.history.undo)
+        self.redo_action = QAction("Redo", self, shortcut=QKeySequence.Redo,
+                                   triggered=self.history.redo)
+        self._update_history_actions()
+
         # Menu Bar
         menubar = self.menuBar()
         self._build_menus(menubar)
@@ -33,12 +87,9 @@ class MainWindow(QMainWindow):
         ribbon.setToolButtonStyle(Qt.ToolButtonTextBesideIcon)
         self.addToolBar(Qt.TopToolBarArea, ribbon)
 
-        new_act = QAction(QIcon.fromTheme("document-new"), "New", self)
-        open_act = QAction(QIcon.fromTheme("document-open"), "Open", self)
-        save_act = QAction(QIcon.fromTheme("document-save"), "Save", self)
-        ribbon.addAction(new_act)
-        ribbon.addAction(open_act)
-        ribbon.addAction(save_act)
+        ribbon.addAction(self.new_action)
+        ribbon.addAction(self.open_action)
+        ribbon.addAction(self.save_action)
         ribbon.addSeparator()
         ribbon.addWidget(QLabel("Mode:"))
         ribbon.addAction(QAction("Select", self))
@@ -52,39 +103,166 @@ class MainWindow(QMainWindow):
         self.central.setLayout(self.layout)
 
         self.splitter = QSplitter()
-        for i, p in enumerate([ToolFrame, CanvasFrame, ControllerFrame]):
-            self.splitter.addWidget(p(self))
+        self.tool = ToolFrame(self)
+        self.canvas = CanvasFrame(self, document=self.document)
+        self.controller = ControllerFrame(self, document=self.document, modifiers=self.modifiers,
+                                          history=self.history, constraints=self.constraints)
+        for i, p in enumerate([self.tool, self.canvas, self.controller]):
+            self.splitter.addWidget(p)
             self.splitter.setStretchFactor(i, 0)
         self.layout.addWidget(self.splitter)
+        self.tool.tool_selected.connect(self.canvas.set_tool)
 
-        footer = Footer()
-        self.layout.addWidget(footer)
+        self.footer = Footer()
+        self.layout.addWidget(self.footer)
     
+    def closeEvent(self, event):
+        self.modifiers.shutdown()
+        self.constraints.shutdown()
+        self.canvas.tiles.shutdown()
+        super().closeEvent(event)
+
     def _build_menus(self, menubar: QMenuBar):
         # File menu
         file_menu = menubar.addMenu("&File")
-        file_menu.addAction(QAction("New", self))
-        file_menu.addAction(QAction("Open...", self))
-        file_menu.addAction(QAction("Save", self))
+        file_menu.addAction(self.new_action)
+        file_menu.addAction(self.open_action)
+        file_menu.addAction(self.save_action)
+        file_menu.addAction(self.save_as_action)
+        file_menu.addAction(self.export_action)
         file_menu.addSeparator()
         file_menu.addAction(QAction("Exit", self, triggered=self.close))
 
         # Edit menu
         edit_menu = menubar.addMenu("&Edit")
-        edit_menu.addAction(QAction("Undo", self))
-        edit_menu.addAction(QAction("Redo", self))
+        edit_menu.addAction(self.undo_action)
+        edit_menu.addAction(self.redo_action)
         edit_menu.addSeparator()
         edit_menu.addAction(QAction("Cut", self))
         edit_menu.addAction(QAction("Copy", self))
         edit_menu.addAction(QAction("Paste", self))
 
         # View menu
-        view_menu = menubar.addMenu("&View")
-        view_menu.addAction(QAction("Zoom In", self))
-        view_menu.addAction(QAction("Zoom Out", self))
-        view_menu.addAction(QAction("Reset View", self))
+        view_menu = self.view_menu = menubar.addMenu("&View")
+        # The canvas is built after the menus
+        view_menu.addAction(QAction("Zoom In", self, shortcut=QKeySequence.ZoomIn,
+                                    triggered=lambda: self.canvas.zoom_in()))
+        view_menu.addAction(QAction("Zoom Out", self, shortcut=QKeySequence.ZoomOut,
+                                    triggered=lambda: self.canvas.zoom_out()))
+        view_menu.addAction(QAction("Reset View", self, shortcut="Ctrl+0",
+                                    triggered=lambda: self.canvas.reset_view()))
 
         # Help
         help_menu = menubar.addMenu("&Help")
         help_menu.addAction(QAction("About", self))
 
+    def _evaluate_modifiers(self):
+        # Modifier results follow from the edits already in the history
+        with self.history.paused():
+            self.modifiers.evaluate()
+
+    def _commit_edits(self):
+        self.constraints.solve()
+        self.history.commit()
+
+    def _update_history_actions(self):
+        if not hasattr(self, "undo_action"):
+            return
+        undo, redo = self.history.undo_title(), self.history.redo_title()
+        self.undo_action.setText(f"Undo {undo}" if undo else "Undo")
+        self.undo_action.setEnabled(bool(undo))
+        self.redo_action.setText(f"Redo {redo}" if redo else "Redo")
+        self.redo_action.setEnabled(bool(redo))
+
+    def presence_activity(self) -> dict:
+        """What Discord shows while this window is open"""
+        name = os.path.basename(self.file.path) if self.file.path else "Untitled"
+        return {"details": f"Editing {name}", "state": f"{len(self.document)} objects"}
+
+    # Files
+
+    def _update_title(self):
+        title = f"{config.get('app', 'name')} V.{config.get('app', 'version')}"
+        if self.file.path:
+            title += f" - {os.path.basename(self.file.path)}"
+        self.setWindowTitle(title)
+
+    def _confirm_discard(self) -> bool:
+        if not self.file.modified:
+            return True
+        answer = QMessageBox.question(
+            self, "Unsaved changes", "Discard the changes to the current document?",
+            QMessageBox.Discard | QMessageBox.Cancel)
+        return answer == QMessageBox.Discard
+
+    def new_document(self):
+        if self._confirm_discard():
+            self.file.new()
+            self._update_title()
+
+    def open_document(self):
+        if not self._confirm_discard():
+            return
+        path, _ = QFileDialog.getOpenFileName(
+            self, "Open", "", f"Tordie documents (*{EXTENSION});;All files (*)")
+        if not path:
+            return
+        try:
+            self.file.open(path)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Open failed", str(e))
+        self._update_title()
+
+    def save_document(self) -> bool:
+        if self.file.path is None:
+            return self.save_document_as()
+        return self._save(self.file.path)
+
+    def save_document_as(self) -> bool:
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Save As", "", f"Tordie documents (*{EXTENSION})")
+        if not path:
+            return False
+        if not path.endswith(EXTENSION):
+            path += EXTENSION
+        return self._save(path)
+
+    def _save(self, path: str) -> bool:
+        try:
+            self.file.save(path)
+        except OSError as e:
+            QMessageBox.critical(self, "Save failed", str(e))
+            return False
+        self._update_title()
+        return True
+
+    def export_document(self):
+        path, selected = QFileDialog.getSaveFileName(
+            self, "Export", "", ";;".join(EXPORT_FILTERS))
+        if not path:
+            return
+        if not os.path.splitext(path)[1]:
+            path += EXPORT_FILTERS.get(selected, ".png")
+        scale = 1.0
+        if path.lower().endswith(".png"):
+            scale, ok = QInputDialog.getDouble(
+                self, "Export", "Pixels per unit:", config.getfloat('export', 'scale', fallback=4.0),
+                0.01, 1000.0, 2)
+            if not ok:
+                return
+        try:
+            exporter = Exporter(self.document, path, scale=scale,
+                                workers=config.getint('export', 'workers', fallback=0) or None)
+        except ExportError as e:
+            QMessageBox.critical(self, "Export failed", str(e))
+            return
+        ExportProgress(exporter, self).start()
+
+    def _build_document(self, document: DocumentStore):
+        document.add("point", "Item 1", (100, 100, 0, 0))
+        document.add("line", "Item 2", (150, 100, 300, 200))
+        document.add("circle", "Item 3", (400, 300, 50, 0))
+        curve = document.add("parametric", "Item 4")
+        document.set_expression(curve, "600 + 100 * cos(t)", "300 + 100 * sin(t)", 0, math.tau)
+        document.add("default", "Item 5")
+        document.add("group", "Item 6")
@@ -0,0 +1,172 @@
+import time
+from PySide6.QtWidgets import (
+    QWidget, QLabel, QDockWidget, QVBoxLayout, QHBoxLayout, QPushButton, QScrollArea,
+    QFileDialog, QSizePolicy
+)
+from PySide6.QtGui import QPainter
+from PySide6.QtCore import Qt, QObject, QTimer, QSize
+
+from src.document.parametric import tessellation_cache
+from src.utils.icons import icon_cache
+from src.utils.metrics import metrics
+from src.utils.os import rss_bytes
+import src.utils.logger as logger
+
+REFRESH_MS = 500
+LATENCY_PROBE_MS = 100
+HISTOGRAM_BINS = 24
+
+
+class LatencyProbe(QObject):
+    """Measures how late a repeating timer fires, i.e. how long events wait"""
+
+    def __init__(self, parent: QObject = None, interval_ms: int = LATENCY_PROBE_MS):
+        super().__init__(parent)
+        self.interval = interval_ms / 1000
+        self._expected = 0.0
+        self._timer = QTimer(self, interval=interval_ms)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.timeout.connect(self._tick)
+
+    def start(self) -> None:
+        self._expected = time.perf_counter() + self.interval
+        self._timer.start()
+
+    def _tick(self) -> None:
+        now = time.perf_counter()
+        metrics.record("event_loop.latency", max(0.0, now - self._expected))
+        self._expected = now + self.interval
+
+
+def instrument(window) -> None:
+    """Register the gauges of a MainWindow and start measuring"""
+    logger.add_span_listener(metrics.record)
+    metrics.gauge("document.objects", lambda: len(window.document))
+    metrics.gauge("scene.items", lambda: len(window.canvas.scene().items()))
+    metrics.gauge("icons.hit_rate", lambda: icon_cache.stats()["hit_rate"])
+    metrics.gauge("tessellation.hit_rate", lambda: tessellation_cache.stats()["hit_rate"])
+    metrics.gauge("tiles.hit_rate", lambda: window.canvas.tiles.stats()["hit_rate"])
+    metrics.gauge("tiles.bytes", lambda: window.canvas.tiles.nbytes)
+    metrics.gauge("history.bytes", lambda: window.history.nbytes)
+    metrics.gauge("process.rss", rss_bytes)
+    window._latency_probe = LatencyProbe(window)
+    window._latency_probe.start()
+
+
+def _ms(name: str) -> str:
+    timing = metrics.timings.get(name)
+    return f"{timing.summary()['last_ms']:.1f}" if timing is not None and timing.count else "-"
+
+
+def _percent(value) -> str:
+    return "-" if value is None else f"{value * 100:.0f}%"
+
+
+class PerformanceHUD(QLabel):
+    """One line summary of the metrics for the footer"""
+
+    def __init__(self, parent: QWidget = None):
+        super().__init__(parent)
+        self.setObjectName("performance_hud")
+        self._timer = QTimer(self, interval=REFRESH_MS)
+        self._timer.timeout.connect(self.refresh)
+        self._timer.start()
+        self.refresh()
+
+    def refresh(self):
+        rss = metrics.value("process.rss") or 0
+        self.setText(
+            f"paint {_ms('canvas.paint')} ms  |  "
+            f"latency {_ms('event_loop.latency')} ms  |  "
+            f"{metrics.value('document.objects') or 0} objects  |  "
+            f"{metrics.value('scene.items') or 0} items  |  "
+            f"icons {_percent(metrics.value('icons.hit_rate'))}  "
+            f"curves {_percent(metrics.value('tessellation.hit_rate'))}  "
+            f"tiles {_percent(metrics.value('tiles.hit_rate'))}  |  "
+            f"RSS {rss / 2 ** 20:.0f} MiB")
+
+
+class Histogram(QWidget):
+    def __init__(self, name: str, parent: QWidget = None):
+        super().__init__(parent)
+        self.name = name
+        self.setMinimumHeight(60)
+        self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+
+    def sizeHint(self):
+        return QSize(240, 60)
+
+    def paintEvent(self, event):
+        timing = metrics.timings.get(self.name)
+        if timing is None:
+            return
+        counts, edges = timing.histogram(HISTOGRAM_BINS)
+        painter = QPainter(self)
+        palette = self.palette()
+        painter.fillRect(self.rect(), palette.base())
+        width = self.width() / len(counts)
+        height = self.height() - 14
+        top = max(int(counts.max()), 1)
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(palette.highlight())
+        for i, count in enumerate(counts):
+            h = height * count / top
+            painter.drawRect(int(i * width), int(14 + height - h), max(1, int(width) - 1), int(h))
+        painter.setPen(palette.text().color())
+        summary = timing.summary()
+        painter.drawText(2, 11, f"{self.name}  p50 {summary['p50_ms']:.1f}  "
+                                f"p95 {summary['p95_ms']:.1f}  max {edges[-1]:.1f} ms")
+        painter.end()
+
+
+class PerformancePanel(QDockWidget):
+    """Rolling histograms of every timing, plus a JSON dump of all metrics"""
+
+    def __init__(self, parent: QWidget = None):
+        super().__init__("Performance", parent)
+        self.setObjectName("performance")
+        self.histograms: dict[str, Histogram] = {}
+
+        body = QWidget()
+        self.rows = QVBoxLayout(body)
+        self.rows.setContentsMargins(5, 5, 5, 5)
+        self.rows.addStretch()
+        scroll = QScrollArea()
+        scroll.setWidgetResizable(True)
+        scroll.setWidget(body)
+
+        buttons = QHBoxLayout()
+        dump = QPushButton("Dump JSON...")
+        dump.clicked.connect(self.dump)
+        reset = QPushButton("Reset")
+        reset.clicked.connect(metrics.clear)
+        buttons.addWidget(dump)
+        buttons.addWidget(reset)
+        buttons.addStretch()
+
+        container = QWidget()
+        layout = QVBoxLayout(container)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(scroll, 1)
+        layout.addLayout(buttons)
+        self.setWidget(container)
+
+        self._timer = QTimer(self, interval=REFRESH_MS)
+        self._timer.timeout.connect(self.refresh)
+        self._timer.start()
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+        for name in sorted(metrics.timings):
+            if name not in self.histograms:
+                self.histograms[name] = Histogram(name)
+                self.rows.insertWidget(self.rows.count() - 1, self.histograms[name])
+        for histogram in self.histograms.values():
+            histogram.update()
+
+    def dump(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Dump metrics", "metrics.json", "JSON (*.json)")
+        if path:
+            metrics.dump(path)
+            logger.success("Metrics written to %s", path)
@@ -1,14 +1,11 @@
 from PySide6.QtWidgets import QWidget, QLabel, QVBoxLayout
 from PySide6.QtSvgWidgets import QSvgWidget
 from PySide6.QtGui import QFont
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer, QByteArray, QBuffer
 from PySide6.QtGui import QFont
 from PySide6.QtGui import QMovie
-import configparser
-from src.utils.os import resource_path
-
-config = configparser.ConfigParser()
-config.read(resource_path('config.ini'))
+from src.utils.config import config
+from src.utils.assets import assets
 
 
 class SplashScreen(QWidget):
@@ -17,32 +14,42 @@ class SplashScreen(QWidget):
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
         self.setAttribute(Qt.WA_TranslucentBackground)
 
-        self.svg = QSvgWidget(resource_path("src/assets/vectors/splashscreen.svg"), self)
+        self.svg = QSvgWidget(self)
+        self.svg.load(QByteArray(assets.data("src/assets/vectors/splashscreen.svg")))
         self.svg.resize(400, 300)
-        self.svg.setStyleSheet("background-color: white; border-radius: 15px;")
+        self.svg.setObjectName("splash_art")
 
         self.label = QLabel("TORDIE 6", self)
         self.label.setFont(QFont("Bahnschrift", 24))
-        self.label.setStyleSheet("color: black;")
+        self.label.setObjectName("splash_title")
         self.label.adjustSize()
         self.label.move(204, 243)
 
         self.sublabel = QLabel(
             f"Loading {config.get('app', 'name')} Version {config.get('app', 'version')} ...", self)
         self.sublabel.setFont(QFont("Roboto", 10))
-        self.sublabel.setStyleSheet("color: gray;")
+        self.sublabel.setObjectName("splash_version")
         self.sublabel.adjustSize()
 
+        # The spinner is only decoded once the event loop runs with the splash
+        # still up, so a fast startup never pays for it
         self.spinner = QLabel(self)
-        spinner_movie = QMovie(resource_path("src/assets/gifs/loading.gif"))
-        self.spinner.setMovie(spinner_movie)
-        spinner_movie.start()
+        QTimer.singleShot(0, self._start_spinner)
         self.spinner.move(347, 247)
         self.spinner.setFixedSize(40, 40)
         self.spinner.setScaledContents(True)
 
         self.resize(400, 300)
 
+    def _start_spinner(self):
+        if not self.isVisible():
+            return
+        self._spinner_data = QBuffer(self)
+        self._spinner_data.setData(QByteArray(assets.data("src/assets/gifs/loading.gif")))
+        spinner_movie = QMovie(self._spinner_data, QByteArray(), self)
+        self.spinner.setMovie(spinner_movie)
+        spinner_movie.start()
+
     def showEvent(self, event):
         super().showEvent(event)
         label_right = self.label.x() + self.label.width()
@@ -1,12 +1,14 @@
 from PySide6.QtWidgets import (
-    QWidget, QFrame, QVBoxLayout, QLabel, QPushButton, QSizePolicy, QStyle
+    QWidget, QFrame, QVBoxLayout, QLabel, QPushButton, QSizePolicy, QStyle, QButtonGroup
 )
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, Signal
 
 import src.utils.logger as logger
 
 
 class ToolFrame(QFrame):
+    tool_selected = Signal(str)
+
     TOOLS = [
         {"icon": None, "title": "Select", },
         {"icon": None, "title": "Pen", },
@@ -21,9 +23,18 @@ class ToolFrame(QFrame):
         self.setLayout(layout)
 
         layout.addWidget(QLabel("Tools", alignment=Qt.AlignCenter))
+        self.buttons = QButtonGroup(self)
         for tool in self.TOOLS:
-            btn = QPushButton(tool['title'])
+            btn = QPushButton(tool['title'], checkable=True)
             btn.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
-            btn.clicked.connect(
-                lambda checked, t=tool['title']: logger.info(f"{t} mode selected"))
+            btn.clicked.connect(lambda checked, t=tool['title']: self.select(t))
+            self.buttons.addButton(btn)
             layout.addWidget(btn)
+        self.buttons.buttons()[0].setChecked(True)
+
+    def select(self, title: str):
+        for button in self.buttons.buttons():
+            if button.text() == title:
+                button.setChecked(True)
+        logger.info("%s mode selected", title)
+        self.tool_selected.emit(title)
@@ -0,0 +1,228 @@
+from collections import OrderedDict
+import ctypes
+import numpy as np
+import shiboken6
+from PySide6.QtGui import QPainter, QPainterPath, QPen, QPolygonF, QColor, QImage
+from PySide6.QtCore import QByteArray, QDataStream, QPointF, Qt
+
+from src.document.store import DocumentStore, KIND_IDS
+from src.document.parametric import tessellate
+
+POINT_SIZE_PX = 4
+# Objects smaller than this many device pixels collapse to a single dot
+SUBPIXEL_PX = 1.0
+# Labels only appear once zoomed in and when there are few enough to read
+LABEL_MIN_SCALE = 1.0
+LABEL_MAX_COUNT = 500
+PATH_CACHE_SIZE = 8
+# Largest distance a curve's polyline may stray from the true curve
+CURVE_TOLERANCE_PX = 0.25
+# Past this many collapsed objects it is cheaper to splat them into an image
+RASTER_DOTS_MIN = 20000
+
+MOVE_TO, LINE_TO, CURVE_TO, CURVE_DATA = 0, 1, 2, 3
+
+_K = 0.5522847498307936
+# One circle as Qt stores it: a move plus four cubic quarter arcs
+CIRCLE_TYPES = np.array([MOVE_TO] + [CURVE_TO, CURVE_DATA, CURVE_DATA] * 4, np.int32)
+CIRCLE_OFFSETS = np.array([
+    (1, 0), (1, _K), (_K, 1), (0, 1), (-_K, 1), (-1, _K), (-1, 0),
+    (-1, -_K), (-_K, -1), (0, -1), (_K, -1), (1, -_K), (1, 0),
+])
+
+_ELEMENT = np.dtype([("type", ">i4"), ("x", ">f8"), ("y", ">f8")])
+
+
+def path_from_elements(types: np.ndarray, xy: np.ndarray) -> QPainterPath:
+    """Build a QPainterPath from element types and points in one call.
+
+    The arrays are laid out in QDataStream's serialized QPainterPath format
+    and read back, which avoids one Python call per path element.
+    """
+    n = len(types)
+    path = QPainterPath()
+    if n == 0:
+        return path
+    raw = np.empty(n, _ELEMENT)
+    raw["type"] = types
+    raw["x"] = xy[:, 0]
+    raw["y"] = xy[:, 1]
+    header = np.array([n], ">i4").tobytes()
+    # Trailer is the start of the current subpath and the fill rule
+    trailer = np.array([0, int(Qt.OddEvenFill.value)], ">i4").tobytes()
+    data = QByteArray(header + raw.tobytes() + trailer)
+    stream = QDataStream(data)
+    stream >> path
+    return path
+
+
+def polylines_path(polylines: list[np.ndarray]) -> QPainterPath:
+    """One path holding every polyline; NaN rows split a polyline in two"""
+    polylines = [p for p in polylines if len(p)]
+    if not polylines:
+        return QPainterPath()
+    xy = np.concatenate(polylines)
+    starts = np.cumsum([0] + [len(p) for p in polylines[:-1]])
+    types = np.full(len(xy), LINE_TO, np.int32)
+    types[starts] = MOVE_TO
+    gap = ~np.isfinite(xy).all(axis=1)
+    after_gap = np.flatnonzero(gap[:-1]) + 1
+    types[after_gap] = MOVE_TO
+    return path_from_elements(types[~gap], xy[~gap])
+
+
+def _select(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """values[mask], skipping the copy when the mask keeps everything or nothing"""
+    count = np.count_nonzero(mask)
+    if count == len(mask):
+        return values
+    if count == 0:
+        return values[:0]
+    return values[np.flatnonzero(mask)]
+
+
+def circles_path(centres: np.ndarray, radii: np.ndarray) -> QPainterPath:
+    xy = centres[:, None, :] + CIRCLE_OFFSETS[None, :, :] * radii[:, None, None]
+    types = np.tile(CIRCLE_TYPES, len(centres))
+    return path_from_elements(types, xy.reshape(-1, 2))
+
+
+class BatchRenderer:
+    """Draws whole primitive classes with a handful of QPainter calls.
+
+    Points go through drawPointsNp, segments through one drawLines call over
+    a QPolygonF whose storage is filled directly from NumPy, and circles
+    through cached QPainterPaths. A renderer keeps scratch buffers, so each
+    painting thread needs its own instance.
+    """
+
+    def __init__(self):
+        self._polygon = QPolygonF()
+        self._buffer = np.zeros((0, 2))
+        self._paths: OrderedDict[tuple, QPainterPath] = OrderedDict()
+        self.path_hits = 0
+        self.path_misses = 0
+
+    def paint(self, painter: QPainter, document: DocumentStore, ids: np.ndarray,
+              scale: float, color: QColor = QColor(Qt.black), labels: bool = True) -> None:
+        """Paint ids at scale device pixels per scene unit"""
+        if not len(ids):
+            return
+        coords = document.coords[ids]
+        kinds = document.kinds[ids]
+        subpixel = SUBPIXEL_PX / max(scale, 1e-12)
+        dots = []
+
+        painter.setBrush(Qt.NoBrush)
+        painter.setPen(QPen(color, 0))
+
+        segment = kinds == KIND_IDS["line"]
+        if segment.any():
+            c = _select(coords, segment)
+            tiny = np.maximum(np.abs(c[:, 2] - c[:, 0]), np.abs(c[:, 3] - c[:, 1])) < subpixel
+            dots.append(_select(c[:, :2], tiny))
+            self.draw_lines(painter, _select(c, ~tiny))
+
+        circle = kinds == KIND_IDS["circle"]
+        if circle.any():
+            c = _select(coords, circle)
+            tiny = np.abs(c[:, 2]) < subpixel
+            dots.append(_select(c[:, :2], tiny))
+            shown = _select(ids, circle)[~tiny]
+            if len(shown):
+                painter.drawPath(self._circles(document, shown, _select(c, ~tiny)))
+
+        curve = kinds == KIND_IDS["parametric"]
+        if curve.any():
+            c = _select(coords, curve)
+            tiny = np.maximum(c[:, 2] - c[:, 0], c[:, 3] - c[:, 1]) < subpixel
+            dots.append(_select(c[:, :2], tiny))
+            shown = _select(ids, curve)[~tiny]
+            if len(shown):
+                tolerance = CURVE_TOLERANCE_PX / max(scale, 1e-12)
+                painter.drawPath(polylines_path(
+                    [tessellate(document, oid, tolerance) for oid in shown.tolist()]))
+
+        if dots:
+            self.draw_dots(painter, np.concatenate(dots), color)
+
+        point = kinds == KIND_IDS["point"]
+        if point.any():
+            painter.setPen(QPen(color, POINT_SIZE_PX, Qt.SolidLine, Qt.RoundCap))
+            self.draw_points(painter, coords[point, :2])
+
+        if labels and scale >= LABEL_MIN_SCALE and len(ids) <= LABEL_MAX_COUNT:
+            self.draw_labels(painter, document, ids, coords, scale, color)
+
+    def draw_points(self, painter: QPainter, xy: np.ndarray) -> None:
+        if len(xy):
+            painter.drawPointsNp(np.ascontiguousarray(xy[:, 0]), np.ascontiguousarray(xy[:, 1]))
+
+    def draw_dots(self, painter: QPainter, xy: np.ndarray, color: QColor) -> None:
+        """Draw collapsed objects as single device pixels.
+
+        Large batches are splatted into an image the size of the device and
+        blitted once, so the cost no longer depends on how many objects share
+        a pixel.
+        """
+        if len(xy) < RASTER_DOTS_MIN:
+            self.draw_points(painter, xy)
+            return
+        device = painter.device()
+        width, height = device.width(), device.height()
+        t = painter.worldTransform()
+        px = np.floor(xy[:, 0] * t.m11() + xy[:, 1] * t.m21() + t.dx()).astype(np.int64)
+        py = np.floor(xy[:, 0] * t.m12() + xy[:, 1] * t.m22() + t.dy()).astype(np.int64)
+        inside = (px >= 0) & (px < width) & (py >= 0) & (py < height)
+
+        pixels = np.zeros((height, width), np.uint32)
+        pixels[py[inside], px[inside]] = QColor(color).rgba()
+        image = QImage(pixels.data, width, height, QImage.Format_ARGB32_Premultiplied)
+        painter.save()
+        painter.resetTransform()
+        painter.drawImage(0, 0, image)
+        painter.restore()
+
+    def draw_lines(self, painter: QPainter, segments: np.ndarray) -> None:
+        """Draw (n, 4) segments x1, y1, x2, y2 in a single drawLines call"""
+        n = len(segments)
+        if n == 0:
+            return
+        first = self._reserve(2 * n)
+        self._buffer[:2 * n] = segments.reshape(-1, 2)
+        painter.drawLines(first, n)
+
+    def draw_labels(self, painter: QPainter, document: DocumentStore, ids: np.ndarray,
+                    coords: np.ndarray, scale: float, color: QColor) -> None:
+        painter.save()
+        painter.setPen(color)
+        # Labels keep a constant on-screen size regardless of zoom
+        painter.scale(1 / scale, 1 / scale)
+        for oid, (x, y) in zip(ids.tolist(), coords[:, :2].tolist()):
+            painter.drawText(QPointF(x * scale + POINT_SIZE_PX, y * scale - POINT_SIZE_PX),
+                             document.name_of(oid))
+        painter.restore()
+
+    def _reserve(self, points: int) -> QPointF:
+        """First element of a QPolygonF with room for points, mirrored by self._buffer"""
+        if len(self._buffer) < points:
+            self._polygon = QPolygonF()
+            self._polygon.resize(max(points, 2 * len(self._buffer)))
+            address = shiboken6.getCppPointer(self._polygon.data())[0]
+            storage = (ctypes.c_double * (2 * len(self._polygon))).from_address(address)
+            self._buffer = np.frombuffer(storage, np.float64).reshape(-1, 2)
+        return self._polygon.data()
+
+    def _circles(self, document: DocumentStore, ids: np.ndarray, coords: np.ndarray) -> QPainterPath:
+        key = ("circles", document.version, hash(ids.tobytes()))
+        path = self._paths.get(key)
+        if path is not None:
+            self.path_hits += 1
+            self._paths.move_to_end(key)
+            return path
+        self.path_misses += 1
+        path = circles_path(coords[:, :2], np.abs(coords[:, 2]))
+        self._paths[key] = path
+        while len(self._paths) > PATH_CACHE_SIZE:
+            self._paths.popitem(last=False)
+        return path
@@ -0,0 +1,300 @@
+"""Final render of a document to PNG, SVG or PDF.
+
+Only live objects with the render flag set are drawn. PNG output is split
+into bands of tiles: the tiles of a band are rasterized on a thread pool
+while the previous band is filtered and deflated straight into the file,
+so a 20k x 20k image never exists in memory as a whole. SVG and PDF are
+vector output from a single painter, drawn in chunks so they can report
+progress and be cancelled too.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+import math
+import os
+import struct
+import threading
+import zlib
+import numpy as np
+from PySide6.QtGui import QColor, QImage, QPainter, QPageSize, QPdfWriter, QTransform
+from PySide6.QtCore import QMarginsF, QRect, QRectF, QSize, QSizeF, Qt
+
+from src.document.store import DocumentStore, FLAG_RENDER
+from src.render.batch import BatchRenderer, POINT_SIZE_PX
+import src.utils.logger as logger
+
+FORMATS = (".png", ".svg", ".pdf")
+PAGE_RECT = QRectF(0, 0, 800, 600)
+TILE_PX = 512
+# Bands rendered ahead of the one being written
+BANDS_AHEAD = 1
+VECTOR_CHUNK = 10000
+PNG_COMPRESSION = 6
+PNG_CHUNK_BYTES = 1 << 20
+MAX_PIXELS = 1 << 31
+
+
+class ExportError(ValueError):
+    pass
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def render_ids(document: DocumentStore) -> np.ndarray:
+    """Ids of the objects a final render includes, groups passing their flag down"""
+    return np.flatnonzero(document.shown(flag=FLAG_RENDER)).astype(np.int32)
+
+
+def export_rect(document: DocumentStore, ids: np.ndarray) -> QRectF:
+    """The page, grown to take in everything that is rendered"""
+    boxes = document.bounds(ids)
+    boxes = boxes[np.isfinite(boxes).all(axis=1)]
+    rect = QRectF(PAGE_RECT)
+    if len(boxes):
+        x0, y0 = boxes[:, :2].min(axis=0) - POINT_SIZE_PX
+        x1, y1 = boxes[:, 2:].max(axis=0) + POINT_SIZE_PX
+        rect = rect.united(QRectF(x0, y0, x1 - x0, y1 - y0))
+    return rect
+
+
+class PngWriter:
+    """Writes a PNG a band of rows at a time"""
+
+    def __init__(self, path: str, width: int, height: int, alpha: bool = False):
+        self.width, self.height = width, height
+        self.channels = 4 if alpha else 3
+        self.rows = 0
+        self._file = open(path, "wb")
+        self._deflate = zlib.compressobj(PNG_COMPRESSION)
+        self._pending = []
+        self._pending_bytes = 0
+        self._previous = np.zeros((1, width, self.channels), np.uint8)
+        self._file.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6 if alpha else 2, 0, 0, 0))
+
+    def _chunk(self, kind: bytes, data: bytes) -> None:
+        self._file.write(struct.pack(">I", len(data)))
+        self._file.write(kind)
+        self._file.write(data)
+        self._file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+    def _compressed(self, data: bytes) -> None:
+        if data:
+            self._pending.append(data)
+            self._pending_bytes += len(data)
+        if self._pending_bytes >= PNG_CHUNK_BYTES:
+            self._chunk(b"IDAT", b"".join(self._pending))
+            self._pending, self._pending_bytes = [], 0
+
+    def write(self, rows: np.ndarray) -> None:
+        """Append (n, width, channels) uint8 rows"""
+        # Up filter: each row minus the one above, which diagrams compress well
+        above = np.concatenate([self._previous, rows[:-1]])
+        filtered = np.empty((len(rows), 1 + self.width * self.channels), np.uint8)
+        filtered[:, 0] = 2
+        filtered[:, 1:] = (rows - above).reshape(len(rows), -1)
+        self._previous = rows[-1:].copy()
+        self.rows += len(rows)
+        self._compressed(self._deflate.compress(filtered.tobytes()))
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self._compressed(self._deflate.flush())
+        if self._pending:
+            self._chunk(b"IDAT", b"".join(self._pending))
+        self._chunk(b"IEND", b"")
+        self._file.close()
+
+    def discard(self) -> None:
+        self._file.close()
+
+
+class Exporter:
+    """Renders a document to path; the format follows the extension.
+
+    scale is output pixels (PNG) or points (SVG, PDF) per scene unit.
+    progress(done, total) is called from the exporting thread, and cancel()
+    may be called from any thread; run() then raises ExportCancelled and
+    removes the partial file.
+    """
+
+    def __init__(self, document: DocumentStore, path: str, scale: float = 1.0,
+                 rect: QRectF = None, background: QColor = QColor(Qt.white),
+                 labels: bool = False, workers: int = None, tile_px: int = TILE_PX,
+                 progress: Callable[[int, int], None] = None):
+        self.format = os.path.splitext(path)[1].lower()
+        if self.format not in FORMATS:
+            raise ExportError(f"Cannot export to {self.format or 'a file without extension'}, "
+                              f"use one of {', '.join(FORMATS)}")
+        self.document = document
+        self.path = path
+        self.scale = scale
+        self.ids = render_ids(document)
+        self.rect = QRectF(rect) if rect is not None else export_rect(document, self.ids)
+        self.background = QColor(background)
+        self.labels = labels
+        self.workers = workers or max(1, os.cpu_count() or 1)
+        self.tile_px = tile_px
+        self.progress = progress
+        self.width = max(1, math.ceil(self.rect.width() * scale))
+        self.height = max(1, math.ceil(self.rect.height() * scale))
+        self.done = 0
+        self.total = 0
+        self._cancelled = threading.Event()
+        self._local = threading.local()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def _advance(self, steps: int = 1) -> None:
+        self.done += steps
+        if self.progress is not None:
+            self.progress(self.done, self.total)
+        if self._cancelled.is_set():
+            raise ExportCancelled(self.path)
+
+    def _transform(self, x: float, y: float) -> QTransform:
+        """Scene to device transform with scene point x, y at the device origin"""
+        s = self.scale
+        return QTransform(s, 0, 0, s, -x * s, -y * s)
+
+    def run(self) -> str:
+        logger.info("Exporting %d objects to %s (%dx%d)", len(self.ids), self.path,
+                    self.width, self.height)
+        with logger.span(f"export{self.format}"):
+            try:
+                if self.format == ".png":
+                    self._run_png()
+                else:
+                    self._run_vector()
+            except BaseException:
+                if os.path.exists(self.path):
+                    os.remove(self.path)
+                raise
+        logger.success("Exported %s", self.path)
+        return self.path
+
+    # Raster
+
+    def _renderer(self) -> BatchRenderer:
+        renderer = getattr(self._local, "renderer", None)
+        if renderer is None:
+            renderer = self._local.renderer = BatchRenderer()
+        return renderer
+
+    def _render_tile(self, ids: np.ndarray, x: int, y: int, width: int, height: int) -> np.ndarray:
+        """Pixels x, y to x + width, y + height of the output as RGB(A) rows"""
+        alpha = self.background.alpha() < 255
+        image = QImage(width, height, QImage.Format_RGBA8888 if alpha else QImage.Format_RGBX8888)
+        image.fill(self.background)
+        if len(ids):
+            painter = QPainter(image)
+            try:
+                painter.setRenderHint(QPainter.Antialiasing)
+                painter.setTransform(self._transform(self.rect.left() + x / self.scale,
+                                                     self.rect.top() + y / self.scale))
+                self._renderer().paint(painter, self.document, ids, self.scale, labels=self.labels)
+            finally:
+                painter.end()
+        pixels = np.frombuffer(image.constBits(), np.uint8).reshape(height, image.bytesPerLine())
+        pixels = pixels[:, :width * 4].reshape(height, width, 4)
+        # Copied out, the image's memory goes with it
+        return (pixels if alpha else pixels[:, :, :3]).copy()
+
+    def _run_png(self) -> None:
+        if self.width * self.height >= MAX_PIXELS:
+            raise ExportError(f"{self.width}x{self.height} is too large for one image")
+        tile = self.tile_px
+        columns = -(-self.width // tile)
+        bands = -(-self.height // tile)
+        self.total = columns * bands
+
+        # Object boxes in output pixels, padded for point pens and antialiasing
+        boxes = self.document.bounds(self.ids)
+        keep = np.isfinite(boxes).all(axis=1)
+        ids = self.ids[keep]
+        pad = POINT_SIZE_PX / 2 + 2 / self.scale
+        boxes = (boxes[keep] + [-pad, -pad, pad, pad]
+                 - [self.rect.left(), self.rect.top()] * 2) * self.scale
+
+        writer = PngWriter(self.path, self.width, self.height, self.background.alpha() < 255)
+        queued = deque()
+        try:
+            with ThreadPoolExecutor(self.workers, thread_name_prefix="export") as pool:
+                def submit(band: int) -> None:
+                    y = band * tile
+                    height = min(tile, self.height - y)
+                    in_band = (boxes[:, 1] <= y + height) & (boxes[:, 3] >= y)
+                    band_ids, band_boxes = ids[in_band], boxes[in_band]
+                    futures = []
+                    for column in range(columns):
+                        x = column * tile
+                        width = min(tile, self.width - x)
+                        inside = (band_boxes[:, 0] <= x + width) & (band_boxes[:, 2] >= x)
+                        futures.append(pool.submit(self._render_tile, band_ids[inside],
+                                                   x, y, width, height))
+                    queued.append(futures)
+
+                for band in range(min(bands, 1 + BANDS_AHEAD)):
+                    submit(band)
+                for band in range(bands):
+                    futures = queued.popleft()
+                    if band + 1 + BANDS_AHEAD < bands:
+                        submit(band + 1 + BANDS_AHEAD)
+                    try:
+                        parts = []
+                        for future in futures:
+                            parts.append(future.result())
+                            self._advance()
+                    except ExportCancelled:
+                        for pending in list(queued) + [futures]:
+                            for future in pending:
+                                future.cancel()
+                        raise
+                    writer.write(np.concatenate(parts, axis=1))
+            writer.close()
+        finally:
+            writer.discard()
+
+    # Vector
+
+    def _run_vector(self) -> None:
+        chunks = [self.ids[i:i + VECTOR_CHUNK] for i in range(0, len(self.ids), VECTOR_CHUNK)]
+        self.total = len(chunks)
+        if self.format == ".svg":
+            from PySide6.QtSvg import QSvgGenerator
+            device = QSvgGenerator()
+            device.setFileName(self.path)
+            device.setSize(QSize(self.width, self.height))
+            device.setViewBox(QRect(0, 0, self.width, self.height))
+        else:
+            device = QPdfWriter(self.path)
+            device.setResolution(72)
+            device.setPageMargins(QMarginsF(0, 0, 0, 0))
+            device.setPageSize(QPageSize(QSizeF(self.width, self.height), QPageSize.Point))
+        painter = QPainter()
+        if not painter.begin(device):
+            raise ExportError(f"Cannot write {self.path}")
+        try:
+            if self.background.alpha():
+                painter.fillRect(QRectF(0, 0, self.width, self.height), self.background)
+            painter.setRenderHint(QPainter.Antialiasing)
+            painter.setTransform(self._transform(self.rect.left(), self.rect.top()))
+            renderer = BatchRenderer()
+            for chunk in chunks:
+                renderer.paint(painter, self.document, chunk, self.scale, labels=self.labels)
+                self._advance()
+        finally:
+            painter.end()
+
+
+def export(document: DocumentStore, path: str, **options) -> str:
+    """Export the render-enabled objects of document; see Exporter"""
+    return Exporter(document, path, **options).run()
@@ -0,0 +1,259 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import math
+import os
+import threading
+import numpy as np
+from PySide6.QtGui import QImage, QPainter, QTransform
+from PySide6.QtCore import QObject, QRectF, Qt, Signal
+
+from src.document.store import DocumentStore
+from src.render.batch import BatchRenderer, POINT_SIZE_PX
+import src.utils.logger as logger
+
+TILE_PX = 256
+# Zoom levels are quarter steps in log2 scale, which the zoom actions follow
+LEVELS_PER_OCTAVE = 4
+# Objects are drawn into every tile within reach of their strokes, so a
+# point on a tile edge is not cut in half. Point pens scale with the zoom,
+# hairlines and antialiasing take a couple of device pixels.
+POINT_PAD = POINT_SIZE_PX / 2
+TILE_PAD_PX = 2
+DEFAULT_MAX_BYTES = 128 * 1024 * 1024
+# Past this many edited objects invalidate their combined bounds instead
+INVALIDATE_EACH_MAX = 64
+
+
+def level_of(scale: float) -> int:
+    return round(math.log2(max(scale, 1e-9)) * LEVELS_PER_OCTAVE)
+
+
+def level_scale(level: int) -> float:
+    return 2.0 ** (level / LEVELS_PER_OCTAVE)
+
+
+def tile_rect(level: int, tx: int, ty: int) -> QRectF:
+    """Scene rect a tile covers"""
+    size = TILE_PX / level_scale(level)
+    return QRectF(tx * size, ty * size, size, size)
+
+
+def tiles_in(level: int, rect: QRectF) -> list[tuple[int, int]]:
+    size = TILE_PX / level_scale(level)
+    x0, y0 = math.floor(rect.left() / size), math.floor(rect.top() / size)
+    x1, y1 = math.floor(rect.right() / size), math.floor(rect.bottom() / size)
+    return [(tx, ty) for ty in range(y0, y1 + 1) for tx in range(x0, x1 + 1)]
+
+
+def _cost(image: QImage) -> int:
+    # Blank tiles hold no pixels but still take a slot
+    return max(image.sizeInBytes(), 64)
+
+
+def rasterize(renderer: BatchRenderer, document: DocumentStore, key: tuple,
+              ids: np.ndarray) -> QImage:
+    """Draw ids into a transparent tile image; safe off the GUI thread"""
+    level, tx, ty = key
+    scale = level_scale(level)
+    origin = tile_rect(level, tx, ty).topLeft()
+    image = QImage(TILE_PX, TILE_PX, QImage.Format_ARGB32_Premultiplied)
+    image.fill(Qt.transparent)
+    painter = QPainter(image)
+    try:
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setTransform(QTransform(scale, 0, 0, scale, -origin.x() * scale, -origin.y() * scale))
+        renderer.paint(painter, document, ids, scale, labels=False)
+    finally:
+        painter.end()
+    return image
+
+
+class _Signals(QObject):
+    # Emitted from worker threads, delivered on the GUI thread
+    rendered = Signal(object, object, object)
+
+
+class TileCache(QObject):
+    """Rasterized tiles of the document at fixed zoom levels.
+
+    Tiles are TILE_PX square images keyed by (level, column, row). Missing
+    tiles are rendered on a thread pool from ids gathered on the GUI thread;
+    tile_ready fires once one lands. Edits drop only the tiles whose area
+    the edited objects covered before or after the edit, and the least
+    recently drawn tiles are evicted past max_bytes.
+    """
+
+    tile_ready = Signal(QRectF)
+
+    def __init__(self, document: DocumentStore, query, parent: QObject = None,
+                 max_bytes: int = DEFAULT_MAX_BYTES, workers: int = None):
+        super().__init__(parent)
+        self.document = document
+        # query(x0, y0, x1, y1) -> ids of the shown objects in a scene rect
+        self.query = query
+        self.max_bytes = max_bytes
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 1) - 1))
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._tiles: OrderedDict[tuple, QImage] = OrderedDict()
+        self._pending: dict[tuple, int] = {}
+        self._ticket = 0
+        self._pool: ThreadPoolExecutor = None
+        self._local = threading.local()
+        self._signals = _Signals()
+        self._signals.rendered.connect(self._on_rendered)
+        self._old_bounds = None
+        document.subscribe(self._on_document_event)
+
+    # Lookup
+
+    def get(self, key: tuple) -> QImage:
+        image = self._tiles.get(key)
+        if image is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._tiles.move_to_end(key)
+        return image
+
+    def peek(self, key: tuple) -> QImage:
+        """Cached tile without counting it as used"""
+        return self._tiles.get(key)
+
+    def levels(self) -> set[int]:
+        return {key[0] for key in self._tiles}
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "tiles": len(self._tiles),
+            "bytes": self.nbytes,
+            "pending": len(self._pending),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    # Rendering
+
+    def _ids(self, key: tuple) -> np.ndarray:
+        level, tx, ty = key
+        rect = tile_rect(level, tx, ty)
+        pad = POINT_PAD + TILE_PAD_PX / level_scale(level)
+        return self.query(rect.left() - pad, rect.top() - pad,
+                          rect.right() + pad, rect.bottom() + pad)
+
+    def request(self, key: tuple) -> None:
+        """Start rendering a tile unless it is cached or already on its way"""
+        if key in self._pending or key in self._tiles:
+            return
+        ids = self._ids(key)
+        self._ticket += 1
+        if not len(ids):
+            # Nothing to draw, no need for a thread
+            self._store(key, QImage())
+            return
+        self._pending[key] = self._ticket
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="tiles")
+        self._pool.submit(self._render, key, self._ticket, ids)
+
+    def render_now(self, key: tuple, renderer: BatchRenderer) -> QImage:
+        """Render a tile on the calling thread, replacing any pending render"""
+        self._pending.pop(key, None)
+        ids = self._ids(key)
+        image = rasterize(renderer, self.document, key, ids) if len(ids) else QImage()
+        self._store(key, image)
+        return image
+
+    def _render(self, key: tuple, ticket: int, ids: np.ndarray) -> None:
+        renderer = getattr(self._local, "renderer", None)
+        if renderer is None:
+            # BatchRenderer keeps scratch buffers, one per thread
+            renderer = self._local.renderer = BatchRenderer()
+        try:
+            image = rasterize(renderer, self.document, key, ids)
+        except Exception as e:
+            logger.error("Rendering tile %s failed: %s", key, e)
+            image = None
+        self._signals.rendered.emit(key, ticket, image)
+
+    def _on_rendered(self, key: tuple, ticket: int, image: QImage) -> None:
+        if self._pending.get(key) != ticket:
+            # Invalidated while rendering; the next paint asks again
+            return
+        del self._pending[key]
+        if image is not None:
+            self._store(key, image)
+            self.tile_ready.emit(tile_rect(*key))
+
+    def _store(self, key: tuple, image: QImage) -> None:
+        self._tiles[key] = image
+        self.nbytes += _cost(image)
+        self._evict()
+
+    def _evict(self) -> None:
+        while self.nbytes > self.max_bytes and self._tiles:
+            _, image = self._tiles.popitem(last=False)
+            self.nbytes -= _cost(image)
+            self.evictions += 1
+
+    # Invalidation
+
+    def clear(self) -> None:
+        self._tiles.clear()
+        self._pending.clear()
+        self.nbytes = 0
+
+    def invalidate(self, boxes: np.ndarray) -> None:
+        """Drop tiles touching any x0, y0, x1, y1 box in scene units"""
+        boxes = boxes[np.isfinite(boxes).all(axis=1)]
+        if not len(boxes) or not (self._tiles or self._pending):
+            return
+        if len(boxes) > INVALIDATE_EACH_MAX:
+            boxes = np.array([[boxes[:, 0].min(), boxes[:, 1].min(),
+                               boxes[:, 2].max(), boxes[:, 3].max()]])
+        keys = np.array(list(self._tiles) + list(self._pending), np.int64).reshape(-1, 3)
+        size = TILE_PX / np.exp2(keys[:, 0] / LEVELS_PER_OCTAVE)
+        pad = POINT_PAD + TILE_PAD_PX / np.exp2(keys[:, 0] / LEVELS_PER_OCTAVE)
+        x0 = keys[:, 1] * size - pad
+        y0 = keys[:, 2] * size - pad
+        hit = np.zeros(len(keys), bool)
+        for bx0, by0, bx1, by1 in boxes:
+            hit |= (x0 <= bx1) & (x0 + size + 2 * pad >= bx0) & \
+                   (y0 <= by1) & (y0 + size + 2 * pad >= by0)
+        for key in map(tuple, keys[hit].tolist()):
+            image = self._tiles.pop(key, None)
+            if image is not None:
+                self.nbytes -= _cost(image)
+            self._pending.pop(key, None)
+
+    def _on_document_event(self, event: str, *args) -> None:
+        document = self.document
+        if event == "begin_change":
+            ids, what = args
+            if what == "coords":
+                self._old_bounds = document.bounds(ids)
+        elif event == "changed":
+            ids, what = args
+            if what == "name":
+                # Labels are drawn over the tiles, never into them
+                return
+            boxes = document.bounds(ids)
+            if what == "coords" and self._old_bounds is not None:
+                boxes = np.concatenate([self._old_bounds, boxes])
+                self._old_bounds = None
+            self.invalidate(boxes)
+        elif event in ("end_insert", "end_remove"):
+            # Removed objects keep their coordinates, only their flag changes
+            self.invalidate(document.bounds(args[0], removed=True))
+        elif event == "reset":
+            self.clear()
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
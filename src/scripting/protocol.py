@@ -0,0 +1,68 @@
+import struct
+import numpy as np
+
+from src.document.store import ROOT
+
+# Message types sent from a script worker back to the editor
+CREATE, MODIFY, OUTPUT, DONE, ERROR, FATAL = range(6)
+
+_HEADER = struct.Struct("<B")
+_CREATE = struct.Struct("<BBIi")
+_MODIFY = struct.Struct("<BI")
+
+# Objects a script creates are referred to by handles until the editor gives
+# them real ids; handles are negative so they never clash with ids or ROOT
+FIRST_HANDLE = ROOT - 1
+
+
+def handle(index):
+    """Handle of the index-th object created by a script; works on arrays too"""
+    return FIRST_HANDLE - index
+
+
+def handle_index(handles):
+    return FIRST_HANDLE - handles
+
+
+def encode_create(kind: int, parent: int, names: list[str], coords: np.ndarray) -> bytes:
+    """CREATE: kind u8, count u32, parent i32, count x 4 f64 coords, NUL separated names"""
+    coords = np.ascontiguousarray(coords, "<f8").reshape(len(names), 4)
+    return (_CREATE.pack(CREATE, kind, len(names), parent) + coords.tobytes()
+            + "\0".join(names).encode())
+
+
+def decode_create(data: bytes) -> tuple[int, int, list[str], np.ndarray]:
+    _, kind, n, parent = _CREATE.unpack_from(data)
+    start = _CREATE.size
+    coords = np.frombuffer(data, "<f8", n * 4, start).reshape(n, 4)
+    names = data[start + n * 32:].decode().split("\0") if n else []
+    if len(names) != n:
+        raise ValueError(f"CREATE batch holds {len(names)} names for {n} objects")
+    return kind, parent, names, coords
+
+
+def encode_modify(ids: np.ndarray, coords: np.ndarray) -> bytes:
+    """MODIFY: count u32, count x i32 ids, count x 4 f64 coords"""
+    ids = np.ascontiguousarray(ids, "<i4")
+    coords = np.ascontiguousarray(coords, "<f8").reshape(len(ids), 4)
+    return _MODIFY.pack(MODIFY, len(ids)) + ids.tobytes() + coords.tobytes()
+
+
+def decode_modify(data: bytes) -> tuple[np.ndarray, np.ndarray]:
+    _, n = _MODIFY.unpack_from(data)
+    ids = np.frombuffer(data, "<i4", n, _MODIFY.size)
+    coords = np.frombuffer(data, "<f8", n * 4, _MODIFY.size + n * 4).reshape(n, 4)
+    return ids, coords
+
+
+def encode_text(kind: int, text: str) -> bytes:
+    """OUTPUT, DONE, ERROR or FATAL followed by UTF-8 text"""
+    return _HEADER.pack(kind) + text.encode()
+
+
+def decode_text(data: bytes) -> str:
+    return data[_HEADER.size:].decode(errors="replace")
+
+
+def message_type(data: bytes) -> int:
+    return data[0]
@@ -0,0 +1,255 @@
+from array import array
+from multiprocessing.connection import wait
+import multiprocessing
+import os
+import time
+import numpy as np
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from src.document.store import DocumentStore, FLAG_ALIVE, GROUP, KINDS, ROOT
+from src.scripting import protocol
+from src.scripting.worker import worker_main
+import src.utils.logger as logger
+
+DEFAULT_TIMEOUT = 60.0
+DEFAULT_MEMORY_MB = 2048
+POLL_INTERVAL_MS = 15
+# Time per poll spent applying batches, so a busy script cannot stall painting
+APPLY_BUDGET = 0.008
+
+PENDING, RUNNING, DONE, FAILED, CANCELLED, TIMED_OUT = (
+    "pending", "running", "done", "failed", "cancelled", "timed out")
+
+
+class ScriptJob:
+    def __init__(self, job_id: int, source: str, name: str, timeout: float, memory_mb: int):
+        self.id = job_id
+        self.source = source
+        self.name = name
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.status = PENDING
+        self.message = ""
+        self.created = 0
+        self.modified = 0
+        self.started = 0.0
+        # Real ids of the objects the script created, indexed by handle
+        self.ids = array("i")
+
+
+class _Worker:
+    def __init__(self, context):
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=worker_main, args=(child,), daemon=True,
+                                       name="tordie-script")
+        self.process.start()
+        child.close()
+        self.job: ScriptJob = None
+
+    def stop(self) -> None:
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+        self.conn.close()
+
+
+class ScriptRunner(QObject):
+    """Runs user scripts in a pool of worker processes.
+
+    Workers are spawned on first use and reused between scripts. Each job
+    gets a snapshot of the document; what it creates or edits comes back as
+    binary batches which are applied on the GUI thread as they arrive, within
+    a small time budget per poll. Cancelling or timing out a job terminates
+    its worker and a new one is started when needed.
+    """
+
+    job_started = Signal(int)
+    job_progress = Signal(int, int, int)
+    job_output = Signal(int, str)
+    job_finished = Signal(int, str, str)
+
+    def __init__(self, document: DocumentStore, parent: QObject = None, workers: int = None):
+        super().__init__(parent)
+        self.document = document
+        self.max_workers = workers or max(1, min(2, os.cpu_count() or 1))
+        self.jobs: dict[int, ScriptJob] = {}
+        self._queue: list[ScriptJob] = []
+        self._workers: list[_Worker] = []
+        self._next_id = 0
+        # Spawn rather than fork so workers never inherit Qt state
+        self._context = multiprocessing.get_context("spawn")
+        self._timer = QTimer(self, interval=POLL_INTERVAL_MS)
+        self._timer.timeout.connect(self._poll)
+
+    def run(self, source: str, name: str = "<script>", timeout: float = DEFAULT_TIMEOUT,
+            memory_mb: int = DEFAULT_MEMORY_MB) -> int:
+        """Queue a script and return its job id"""
+        job = ScriptJob(self._next_id, source, name, timeout, memory_mb)
+        self._next_id += 1
+        self.jobs[job.id] = job
+        self._queue.append(job)
+        self._dispatch()
+        self._timer.start()
+        return job.id
+
+    def cancel(self, job_id: int) -> None:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        if job.status == PENDING:
+            self._queue.remove(job)
+            self._finish(job, CANCELLED, "Cancelled before starting")
+        elif job.status == RUNNING:
+            self._kill(self._worker_of(job))
+            self._finish(job, CANCELLED, "Cancelled")
+
+    def cancel_all(self) -> None:
+        for job in list(self.jobs.values()):
+            self.cancel(job.id)
+
+    def is_busy(self) -> bool:
+        return bool(self._queue) or any(w.job for w in self._workers)
+
+    def shutdown(self) -> None:
+        self.cancel_all()
+        for worker in self._workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+            worker.stop()
+        self._workers.clear()
+        self._timer.stop()
+
+    # Scheduling
+
+    def _dispatch(self) -> None:
+        while self._queue:
+            worker = next((w for w in self._workers if w.job is None), None)
+            if worker is None:
+                if len(self._workers) >= self.max_workers:
+                    return
+                worker = _Worker(self._context)
+                self._workers.append(worker)
+            job = self._queue.pop(0)
+            document = self.document
+            worker.conn.send({
+                "source": job.source,
+                "name": job.name,
+                "memory_mb": job.memory_mb,
+                "kinds": document.kinds.copy(),
+                "coords": document.coords.copy(),
+                "alive": (document.flags & FLAG_ALIVE).astype(bool),
+            })
+            worker.job = job
+            job.status = RUNNING
+            job.started = time.monotonic()
+            self.job_started.emit(job.id)
+
+    def _poll(self) -> None:
+        deadline = time.perf_counter() + APPLY_BUDGET
+        busy = {w.conn: w for w in self._workers if w.job is not None}
+        for conn in wait(list(busy), timeout=0):
+            worker = busy[conn]
+            job = worker.job
+            try:
+                while worker.job is not None and conn.poll() and time.perf_counter() < deadline:
+                    self._handle(worker, conn.recv_bytes())
+            except (EOFError, OSError):
+                self._kill(worker)
+                self._finish(job, FAILED, f"Script worker exited unexpectedly "
+                                          f"(exit code {worker.process.exitcode})")
+            except ValueError as e:
+                self._kill(worker)
+                self._finish(job, FAILED, f"Malformed result batch: {e}")
+
+        now = time.monotonic()
+        for worker in list(self._workers):
+            job = worker.job
+            if job is not None and job.timeout and now - job.started > job.timeout:
+                self._kill(worker)
+                self._finish(job, TIMED_OUT, f"Timed out after {job.timeout:g} s")
+
+        self._dispatch()
+        if not self.is_busy():
+            self._timer.stop()
+
+    def _handle(self, worker: _Worker, data: bytes) -> None:
+        job = worker.job
+        kind = protocol.message_type(data)
+        if kind == protocol.CREATE:
+            self._apply_create(job, *protocol.decode_create(data))
+        elif kind == protocol.MODIFY:
+            self._apply_modify(job, *protocol.decode_modify(data))
+        elif kind == protocol.OUTPUT:
+            self.job_output.emit(job.id, protocol.decode_text(data))
+        elif kind == protocol.DONE:
+            self._finish(job, DONE, protocol.decode_text(data))
+        elif kind == protocol.ERROR:
+            self._finish(job, FAILED, protocol.decode_text(data))
+        elif kind == protocol.FATAL:
+            # The worker exits after this one, start a fresh one for the next job
+            self._kill(worker)
+            self._finish(job, FAILED, protocol.decode_text(data))
+        else:
+            raise ValueError(f"unknown message type {kind}")
+
+    # Applying results
+
+    def _resolve(self, job: ScriptJob, ids: np.ndarray) -> np.ndarray:
+        """Map script handles to real ids; unknown ones become ROOT"""
+        ids = np.asarray(ids, np.int64)
+        resolved = ids.copy()
+        handles = ids <= protocol.FIRST_HANDLE
+        index = protocol.handle_index(ids[handles])
+        created = np.frombuffer(job.ids, np.int32)
+        known = index < len(created)
+        resolved[handles] = ROOT
+        resolved[np.flatnonzero(handles)[known]] = created[index[known]]
+        return resolved
+
+    def _apply_create(self, job: ScriptJob, kind: int, parent: int, names: list[str],
+                      coords: np.ndarray) -> None:
+        if kind >= len(KINDS):
+            raise ValueError(f"unknown kind {kind}")
+        document = self.document
+        parent = int(self._resolve(job, [parent])[0])
+        if parent != ROOT and not (document.is_alive(parent) and document.kinds[parent] == GROUP):
+            parent = ROOT
+        ids = document.add_many(KINDS[kind], names, coords, parent)
+        job.ids.frombytes(ids.astype(np.int32).tobytes())
+        job.created += len(ids)
+        self.job_progress.emit(job.id, job.created, job.modified)
+
+    def _apply_modify(self, job: ScriptJob, ids: np.ndarray, coords: np.ndarray) -> None:
+        document = self.document
+        ids = self._resolve(job, ids)
+        valid = (ids >= 0) & (ids < document.count)
+        valid[valid] = (document.flags[ids[valid]] & FLAG_ALIVE).astype(bool)
+        if valid.any():
+            document.set_coords(ids[valid], coords[valid])
+            job.modified += int(np.count_nonzero(valid))
+            self.job_progress.emit(job.id, job.created, job.modified)
+
+    # Workers
+
+    def _worker_of(self, job: ScriptJob) -> _Worker:
+        return next(w for w in self._workers if w.job is job)
+
+    def _kill(self, worker: _Worker) -> None:
+        worker.job = None
+        worker.stop()
+        if worker in self._workers:
+            self._workers.remove(worker)
+
+    def _finish(self, job: ScriptJob, status: str, message: str) -> None:
+        job.status = status
+        job.message = message
+        for worker in self._workers:
+            if worker.job is job:
+                worker.job = None
+        if status == DONE:
+            logger.success("Script %s finished: %s", job.name, message)
+        else:
+            logger.warn("Script %s %s: %s", job.name, status, message)
+        self.job_finished.emit(job.id, status, message)
@@ -0,0 +1,184 @@
+from multiprocessing.connection import Connection
+import contextlib
+import io
+import linecache
+import math
+import time
+import traceback
+import numpy as np
+
+from src.document.store import ROOT, KINDS, KIND_IDS
+from src.scripting import protocol
+
+try:
+    import resource
+except ImportError:
+    # Windows has no rlimits; the editor still enforces timeouts
+    resource = None
+
+# A batch is sent once it holds this many objects or is this old
+BATCH_OBJECTS = 4096
+BATCH_SECONDS = 0.05
+
+
+class ScriptDocument:
+    """The document as a script sees it, available as `doc`.
+
+    Reads come from a snapshot taken when the script started. Objects made by
+    the script are named by handles (negative numbers) which can be used as
+    parents or passed to set_coords like ordinary ids. Edits are buffered and
+    streamed to the editor in batches while the script keeps running. A
+    script that raises keeps every edit it made before raising; the rest of
+    the buffer is sent ahead of the error.
+    """
+
+    def __init__(self, conn: Connection, kinds: np.ndarray, coords: np.ndarray, alive: np.ndarray):
+        self.kinds = kinds
+        self.coords = coords
+        self.alive = alive
+        self.created = 0
+        self._conn = conn
+        self._create = None
+        self._create_names: list[str] = []
+        self._create_coords: list[np.ndarray] = []
+        self._modify_ids: list[np.ndarray] = []
+        self._modify_coords: list[np.ndarray] = []
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def ids_of_kind(self, kind: str) -> np.ndarray:
+        return np.flatnonzero((self.kinds == KIND_IDS[kind]) & self.alive)
+
+    def add(self, kind: str, name: str, coords=None, parent: int = ROOT) -> int:
+        return int(self.add_many(kind, [name], None if coords is None else [coords], parent)[0])
+
+    def add_many(self, kind: str, names: list[str], coords=None, parent: int = ROOT) -> np.ndarray:
+        if kind not in KIND_IDS:
+            raise ValueError(f"Unknown kind {kind!r}, expected one of {KINDS}")
+        n = len(names)
+        coords = np.zeros((n, 4)) if coords is None else np.asarray(coords, np.float64).reshape(n, 4)
+        key = (KIND_IDS[kind], int(parent))
+        if self._create != key:
+            self._flush_create()
+            self._create = key
+        self._create_names.extend(str(name) for name in names)
+        self._create_coords.append(coords)
+        handles = protocol.handle(np.arange(self.created, self.created + n))
+        self.created += n
+        self._added(n)
+        return handles
+
+    def set_coords(self, ids, coords) -> None:
+        ids = np.atleast_1d(np.asarray(ids, np.int32))
+        self._modify_ids.append(ids)
+        self._modify_coords.append(np.asarray(coords, np.float64).reshape(len(ids), 4))
+        self._added(len(ids))
+
+    def flush(self) -> None:
+        """Send everything buffered so far"""
+        self._flush_create()
+        if self._modify_ids:
+            self._conn.send_bytes(protocol.encode_modify(
+                np.concatenate(self._modify_ids), np.concatenate(self._modify_coords)))
+            self._modify_ids.clear()
+            self._modify_coords.clear()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def _added(self, n: int) -> None:
+        self._pending += n
+        if self._pending >= BATCH_OBJECTS or time.monotonic() - self._last_flush > BATCH_SECONDS:
+            self.flush()
+
+    def _flush_create(self) -> None:
+        if self._create_names:
+            kind, parent = self._create
+            self._conn.send_bytes(protocol.encode_create(
+                kind, parent, self._create_names, np.concatenate(self._create_coords)))
+            self._create_names = []
+            self._create_coords.clear()
+
+
+class _Output(io.TextIOBase):
+    """Forwards what a script prints, a line at a time"""
+
+    def __init__(self, conn: Connection):
+        self._conn = conn
+        self._buffer = ""
+
+    def write(self, text: str) -> int:
+        self._buffer += text
+        if "\n" in self._buffer:
+            lines, self._buffer = self._buffer.rsplit("\n", 1)
+            self._conn.send_bytes(protocol.encode_text(protocol.OUTPUT, lines))
+        return len(text)
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._conn.send_bytes(protocol.encode_text(protocol.OUTPUT, self._buffer))
+            self._buffer = ""
+
+
+@contextlib.contextmanager
+def _memory_limit(megabytes: int):
+    """Cap the address space of this process while a script runs"""
+    if resource is None or not megabytes:
+        yield
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+    limit = megabytes * 1024 * 1024
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+    try:
+        yield
+    finally:
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+
+def run_script(conn: Connection, job: dict) -> bool:
+    """Run one script; returns False when the worker should not be reused"""
+    doc = ScriptDocument(conn, job["kinds"], job["coords"], job["alive"])
+    output = _Output(conn)
+    namespace = {"__name__": "__script__", "doc": doc, "np": np, "math": math, "ROOT": ROOT}
+    name = job.get("name", "<script>")
+    # Lets tracebacks quote the script's source lines
+    linecache.cache[name] = (len(job["source"]), None, job["source"].splitlines(True), name)
+    try:
+        code = compile(job["source"], name, "exec")
+        with _memory_limit(job.get("memory_mb")), contextlib.redirect_stdout(output):
+            exec(code, namespace)
+            doc.flush()
+        output.flush()
+        conn.send_bytes(protocol.encode_text(protocol.DONE, f"{doc.created} objects created"))
+        return True
+    except MemoryError:
+        output.flush()
+        try:
+            doc.flush()
+        except MemoryError:
+            pass
+        # The heap may be fragmented past use, so this worker retires
+        conn.send_bytes(protocol.encode_text(
+            protocol.FATAL, f"Memory limit of {job.get('memory_mb')} MiB exceeded"))
+        return False
+    except Exception as e:
+        output.flush()
+        doc.flush()
+        # Only the script's own frames are of interest to its author
+        report = traceback.TracebackException.from_exception(e)
+        report.stack = traceback.StackSummary.from_list(
+            [frame for frame in report.stack if frame.filename == name])
+        conn.send_bytes(protocol.encode_text(protocol.ERROR, "".join(report.format()).rstrip()))
+        return True
+
+
+def worker_main(conn: Connection) -> None:
+    """Entry point of a pooled worker process: run jobs until told to stop"""
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        if job is None or not run_script(conn, job):
+            return
@@ -0,0 +1,180 @@
+"""Packed asset bundle.
+
+At build time every file under src/assets is packed into one file:
+
+    header   magic, version, manifest size and CRC, total size
+    manifest JSON {path: [offset, size, crc32]}
+    data     the files, each starting on an ALIGNMENT boundary
+
+The bundle is memory-mapped, so opening it costs one header read and one
+manifest parse; each file's CRC is only checked the first time it is read.
+Without a bundle (running from source) files are read from disk instead.
+"""
+from typing import Iterable
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+
+from src.utils.os import resource_path
+import src.utils.logger as logger
+
+BUNDLE_NAME = "assets.bundle"
+ASSET_ROOT = "src/assets"
+MAGIC = b"TRDA"
+VERSION = 1
+ALIGNMENT = 16
+HEADER = struct.Struct("<4sHHIIQ")
+
+
+class AssetError(ValueError):
+    pass
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def pack(source: str = ASSET_ROOT, output: str = BUNDLE_NAME, prefix: str = ASSET_ROOT) -> dict:
+    """Pack every file below source into output; returns the manifest"""
+    paths = sorted(os.path.join(root, name) for root, _, names in os.walk(source) for name in names)
+    blobs = []
+    for path in paths:
+        with open(path, "rb") as f:
+            blobs.append(f.read())
+    keys = [f"{prefix}/{os.path.relpath(p, source).replace(os.sep, '/')}" for p in paths]
+
+    # Offsets depend on the manifest size and the manifest holds the offsets,
+    # so lay the data out relative to the end of the manifest and shift after
+    relative, position = [], 0
+    for blob in blobs:
+        relative.append(position)
+        position = _aligned(position + len(blob))
+
+    def manifest_bytes(base: int) -> bytes:
+        files = {key: [base + offset, len(blob), zlib.crc32(blob)]
+                 for key, offset, blob in zip(keys, relative, blobs)}
+        return json.dumps({"version": VERSION, "files": files}, separators=(",", ":")).encode()
+
+    base = 0
+    while True:
+        encoded = manifest_bytes(base)
+        start = _aligned(HEADER.size + len(encoded))
+        if start == base:
+            break
+        base = start
+
+    total = base + position
+    with open(output + ".partial", "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, len(encoded), zlib.crc32(encoded), total))
+        f.write(encoded)
+        for offset, blob in zip(relative, blobs):
+            f.seek(base + offset)
+            f.write(blob)
+        f.truncate(total)
+    os.replace(output + ".partial", output)
+    return json.loads(encoded)
+
+
+class AssetBundle:
+    """Read-only view of a packed bundle"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise AssetError(f"{path} is too short to be an asset bundle")
+        magic, version, _, size, crc, total = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise AssetError(f"{path} is not a version {VERSION} asset bundle")
+        if total != len(self._map):
+            raise AssetError(f"{path} is {len(self._map)} bytes, expected {total}")
+        encoded = self._map[HEADER.size:HEADER.size + size]
+        if zlib.crc32(encoded) != crc:
+            raise AssetError(f"{path} has a corrupt manifest")
+        self.files: dict[str, list[int]] = json.loads(encoded)["files"]
+        self._verified: set[str] = set()
+        self._lock = threading.Lock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.files
+
+    def names(self, prefix: str = "") -> list[str]:
+        return [name for name in self.files if name.startswith(prefix)]
+
+    def view(self, name: str) -> memoryview:
+        """The bytes of a file, without copying them out of the mapping"""
+        offset, size, crc = self.files[name]
+        data = memoryview(self._map)[offset:offset + size]
+        if name not in self._verified:
+            if zlib.crc32(data) != crc:
+                raise AssetError(f"{name} is corrupt in {self.path}")
+            with self._lock:
+                self._verified.add(name)
+        return data
+
+    def verify(self) -> list[str]:
+        """Names of every file whose contents do not match the manifest"""
+        bad = []
+        for name in self.files:
+            try:
+                self.view(name)
+            except AssetError:
+                bad.append(name)
+        return bad
+
+
+class Assets:
+    """Serves asset files from the bundle when there is one, else from disk"""
+
+    def __init__(self, bundle_path: str = None):
+        self.bundle: AssetBundle = None
+        path = bundle_path or resource_path(BUNDLE_NAME)
+        if os.path.exists(path):
+            try:
+                self.bundle = AssetBundle(path)
+            except (AssetError, OSError) as e:
+                logger.error("Ignoring asset bundle: %s", e)
+
+    def data(self, name: str) -> bytes:
+        if self.bundle is not None and name in self.bundle:
+            return bytes(self.bundle.view(name))
+        with open(resource_path(name), "rb") as f:
+            return f.read()
+
+    def exists(self, name: str) -> bool:
+        if self.bundle is not None and name in self.bundle:
+            return True
+        return os.path.exists(resource_path(name))
+
+    def names(self, prefix: str) -> list[str]:
+        """Files under a directory such as "src/assets/icons/" """
+        if self.bundle is not None:
+            return sorted(self.bundle.names(prefix))
+        directory = resource_path(prefix)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(prefix + name for name in os.listdir(directory)
+                      if os.path.isfile(os.path.join(directory, name)))
+
+
+assets = Assets()
+
+
+def main(argv: Iterable[str] = None) -> int:
+    """python -m src.utils.assets [source] [output]"""
+    args = list(sys.argv[1:] if argv is None else argv)
+    source = args[0] if args else ASSET_ROOT
+    output = args[1] if len(args) > 1 else BUNDLE_NAME
+    manifest = pack(source, output)
+    print(f"Packed {len(manifest['files'])} assets into {output} "
+          f"({os.path.getsize(output) / 1024:.0f} KiB)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
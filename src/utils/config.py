@@ -0,0 +1,7 @@
+import configparser
+
+from src.utils.os import resource_path
+
+# Read once when first imported; everything else shares this parser
+config = configparser.ConfigParser()
+config.read(resource_path('config.ini'))
@@ -1,52 +1,197 @@
 from typing import Callable
-from pypresence import Presence
 import os
-from dotenv import load_dotenv
+import threading
 import time
 
 import src.utils.logger as logger
 
-load_dotenv()
-CLIENT_ID = os.getenv('DISCORD_APP_ID')
-RPC = None
+# Discord accepts one activity update per 15 seconds per client
+UPDATE_INTERVAL = 15.0
+CONNECT_TIMEOUT = 5.0
+BACKOFF_START = 2.0
+BACKOFF_MAX = 300.0
 
+WORKER = None
 
-def discord_setup(debug: bool = False) -> Callable[[Presence], None]:
-    """Set up Discord presence"""
-    global RPC
 
-    state: str = "Working on a project"
-    details: str = "Development mode" if debug else "Starting a project"
+def _pypresence_client(client_id: str):
+    """Default client: pypresence with its own event loop for the worker thread"""
+    from pypresence import Presence
 
-    if CLIENT_ID:
+    class Client(Presence):
+        def update_event_loop(self, loop):
+            # connect() swaps in a fresh loop; the one it replaces would leak
+            old = getattr(self, "loop", None)
+            if old is not None and old is not loop and not old.is_closed():
+                old.close()
+            super().update_event_loop(loop)
+
+    return Client(client_id, connection_timeout=CONNECT_TIMEOUT, response_timeout=CONNECT_TIMEOUT)
+
+
+class PresenceWorker:
+    """Keeps Discord presence up to date from a background thread.
+
+    update() only stores the latest activity; the thread connects (retrying
+    with exponential backoff while Discord is unreachable), and sends the
+    newest pending activity at most once per UPDATE_INTERVAL, skipping ones
+    identical to what was last sent. The client comes from client_factory,
+    so anything with connect/update/close methods can stand in for Discord.
+    """
+
+    def __init__(self, client_id: str, client_factory: Callable = _pypresence_client,
+                 interval: float = UPDATE_INTERVAL, backoff_start: float = BACKOFF_START,
+                 backoff_max: float = BACKOFF_MAX):
+        self.client_id = client_id
+        self.client_factory = client_factory
+        self.interval = interval
+        self.backoff_start = backoff_start
+        self.backoff_max = backoff_max
+        self.connected = False
+        self.sent = 0
+        # Fields every activity carries, such as images and the start time
+        self.base: dict = {}
+        self._pending: dict = None
+        self._last: dict = None
+        self._next_send = 0.0
+        self._stopping = False
+        self._wake = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="discord-presence", daemon=True)
+
+    def start(self) -> "PresenceWorker":
+        self._thread.start()
+        return self
+
+    def update(self, **activity) -> None:
+        """Queue an activity, replacing any that has not been sent yet"""
+        with self._wake:
+            self._pending = {**self.base, **activity}
+            self._wake.notify()
+
+    def stop(self, timeout: float = 0.0) -> None:
+        """Ask the thread to close the connection and exit; waits at most timeout"""
+        with self._wake:
+            self._stopping = True
+            self._wake.notify()
+        if timeout and self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def is_alive(self) -> bool:
+        return self._thread.is_alive()
+
+    # Worker thread
+
+    def _wait(self, seconds: float) -> bool:
+        """Sleep unless woken to stop; False once stopping"""
+        with self._wake:
+            if not self._stopping and seconds > 0:
+                self._wake.wait(seconds)
+            return not self._stopping
+
+    def _connect(self):
+        backoff = self.backoff_start
+        while self._wait(0):
+            client = None
+            try:
+                client = self.client_factory(self.client_id)
+                client.connect()
+                self.connected = True
+                logger.success("Discord RPC connection successful!")
+                return client
+            except Exception as e:
+                if client is not None:
+                    self._close(client)
+                logger.warn("Discord RPC unavailable, retrying in %g s: %s", backoff, e)
+                if not self._wait(backoff):
+                    return None
+                backoff = min(backoff * 2, self.backoff_max)
+        return None
+
+    def _next_activity(self):
+        """Block until an activity is due or stopping, and take it"""
+        with self._wake:
+            while not self._stopping:
+                if self._pending is not None and self._pending != self._last:
+                    delay = self._next_send - time.monotonic()
+                    if delay <= 0:
+                        activity, self._pending = self._pending, None
+                        return activity
+                    self._wake.wait(delay)
+                else:
+                    self._pending = None
+                    self._wake.wait()
+            return None
+
+    def _run(self) -> None:
+        client = None
         try:
-            RPC = Presence(CLIENT_ID)
-            RPC.connect()
-            RPC.update(
-                state=state,
-                details=details,
-                large_image="tordie_logo",
-                large_text="Tordie6",
-                small_image="development-icon" if debug else None,
-                start=int(time.time())
-            )
-            logger.success("Discord RPC connection successful!")
-        except Exception as e:
-            logger.error(f"Discord RPC failed: {e}")
-            RPC = None
-    else:
+            while not self._stopping:
+                if client is None:
+                    client = self._connect()
+                    if client is None:
+                        break
+                activity = self._next_activity()
+                if activity is None:
+                    break
+                try:
+                    client.update(**activity)
+                    self._last = activity
+                    self.sent += 1
+                except Exception as e:
+                    logger.warn("Discord RPC update failed, reconnecting: %s", e)
+                    with self._wake:
+                        if self._pending is None:
+                            self._pending = activity
+                    self._close(client)
+                    client = None
+                self._next_send = time.monotonic() + self.interval
+        finally:
+            if client is not None:
+                self._close(client)
+                logger.info("Discord RPC closed")
+
+    def _close(self, client) -> None:
+        self.connected = False
+        try:
+            client.close()
+        except Exception:
+            pass
+        # pypresence only closes its loop after telling Discord, which fails
+        # when it never connected
+        loop = getattr(client, "loop", None)
+        if loop is not None and not loop.is_closed():
+            loop.close()
+
+
+def discord_setup(debug: bool = False) -> PresenceWorker:
+    """Start Discord presence in the background; None without a client id"""
+    global WORKER
+    # Imported here so startup never waits on it
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    client_id = os.getenv('DISCORD_APP_ID')
+    if not client_id:
         logger.warn("Discord Client ID not found in environment")
-        RPC = None
+        return None
 
-    return lambda: discord_cleanup()
+    WORKER = PresenceWorker(client_id)
+    WORKER.base = {
+        "large_image": "tordie_logo",
+        "large_text": "Tordie6",
+        "small_image": "development-icon" if debug else None,
+        "start": int(time.time()),
+    }
+    WORKER.update(
+        state="Working on a project",
+        details="Development mode" if debug else "Starting a project",
+    )
+    return WORKER.start()
 
 
 def discord_cleanup() -> None:
-    """Default Discord RPC close protocol"""
-    global RPC
-    if RPC:
-        try:
-            RPC.close()
-            logger.info("Discord RPC closed")
-        except:
-            pass
+    """Stop presence without waiting for Discord; the thread is a daemon"""
+    global WORKER
+    if WORKER:
+        WORKER.stop()
+        WORKER = None
@@ -1,18 +1,22 @@
-import os
-from PySide6.QtGui import QFontDatabase, QFont
+from PySide6.QtGui import QFontDatabase
+from PySide6.QtCore import QByteArray
 
-from src.utils.os import resource_path
+from src.utils.assets import assets
 import src.utils.logger as logger
 
+FONT_DIR = "src/assets/fonts"
+
+
 def load_fonts(fonts: list[str]) -> None:
+    """Register fonts from the asset folder; safe to call off the GUI thread"""
     for f in fonts:
-        path = resource_path(f"src/assets/fonts/{f}")
-        if os.path.exists(path):
-            font_id = QFontDatabase.addApplicationFont("src/assets/fonts/Bahnschrift.ttf")
-            if font_id == -1:
-                logger.error(f"Failed to load font: {f}")
-            else:
-                font_family = QFontDatabase.applicationFontFamilies(font_id)[0]
-                logger.success(f"Successfully registered font {f} as {font_family}")
+        name = f"{FONT_DIR}/{f}"
+        if not assets.exists(name):
+            logger.error("Cannot find font %s in %s", f, FONT_DIR)
+            continue
+        font_id = QFontDatabase.addApplicationFontFromData(QByteArray(assets.data(name)))
+        if font_id == -1:
+            logger.error("Failed to load font: %s", f)
         else:
-            logger.error(f"Cannot find font {f} in {path}")
\ No newline at end of file
+            font_family = QFontDatabase.applicationFontFamilies(font_id)[0]
+            logger.success("Successfully registered font %s as %s", f, font_family)
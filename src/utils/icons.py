@@ -0,0 +1,129 @@
+from collections import OrderedDict
+from PySide6.QtGui import QIcon, QImage, QPainter, QPixmap, QTransform, QGuiApplication
+from PySide6.QtSvg import QSvgRenderer
+from PySide6.QtCore import Qt, QByteArray
+
+from src.utils.assets import assets
+
+DEFAULT_MAX_ENTRIES = 512
+
+
+def render_image(asset: str, size: int, dpr: float, rotation: int = 0,
+                 renderer: QSvgRenderer = None) -> QImage:
+    """Rasterize an asset; without a shared renderer this is safe off the GUI thread"""
+    pixels = max(1, round(size * dpr))
+    image = QImage(pixels, pixels, QImage.Format_ARGB32_Premultiplied)
+    image.fill(Qt.transparent)
+
+    if asset.endswith(".svg"):
+        if renderer is None:
+            renderer = QSvgRenderer(QByteArray(assets.data(asset)))
+        painter = QPainter(image)
+        renderer.render(painter)
+        painter.end()
+    else:
+        source = QImage.fromData(assets.data(asset))
+        if not source.isNull():
+            image = source.scaled(pixels, pixels, Qt.KeepAspectRatio,
+                                  Qt.SmoothTransformation)
+
+    if rotation % 360:
+        image = image.transformed(QTransform().rotate(rotation),
+                                  Qt.SmoothTransformation)
+    return image
+
+
+class IconCache:
+    """Process-wide cache of rasterized icon assets.
+
+    Entries are keyed by (asset, size, mode, device pixel ratio, rotation) so
+    each combination is parsed and rasterized exactly once. Pixmaps belong to
+    the GUI thread, so the cache must only be used from there.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[tuple, QPixmap | QIcon] = OrderedDict()
+        self._renderers: dict[str, QSvgRenderer] = {}
+
+    def pixmap(self, asset: str, size: int = 16, mode: QIcon.Mode = QIcon.Normal,
+               dpr: float = None, rotation: int = 0) -> QPixmap:
+        """Rasterized asset at size logical pixels for the given device pixel ratio"""
+        if dpr is None:
+            dpr = QGuiApplication.instance().devicePixelRatio()
+        key = ("pixmap", asset, size, mode, round(dpr, 2), rotation % 360)
+        pix = self._lookup(key)
+        if pix is None:
+            pix = self._rasterize(asset, size, mode, dpr, rotation)
+            self._store(key, pix)
+        return pix
+
+    def icon(self, asset: str, size: int = 16, dpr: float = None, rotation: int = 0) -> QIcon:
+        """QIcon backed by cached pixmaps instead of a lazily parsing SVG engine"""
+        if dpr is None:
+            dpr = QGuiApplication.instance().devicePixelRatio()
+        key = ("icon", asset, size, round(dpr, 2), rotation % 360)
+        icon = self._lookup(key)
+        if icon is None:
+            icon = QIcon()
+            for mode in (QIcon.Normal, QIcon.Disabled):
+                icon.addPixmap(self.pixmap(asset, size, mode, dpr, rotation), mode)
+            self._store(key, icon)
+        return icon
+
+    def add_image(self, asset: str, size: int, dpr: float, rotation: int, image: QImage) -> None:
+        """Cache an image rendered elsewhere, e.g. by the preloader, as the normal pixmap"""
+        pix = QPixmap.fromImage(image)
+        pix.setDevicePixelRatio(dpr)
+        self._store(("pixmap", asset, size, QIcon.Normal, round(dpr, 2), rotation % 360), pix)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._renderers.clear()
+
+    def _lookup(self, key: tuple):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def _store(self, key: tuple, value) -> None:
+        self._entries[key] = value
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _rasterize(self, asset: str, size: int, mode: QIcon.Mode,
+                   dpr: float, rotation: int) -> QPixmap:
+        renderer = None
+        if asset.endswith(".svg"):
+            renderer = self._renderers.get(asset)
+            if renderer is None:
+                renderer = QSvgRenderer(QByteArray(assets.data(asset)))
+                self._renderers[asset] = renderer
+        image = render_image(asset, size, dpr, rotation, renderer)
+
+        pix = QPixmap.fromImage(image)
+        if mode == QIcon.Disabled:
+            pix = QIcon(pix).pixmap(pix.size(), 1.0, QIcon.Disabled)
+        pix.setDevicePixelRatio(dpr)
+        return pix
+
+
+icon_cache = IconCache()
@@ -1,36 +1,281 @@
-from colorama import Fore, Style, init
+from collections import deque
+from colorama import Fore, Style, init as colorama_init
+import atexit
+import os
+import queue
+import threading
+import time
+
+colorama_init(autoreset=True)
+
+DEBUG_LEVEL, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVEL_NAMES = {"debug": DEBUG_LEVEL, "info": INFO, "warning": WARNING, "error": ERROR}
+RING_SIZE = 2000
+LOG_MAX_BYTES = 2 * 1024 * 1024
+LOG_BACKUPS = 3
 
-init(autoreset=True)
 DEBUG = False
+# Every span ending as a debug record; off by default, as spans run on every
+# paint and would crowd everything else out of the ring
+TRACE_SPANS = False
+
+
+class Record:
+    __slots__ = ("time", "level", "prefix", "color", "msg", "args", "thread")
+
+    def __init__(self, level: int, prefix: str, color: str, msg: str, args: tuple):
+        self.time = time.time()
+        self.level = level
+        self.prefix = prefix
+        self.color = color
+        self.msg = msg
+        self.args = args
+        self.thread = threading.current_thread().name
+
+    @property
+    def message(self) -> str:
+        """The message with its arguments filled in, done only when read"""
+        if self.args:
+            try:
+                return self.msg % self.args
+            except (TypeError, ValueError):
+                return f"{self.msg} {self.args}"
+        return str(self.msg)
+
+    def __str__(self) -> str:
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.time))
+        return f"{stamp}.{int(self.time % 1 * 1000):03d} [{self.prefix}] {self.message}"
+
+
+class _RotatingFile:
+    """Appends lines to path, moving it to path.1, path.2... once it grows past max_bytes"""
+
+    def __init__(self, path: str, max_bytes: int = LOG_MAX_BYTES, backups: int = LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, line: str) -> None:
+        self._file.write(line + "\n")
+        if self._file.tell() > self.max_bytes:
+            self._rotate()
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        self._file = open(self.path, "w", encoding="utf-8")
+
+
+class _Writer:
+    """Background thread that formats queued records and does all the I/O"""
+
+    def __init__(self):
+        self.queue: queue.SimpleQueue = queue.SimpleQueue()
+        self.console = False
+        self.file: _RotatingFile = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="logger", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+            if isinstance(record, threading.Event):
+                if self.file is not None:
+                    self.file.flush()
+                record.set()
+                continue
+            self._write(record)
+
+    def _write(self, record: Record) -> None:
+        if self.console:
+            print(f"{record.color}{Style.DIM}{Style.BRIGHT}[{record.prefix}] "
+                  f"{Style.RESET_ALL}{record.color}{record.message}")
+        if self.file is not None and record.level >= _file_level:
+            try:
+                self.file.write(str(record))
+            except OSError:
+                self.file = None
+
+    def flush(self, timeout: float = 1.0) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            done = threading.Event()
+            self.queue.put(done)
+            done.wait(timeout)
+
+
+_writer = _Writer()
+_ring: deque[Record] = deque(maxlen=RING_SIZE)
+_console_level = INFO
+_file_level = INFO
+
+
+def _emit(level: int, prefix: str, color: str, msg: str, args: tuple) -> None:
+    record = Record(level, prefix, color, msg, args)
+    _ring.append(record)
+    _writer.queue.put(record)
+
+
+def _noop(msg: str = "", *args, prefix: str = "") -> None:
+    pass
+
+
+def debug(msg: str, *args, prefix: str = "Debug") -> None:
+    _emit(DEBUG_LEVEL, prefix, Fore.CYAN, msg, args)
 
 
-def init(debug: bool):
-    global DEBUG
+def info(msg: str, *args, prefix: str = "Info") -> None:
+    _emit(INFO, prefix, Fore.WHITE, msg, args)
+
+
+def warn(msg: str, *args, prefix: str = "Warning") -> None:
+    _emit(WARNING, prefix, Fore.YELLOW, msg, args)
+
+
+def error(msg: str, *args, prefix: str = "Error") -> None:
+    _emit(ERROR, prefix, Fore.RED, msg, args)
+
+
+def success(msg: str, *args, prefix: str = "Success") -> None:
+    _emit(INFO, prefix, Fore.GREEN, msg, args)
+
+
+def loading(msg: str, *args, prefix: str = "Loading") -> None:
+    _emit(INFO, prefix, Fore.MAGENTA, msg, args)
+
+
+_FUNCTIONS = {
+    "debug": (debug, DEBUG_LEVEL),
+    "info": (info, INFO),
+    "success": (success, INFO),
+    "loading": (loading, INFO),
+    "warn": (warn, WARNING),
+    "error": (error, ERROR),
+}
+
+
+def enabled(level: int) -> bool:
+    """Whether anything is recorded at level; guard expensive messages with it"""
+    return level >= min(_console_level if DEBUG else ERROR + 1,
+                        _file_level if _writer.file is not None else ERROR + 1)
+
+
+def _rebind() -> None:
+    # Disabled levels become a function that does nothing, so a call costs
+    # only the call; pass arguments separately ("%d objects", n) rather than
+    # as an f-string to also skip the formatting
+    for name, (function, level) in _FUNCTIONS.items():
+        globals()[name] = function if enabled(level) else _noop
+
+
+def init(debug: bool, directory: str = None, level: str = "info",
+         console_level: str = None, trace_spans: bool = False) -> None:
+    """Print records in debug mode and, given a directory, also write them to
+    rotating files there from level upwards"""
+    global DEBUG, TRACE_SPANS, _console_level, _file_level
     DEBUG = debug
+    TRACE_SPANS = trace_spans
+    _console_level = LEVEL_NAMES.get(console_level or ("debug" if debug else "info"), INFO)
+    _file_level = LEVEL_NAMES.get(level, INFO)
+    _writer.console = debug
+    if directory:
+        try:
+            _writer.file = _RotatingFile(os.path.join(directory, "tordie.log"))
+        except OSError as e:
+            _writer.file = None
+            print(f"Cannot write log files to {directory}: {e}")
+    _rebind()
+    if enabled(DEBUG_LEVEL) or enabled(ERROR):
+        _writer.start()
+
+
+def records(level: int = DEBUG_LEVEL) -> list[Record]:
+    """The most recent records, oldest first"""
+    return [r for r in list(_ring) if r.level >= level]
+
+
+def flush(timeout: float = 1.0) -> None:
+    """Wait until everything logged so far has been written"""
+    _writer.flush(timeout)
+
+
+atexit.register(flush)
+
+
+# Timing spans
+
+class _SpanStats:
+    __slots__ = ("count", "total", "max", "last")
+
+    def __init__(self):
+        self.count = 0
+        self.total = self.max = self.last = 0.0
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
 
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
 
-def _print(msg: str, color: str, prefix: str = "System") -> None:
-    global DEBUG
-    if DEBUG:
-        print(
-            f"{color}{Style.DIM}{Style.BRIGHT}[{prefix}] {Style.RESET_ALL}{color}{msg}")
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stats = _spans.get(self.name)
+        if stats is None:
+            stats = _spans[self.name] = _SpanStats()
+        stats.count += 1
+        stats.total += elapsed
+        stats.last = elapsed
+        if elapsed > stats.max:
+            stats.max = elapsed
+        for listener in _span_listeners:
+            listener(self.name, elapsed)
+        if TRACE_SPANS:
+            debug("%s took %.2f ms", self.name, elapsed * 1000, prefix="Span")
+        return False
 
 
-def info(msg: str, prefix: str = "Info") -> None:
-    _print(msg, Fore.WHITE, prefix)
+_spans: dict[str, _SpanStats] = {}
+_span_listeners: list = []
 
 
-def warn(msg: str, prefix: str = "Warning") -> None:
-    _print(msg, Fore.YELLOW, prefix)
+def span(name: str) -> _Span:
+    """Time a block: with logger.span("paint"): ...; totals are in span_stats()"""
+    return _Span(name)
 
 
-def error(msg: str, prefix: str = "Error") -> None:
-    _print(msg, Fore.RED, prefix)
+def add_span_listener(listener) -> None:
+    """Call listener(name, seconds) whenever a span ends"""
+    _span_listeners.append(listener)
 
 
-def success(msg: str, prefix: str = "Success") -> None:
-    _print(msg, Fore.GREEN, prefix)
+def span_stats() -> dict[str, dict]:
+    return {name: {"count": s.count, "total_ms": s.total * 1000, "max_ms": s.max * 1000,
+                   "last_ms": s.last * 1000, "mean_ms": s.total / s.count * 1000}
+            for name, s in list(_spans.items())}
 
 
-def loading(msg: str, prefix: str = "Loading") -> None:
-    _print(msg, Fore.MAGENTA, prefix)
+_rebind()
@@ -0,0 +1,105 @@
+from typing import Callable
+import json
+import threading
+import time
+import numpy as np
+
+WINDOW = 600
+
+
+class Timing:
+    """The last WINDOW durations of something, in seconds"""
+
+    def __init__(self, window: int = WINDOW):
+        self.samples = np.zeros(window)
+        self.count = 0
+        self.total = 0.0
+
+    def record(self, seconds: float) -> None:
+        self.samples[self.count % len(self.samples)] = seconds
+        self.count += 1
+        self.total += seconds
+
+    def recent(self) -> np.ndarray:
+        return self.samples[:min(self.count, len(self.samples))]
+
+    def summary(self) -> dict:
+        recent = self.recent()
+        if not len(recent):
+            return {"count": 0}
+        last = self.samples[(self.count - 1) % len(self.samples)]
+        p50, p95 = np.percentile(recent, [50, 95])
+        return {
+            "count": self.count,
+            "last_ms": float(last) * 1000,
+            "mean_ms": float(recent.mean()) * 1000,
+            "p50_ms": float(p50) * 1000,
+            "p95_ms": float(p95) * 1000,
+            "max_ms": float(recent.max()) * 1000,
+            "total_ms": self.total * 1000,
+        }
+
+    def histogram(self, bins: int = 20) -> tuple[np.ndarray, np.ndarray]:
+        """Counts and millisecond bin edges of the recent samples"""
+        recent = self.recent() * 1000
+        if not len(recent):
+            return np.zeros(bins, np.int64), np.linspace(0, 1, bins + 1)
+        return np.histogram(recent, bins, (0, max(float(recent.max()), 1e-3)))
+
+
+class Metrics:
+    """Registry of the counters the performance HUD shows.
+
+    Timings keep a rolling window of samples, counters only grow and gauges
+    are functions read when a snapshot is taken, so registering one costs
+    nothing until somebody looks. Timings may be recorded from any thread.
+    """
+
+    def __init__(self):
+        self.timings: dict[str, Timing] = {}
+        self.counters: dict[str, int] = {}
+        self.gauges: dict[str, Callable[[], float]] = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def record(self, name: str, seconds: float) -> None:
+        timing = self.timings.get(name)
+        if timing is None:
+            with self._lock:
+                timing = self.timings.setdefault(name, Timing())
+        timing.record(seconds)
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name: str, read: Callable[[], float]) -> None:
+        self.gauges[name] = read
+
+    def value(self, name: str):
+        read = self.gauges.get(name)
+        if read is None:
+            return None
+        try:
+            return read()
+        except Exception:
+            return None
+
+    def snapshot(self) -> dict:
+        return {
+            "time": time.time(),
+            "uptime": time.time() - self.started,
+            "timings": {name: t.summary() for name, t in list(self.timings.items())},
+            "counters": dict(self.counters),
+            "gauges": {name: self.value(name) for name in list(self.gauges)},
+        }
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2, default=float)
+
+    def clear(self) -> None:
+        self.timings.clear()
+        self.counters.clear()
+
+
+metrics = Metrics()
@@ -14,6 +14,33 @@ def resource_path(relative_path: str) -> str:
     return os.path.join(base_path, relative_path)
 
 
+def rss_bytes() -> int:
+    """Resident memory of this process, or 0 where it cannot be read"""
+    try:
+        if sys.platform == 'win32':
+            from ctypes import wintypes
+
+            class Counters(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                    (name, ctypes.c_size_t) for name in (
+                        "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage",
+                        "QuotaPagedPoolUsage", "QuotaPeakNonPagedPoolUsage",
+                        "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage")]
+
+            counters = Counters()
+            counters.cb = ctypes.sizeof(counters)
+            ctypes.windll.psapi.GetProcessMemoryInfo(
+                ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb)
+            return counters.WorkingSetSize
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        import resource
+        # Peak rather than current on macOS, but better than nothing
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
 def register_app() -> None:
     """Register the application with the operating system"""
     if sys.platform == 'win32':
@@ -21,4 +48,4 @@ def register_app() -> None:
             ctypes.windll.shell32.SetCurrentProcessExplicitlyAppUserModelID(
                 'tordie.tordie6.application.1')
         except Exception as e:
-            logger.warn(f"Failed to set up Windows App User Model ID: {e}")
+            logger.warn("Failed to set up Windows App User Model ID: %s", e)
@@ -0,0 +1,61 @@
+import threading
+import time
+
+from src.utils.fonts import load_fonts
+from src.utils.icons import icon_cache, render_image
+import src.utils.logger as logger
+
+
+class Preloader:
+    """Registers fonts and rasterizes icons on a background thread.
+
+    Started right after the QApplication so the work overlaps the splash and
+    the imports of the main window. Fonts come first since the splash needs
+    them; icons are handed to the icon cache on the GUI thread by install().
+    If the thread is still busy then, it stops and the icons it did not get to
+    are rasterized by the cache when first used.
+    """
+
+    def __init__(self, fonts: list[str], icons: list[tuple[str, int, int]], dpr: float):
+        self.fonts = fonts
+        self.icons = icons
+        self.dpr = dpr
+        self.fonts_ready = threading.Event()
+        self._images = []
+        self._installed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="preload", daemon=True)
+
+    def start(self) -> "Preloader":
+        self._thread.start()
+        return self
+
+    def _run(self) -> None:
+        start = time.perf_counter()
+        try:
+            load_fonts(self.fonts)
+        finally:
+            self.fonts_ready.set()
+        rendered = 0
+        for asset, size, rotation in self.icons:
+            try:
+                image = render_image(asset, size, self.dpr, rotation)
+            except Exception as e:
+                logger.warn("Could not preload %s: %s", asset, e)
+                continue
+            with self._lock:
+                if self._installed:
+                    break
+                self._images.append((asset, size, rotation, image))
+            rendered += 1
+        logger.info("Preloaded %d fonts and %d icons in %.1f ms", len(self.fonts),
+                    rendered, (time.perf_counter() - start) * 1000)
+
+    def install(self, timeout: float = 2.0) -> None:
+        """Wait for the thread and move what it rendered into the icon cache"""
+        self._thread.join(timeout)
+        with self._lock:
+            self._installed = True
+            images, self._images = self._images, []
+        for asset, size, rotation, image in images:
+            icon_cache.add_image(asset, size, self.dpr, rotation, image)
@@ -0,0 +1,103 @@
+from contextlib import contextmanager
+import builtins
+import importlib.util
+import json
+import sys
+import time
+
+import src.utils.logger as logger
+
+IMPORTS_SHOWN = 25
+
+
+class StartupProfile:
+    """Times the startup phases and, when enabled, every module import.
+
+    Imports are timed by wrapping __import__, so the profile has to be
+    enabled before the modules of interest are first imported. Each import
+    gets a cumulative time and a self time excluding the imports it made.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.origin = time.perf_counter()
+        self.phases: list[tuple[str, float, float]] = []
+        self.imports: list[tuple[str, float, float]] = []
+        self._import = None
+        self._stack: list[float] = []
+
+    def enable(self) -> None:
+        if self.enabled:
+            return
+        self.enabled = True
+        self._import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def disable(self) -> None:
+        if self.enabled:
+            builtins.__import__ = self._import
+            self.enabled = False
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.phases.append((name, start - self.origin, end - start))
+            logger.info("Startup: %s took %.1f ms", name, (end - start) * 1000)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.origin
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        full = name
+        if level:
+            try:
+                full = importlib.util.resolve_name("." * level + name,
+                                                   (globals or {}).get("__package__"))
+            except (ImportError, ValueError):
+                pass
+        if full in sys.modules:
+            return self._import(name, globals, locals, fromlist, level)
+
+        start = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            total = time.perf_counter() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += total
+            self.imports.append((full, total, total - children))
+
+    def report(self) -> dict:
+        return {
+            "total_ms": self.elapsed() * 1000,
+            "phases": [{"name": name, "start_ms": start * 1000, "ms": duration * 1000}
+                       for name, start, duration in self.phases],
+            "imports": [{"module": name, "ms": total * 1000, "self_ms": own * 1000}
+                        for name, total, own in sorted(self.imports, key=lambda i: -i[2])],
+        }
+
+    def write(self, path: str = None) -> None:
+        """Print the profile, or save it as JSON when given a path"""
+        report = self.report()
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"Startup profile written to {path}")
+            return
+
+        print(f"Startup: {report['total_ms']:.1f} ms to first frame")
+        print(f"{'phase':<24}{'start ms':>10}{'ms':>10}")
+        for phase in report["phases"]:
+            print(f"{phase['name']:<24}{phase['start_ms']:>10.1f}{phase['ms']:>10.1f}")
+        print(f"\n{'import':<48}{'self ms':>10}{'total ms':>10}")
+        for item in report["imports"][:IMPORTS_SHOWN]:
+            print(f"{item['module']:<48}{item['self_ms']:>10.1f}{item['ms']:>10.1f}")
+
+
+profile = StartupProfile()
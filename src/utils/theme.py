@@ -0,0 +1,98 @@
+from string import Template
+from PySide6.QtGui import QColor, QPalette
+from PySide6.QtWidgets import QApplication
+
+import src.utils.logger as logger
+
+# Palette roles each theme overrides; "system" keeps the platform palette
+THEMES: dict[str, dict[str, str]] = {
+    "system": {},
+    "light": {
+        "Window": "#efefef", "WindowText": "#1e1e1e", "Base": "#ffffff",
+        "AlternateBase": "#f5f5f5", "Text": "#1e1e1e", "Button": "#e6e6e6",
+        "ButtonText": "#1e1e1e", "Highlight": "#3d7fd6", "HighlightedText": "#ffffff",
+        "Mid": "#b8b8b8", "PlaceholderText": "#8a8a8a", "ToolTipBase": "#ffffdc",
+        "ToolTipText": "#1e1e1e", "Link": "#2a62b0",
+    },
+    "dark": {
+        "Window": "#2b2b2b", "WindowText": "#dcdcdc", "Base": "#1f1f1f",
+        "AlternateBase": "#262626", "Text": "#dcdcdc", "Button": "#353535",
+        "ButtonText": "#dcdcdc", "Highlight": "#3d7fd6", "HighlightedText": "#ffffff",
+        "Mid": "#4a4a4a", "PlaceholderText": "#7a7a7a", "ToolTipBase": "#353535",
+        "ToolTipText": "#dcdcdc", "Link": "#6aa0e8",
+    },
+}
+
+# Widgets are styled by object name here, never with their own stylesheet;
+# $names are colors of the compiled palette
+STYLESHEET = Template("""
+QLabel#tab_title { padding: 2px; }
+QLabel#outliner_title { padding: 5px; }
+QLabel#performance_hud { color: $placeholdertext; }
+
+QTabWidget#properties_tabs QTabBar::tab {
+    width: 16px;
+    height: 16px;
+    padding: 5px;
+    margin: 0px 0px 0px 2px;
+    border-top-left-radius: 5px;
+    border-bottom-left-radius: 5px;
+    border-right: none;
+}
+QTabWidget#properties_tabs QTabBar::tab:first { margin-top: 28px; }
+QTabWidget#properties_tabs QTabBar::tab:last { margin-bottom: 3px; }
+QTabWidget#properties_tabs QTabBar::tab:selected { background-color: $base; }
+
+QSvgWidget#splash_art { background-color: white; border-radius: 15px; }
+QLabel#splash_title { color: black; }
+QLabel#splash_version { color: gray; }
+""")
+
+
+class ThemeManager:
+    """Compiles themes into one palette and stylesheet for the whole application.
+
+    Compiled themes are cached, so switching back and forth only hands Qt the
+    palette and, when it differs, the stylesheet. Widgets are never rebuilt;
+    those that paint themselves read the palette on every paint.
+    """
+
+    def __init__(self):
+        self.name: str = None
+        self._system: QPalette = None
+        self._compiled: dict[str, tuple[QPalette, str]] = {}
+
+    def names(self) -> list[str]:
+        return list(THEMES)
+
+    def compile(self, name: str) -> tuple[QPalette, str]:
+        compiled = self._compiled.get(name)
+        if compiled is not None:
+            return compiled
+        if name not in THEMES:
+            raise ValueError(f"Unknown theme {name!r}")
+        palette = QPalette(self._system) if self._system is not None else QPalette()
+        for role, color in THEMES[name].items():
+            palette.setColor(getattr(QPalette.ColorRole, role), QColor(color))
+        colors = {role.name.lower(): palette.color(role).name()
+                  for role in QPalette.ColorRole if role != QPalette.ColorRole.NColorRoles}
+        compiled = self._compiled[name] = (palette, STYLESHEET.substitute(colors))
+        return compiled
+
+    def apply(self, name: str) -> None:
+        """Make a theme current; safe to call while the window is up"""
+        if name == self.name:
+            return
+        app = QApplication.instance()
+        if self._system is None:
+            # The platform palette, before any theme replaced it
+            self._system = QPalette(app.palette())
+        palette, stylesheet = self.compile(name)
+        with logger.span("theme.apply"):
+            app.setPalette(palette)
+            if app.styleSheet() != stylesheet:
+                app.setStyleSheet(stylesheet)
+        self.name = name
+
+
+theme = ThemeManager()